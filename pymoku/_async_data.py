@@ -0,0 +1,189 @@
+"""
+Coroutine implementations of the asyncio data API, e.g. :any:`get_data_async`.
+
+This module uses Python 3.6 syntax and is only imported when one of the asynchronous
+methods is called, so the rest of pymoku remains importable on Python 2.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+
+import zmq
+import zmq.asyncio
+
+from . import FrameTimeout, NoDataException, StreamException
+
+log = logging.getLogger(__name__)
+
+_ctx = None
+
+def _context():
+	# All asyncio sockets share the synchronous context's IO threads
+	global _ctx
+	if _ctx is None:
+		_ctx = zmq.asyncio.Context.shadow(zmq.Context.instance())
+	return _ctx
+
+
+class _AsyncFrameReceiver(object):
+	""" Assembles frames from the frame socket on behalf of one event loop. """
+	def __init__(self, instrument, loop):
+		# Created by a coroutine, so on the loop's thread
+		self.loop = loop
+		self._thread = threading.current_thread()
+		self._instr = instrument
+		self._skt = instrument._frame_socket(_context())
+		self._lock = asyncio.Lock()
+		self._frame = instrument._frame_class(**instrument._frame_kwargs)
+		self.closed = False
+
+	async def recv_frame(self):
+		async with self._lock:
+			while True:
+				d = await self._skt.recv()
+				self._frame.add_packet(d)
+
+				if self._frame._complete:
+					frame = self._frame
+					self._frame = self._instr._frame_class(**self._instr._frame_kwargs)
+					return frame
+
+	def close(self):
+		# Closing cancels any pending receive, which is only safe on the event loop's thread. The
+		# instrument may be stopped from any thread, so the close is passed to the loop if it's
+		# running elsewhere.
+		self.closed = True
+
+		if self.loop.is_running() and threading.current_thread() is not self._thread:
+			self.loop.call_soon_threadsafe(self._skt.close)
+		else:
+			self._skt.close()
+
+
+def _frame_receiver(instrument):
+	loop = asyncio.get_event_loop()
+	receiver = instrument._async_frames
+
+	if receiver is None or receiver.loop is not loop:
+		if receiver is not None:
+			receiver.close()
+		receiver = instrument._async_frames = _AsyncFrameReceiver(instrument, loop)
+
+	return receiver
+
+
+async def _next_frame(instrument, receiver, wait):
+	while instrument._running:
+		try:
+			frame = await receiver.recv_frame()
+		except asyncio.CancelledError:
+			# The receive is cancelled by the socket closing when the instrument stops, otherwise
+			# it's this task that's being cancelled
+			if not receiver.closed:
+				raise
+			break
+
+		if instrument._frame_accepted(frame, wait):
+			return frame
+		else:
+			log.debug("Incorrect state received: %d/%d", frame._trigstate, instrument._stateid)
+
+	raise FrameTimeout("Instrument stopped while waiting for data.")
+
+
+async def get_realtime_data(instrument, timeout, wait):
+	receiver = _frame_receiver(instrument)
+
+	try:
+		return await asyncio.wait_for(_next_frame(instrument, receiver, wait), timeout)
+	except asyncio.TimeoutError:
+		raise FrameTimeout()
+
+
+async def _receive_samples(instrument, timeout):
+	if not instrument._stream_net_is_running():
+		raise StreamException("No network stream is currently running.")
+
+	try:
+		hdr, data = await asyncio.wait_for(instrument._dlskt.recv_multipart(), timeout)
+	except asyncio.TimeoutError:
+		raise FrameTimeout("Data log timed out after %d seconds" % timeout)
+
+	instrument._stream_parse_samples(*instrument._stream_decode_msg(hdr, data))
+
+
+def _close_stream_socket(instrument):
+	# The stream socket is closed here, on the event loop's thread, as pending receives are cancelled.
+	# Stopping the stream in an executor then finds no socket to close.
+	if instrument._dlskt is not None:
+		instrument._dlskt.close()
+		instrument._dlskt = None
+
+
+async def get_data(instrument, timeout, wait, ch1, ch2, window):
+	loop = asyncio.get_event_loop()
+
+	instrument._buffer_check_ready()
+
+	start = time.time()
+	frame = await get_realtime_data(instrument, timeout, wait)
+	while not(frame.synchronised):
+		if timeout is not None and (time.time() > start + timeout):
+			raise FrameTimeout("Timed out waiting on instrument data.")
+		frame = await get_realtime_data(instrument, timeout, wait)
+
+	selection = instrument._buffer_selection(frame, ch1, ch2, window)
+
+	buff = instrument._buffer_cache_lookup(frame, selection)
+	if buff is not None:
+		return buff
+
+	# Stop existing logging sessions
+	_close_stream_socket(instrument)
+	await loop.run_in_executor(None, instrument._stream_stop)
+
+	was_paused = await loop.run_in_executor(None, instrument._buffer_download_start, selection, True)
+
+	# Always restore the pause state, including if the download is cancelled
+	try:
+		while not instrument._buffer_download_done(selection):
+			try:
+				await _receive_samples(instrument, timeout)
+			except NoDataException:
+				break
+	finally:
+		_close_stream_socket(instrument)
+		channel_data = await loop.run_in_executor(None, instrument._buffer_download_finish, was_paused)
+
+	return instrument._make_buffer(frame, channel_data, selection)
+
+
+async def stream_data(instrument, duration, ch1, ch2, timeout):
+	loop = asyncio.get_event_loop()
+
+	await loop.run_in_executor(None, functools.partial(instrument._stream_start,
+		start=0, duration=duration, ch1=ch1, ch2=ch2, use_sd=False, filetype='net', asynchronous=True))
+	instrument._stream_samples_reset()
+	instrument._no_data = False
+
+	try:
+		while True:
+			try:
+				await _receive_samples(instrument, timeout)
+			except NoDataException:
+				log.debug("No more data available for current stream.")
+				break
+
+			data = instrument._stream_pop_samples()
+			if any(data):
+				yield data
+
+		data = instrument._stream_pop_samples()
+		if any(data):
+			yield data
+	finally:
+		instrument._no_data = True
+		_close_stream_socket(instrument)
+		await loop.run_in_executor(None, instrument._stream_stop)
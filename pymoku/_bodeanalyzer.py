@@ -1,11 +1,16 @@
 import math
 import logging
+import time
+
+import numpy as np
+
+from collections import OrderedDict
 
 from ._instrument import *
 from . import _frame_instrument
 from . import _utils
 
-from ._bodeanalyzer_data import BodeData
+from ._bodeanalyzer_data import BodeData, AdaptiveBodeData, BodeSweepStatistics
 
 log = logging.getLogger(__name__)
 
@@ -32,6 +37,37 @@ _NA_SCREEN_WIDTH	= 1024
 _NA_FREQ_SCALE		= 2**48 / _NA_DAC_SMPS
 _NA_FXP_SCALE 		= 2.0**30
 
+# Accumulator gain for each range of averaging period (FPGA clock cycles)
+_NA_AVERAGE_PERIODS	= np.array([2**16, 2**21, 2**26, 2**31, 2**36])
+_NA_AVERAGE_GAINS	= np.array([2.0**4, 2.0**-1, 2.0**-6, 2.0**-11, 2.0**-16, 2.0**-20])
+
+_NA_SWEEP_CACHE_SIZE = 64
+
+
+def _find_features(frame, ch, mag_tolerance, phase_tolerance, max_regions):
+	# Returns the (first, last) point index of the regions of a sweep whose magnitude or phase curvature
+	# exceeds the tolerances, the most significant first
+	data = frame.ch1 if ch == 1 else frame.ch2
+	mag = np.array(data.magnitude_dB, dtype=float)
+	phase = np.degrees(np.unwrap(2.0 * math.pi * np.nan_to_num(np.array(data.phase, dtype=float))))
+
+	# Second differences against point index, which is linear or logarithmic in frequency as the sweep is
+	with np.errstate(invalid='ignore'):
+		score = np.fmax(np.abs(np.diff(mag, 2)) / mag_tolerance, np.abs(np.diff(phase, 2)) / phase_tolerance)
+		flagged = np.flatnonzero(score > 1) + 1
+
+	if not len(flagged):
+		return []
+
+	# Each flagged point covers its neighbours, so points up to two apart join the same region
+	breaks = np.flatnonzero(np.diff(flagged) > 2) + 1
+	starts = np.concatenate([[0], breaks])
+	ends = np.concatenate([breaks, [len(flagged)]]) - 1
+
+	weight = np.add.reduceat(score[flagged - 1], starts)
+	best = np.argsort(-weight, kind='stable')[:max_regions]
+
+	return [(flagged[starts[r]] - 1, flagged[ends[r]] + 1) for r in best]
 
 
 class BodeAnalyzer(_frame_instrument.FrameBasedInstrument):
@@ -44,6 +80,12 @@ class BodeAnalyzer(_frame_instrument.FrameBasedInstrument):
 		self.scales = {}
 		self._set_frame_class(BodeData, instrument=self, scales=self.scales)
 
+		# Frequency axis and gain corrections, keyed on the sweep configuration
+		self._sweep_cache = OrderedDict()
+
+		# Host-side statistics of repeated sweeps
+		self._sweep_stats = None
+
 		self.id = 9
 		self.type = "bodeanalyzer"
 
@@ -61,73 +103,98 @@ class BodeAnalyzer(_frame_instrument.FrameBasedInstrument):
 	def _calculate_freq_axis(self):
 		# Generates the frequency vector for plotting.
 		f_start = self.sweep_freq_min
-		fs = []
+		n = np.arange(self.sweep_length)
 
 		if self.log_en:
 			# Delta register becomes a multiplier in the logarithmic case
 			# Fixed-point precision is used in the FPGA multiplier (30 fractional bits)
-			fs = [ f_start*(1 + (self.sweep_freq_delta/ _NA_FXP_SCALE))**n for n in range(self.sweep_length)]
+			fs = f_start * (1 + (self.sweep_freq_delta / _NA_FXP_SCALE))**n
 		else:
-			fs = [ (f_start + n*(self.sweep_freq_delta/_NA_FREQ_SCALE)) for n in range(self.sweep_length) ]
+			fs = f_start + n * (self.sweep_freq_delta / _NA_FREQ_SCALE)
 
-		return fs
+		return fs.tolist()
 
 	def _calculate_gain_correction(self, fs):
-		sweep_freq = fs
+		sweep_freq = np.array(fs, dtype=float)
 
-		cycles_time = [0.0] * self.sweep_length
+		cycles_time = np.zeros(self.sweep_length)
 
-		if all(sweep_freq):
-			cycles_time = [ self.averaging_cycles / sweep_freq[n] for n in range(self.sweep_length)]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			if sweep_freq.all():
+				cycles_time = self.averaging_cycles / sweep_freq
 
-		points_per_freq = [math.ceil(a * max(self.averaging_time, b) - 1e-12) for (a, b) in zip(sweep_freq, cycles_time)]
+			points_per_freq = np.ceil(sweep_freq * np.maximum(self.averaging_time, cycles_time) - 1e-12)
 
-		average_gain = [0.0] * self.sweep_length
-		gain_scale = [0.0] * self.sweep_length
-
-		# Calculate gain scaling due to accumulator bit ranging
-		for f in range(self.sweep_length):
-			sweep_period = 1 / sweep_freq[f]
+			# Calculate gain scaling due to accumulator bit ranging
+			sweep_period = 1 / sweep_freq
 
 			# Predict how many FPGA clock cycles each frequency averages for:
 			average_period_cycles = self.averaging_cycles * sweep_period * _NA_FPGA_CLOCK
-			if self.averaging_time % sweep_period == 0:
-				average_period_time = self.averaging_time * _NA_FPGA_CLOCK
-			else :
-				average_period_time = math.ceil(self.averaging_time / sweep_period) * sweep_period * _NA_FPGA_CLOCK
+			average_period_time = np.where(np.mod(self.averaging_time, sweep_period) == 0,
+				self.averaging_time * _NA_FPGA_CLOCK,
+				np.ceil(self.averaging_time / sweep_period) * sweep_period * _NA_FPGA_CLOCK)
 
-			if average_period_time >= average_period_cycles:
-				average_period = average_period_time
-			else :
-				average_period = average_period_cycles
+			average_period = np.maximum(average_period_time, average_period_cycles)
 
 			# Scale according to the predicted accumulator counter size:
-			if average_period <= 2**16:
-				average_gain[f] = 2**4
-			elif average_period <= 2**21:
-				average_gain[f] = 2**-1
-			elif average_period <= 2**26:
-				average_gain[f] = 2**-6
-			elif average_period <= 2**31:
-				average_gain[f] = 2**-11
-			elif average_period <= 2**36:
-				average_gain[f] = 2**-16
-			else :
-				average_gain[f] = 2**-20
-
-		for f in range(self.sweep_length):
-			if sweep_freq[f] > 0.0 :
-				gain_scale[f] =  math.ceil(average_gain[f] * points_per_freq[f] * _NA_FPGA_CLOCK / sweep_freq[f])
-			else :
-				gain_scale[f] = average_gain[f]
+			average_gain = _NA_AVERAGE_GAINS[np.searchsorted(_NA_AVERAGE_PERIODS, average_period, side='left')]
+
+			gain_scale = np.where(sweep_freq > 0.0,
+				np.ceil(average_gain * points_per_freq * _NA_FPGA_CLOCK / sweep_freq),
+				average_gain)
 
 		return gain_scale
 
-	def _calculate_scales(self):
-		g1, g2 = self._adc_gains()
+	def _calculate_sweep_corrections(self):
+		# The frequency axis and gain corrections depend only on the sweep configuration, so they are
+		# memoized. Changing e.g. only the output amplitude or offset then doesn't redo the sweep maths.
+		key = (self.sweep_freq_min, self.sweep_freq_delta, self.sweep_length, self.log_en,
+				self.averaging_time, self.averaging_cycles)
+
+		try:
+			return self._sweep_cache[key]
+		except KeyError:
+			pass
+
 		fs = self._calculate_freq_axis()
 		gs = self._calculate_gain_correction(fs)
 
+		# Stored as an array so incoming frames can be corrected with a single vector divide.
+		# A zero gain would indicate an invalid sweep point, leave those samples unscaled.
+		gs[gs == 0] = 1.0
+
+		if len(self._sweep_cache) >= _NA_SWEEP_CACHE_SIZE:
+			self._sweep_cache.popitem(last=False)
+		self._sweep_cache[key] = (fs, gs)
+
+		return fs, gs
+
+	def _calculate_point_times(self, fs):
+		# Predicts how long each sweep point takes, in seconds: whole output cycles of settling then averaging,
+		# each the longer of the set time and number of cycles
+		period = 1.0 / np.array(fs, dtype=float)
+
+		settle = np.maximum(np.ceil(self.settling_time / period - 1e-9) * period, self.settling_cycles * period)
+		average = np.maximum(np.ceil(self.averaging_time / period - 1e-9) * period, self.averaging_cycles * period)
+
+		return settle + average
+
+	def estimate_sweep_time(self):
+		""" Predict the duration of one sweep with the current settings.
+
+		The prediction is based on the settling and averaging times and cycles set by :any:`set_sweep`, at each
+		sweep frequency. It includes the delay until the completed sweep is sent at the next frame, but not
+		network latency.
+
+		:rtype: float
+		:return: Sweep duration, in seconds.
+		"""
+		return float(np.sum(self._calculate_point_times(self._calculate_freq_axis()))) + 1.0 / self.framerate
+
+	def _calculate_scales(self):
+		g1, g2 = self._adc_gains()
+		fs, gs = self._calculate_sweep_corrections()
+
 		return {'g1': g1, 'g2': g2,
 				'gain_correction' : gs,
 				'frequency_axis' : fs,
@@ -359,6 +426,185 @@ class BodeAnalyzer(_frame_instrument.FrameBasedInstrument):
 
 		self.start_sweep()
 
+	def _single_sweep(self, f_start, f_end, points, log_scale, deadline):
+		# Runs a single sweep with the present averaging and settling configuration, returning the complete frame
+		self.sweep_freq_min = f_start
+		self.sweep_length = points
+		self.log_en = log_scale
+		self.sweep_freq_delta = self._calculate_sweep_delta(f_start, f_end, points, log_scale)
+
+		# As start_sweep, so that the sweep runs even if it was previously stopped
+		self.adc1_en = self.adc2_en = True
+		self.dac1_en = self.dac2_en = True
+		self.sweep_reset = False
+		self.single_sweep = True
+		self.loop_sweep = False
+		self.commit()
+
+		while True:
+			timeout = None if deadline is None else max(deadline - time.time(), 0)
+			frame = self.get_realtime_data(timeout=timeout, wait=True)
+
+			if frame.measured_points == len(frame.frequency):
+				return frame
+
+	def get_adaptive_data(self, f_start, f_end, coarse_points=64, refine_points=64, ch=1, max_regions=4,
+			depth=2, mag_tolerance=1.0, phase_tolerance=5.0, timeout=None):
+		""" Measure a frequency response with extra points only where it has features.
+
+		A coarse sweep of the whole range is made first. Regions in which the magnitude or phase of channel
+		*ch* curves sharply, i.e. the second difference between successive points exceeds *mag_tolerance* or
+		*phase_tolerance*, are then swept again with *refine_points* each. Features of those sweeps are refined
+		in turn, up to *depth* times, until they're resolved within the tolerances. All points are merged in to one
+		response. A sharp resonance can so be resolved with far fewer points, and in far less time, than a
+		uniform sweep at the same resolution.
+
+		The sweep scale (linear or logarithmic), averaging and settling are as set by :any:`set_sweep`. The
+		sweep configuration is restored afterwards.
+
+		:type f_start: float; 1 <= f_start <= 120e6 Hz
+		:param f_start: Sweep start frequency
+
+		:type f_end: float; 1 <= f_end <= 120e6 Hz
+		:param f_end: Sweep end frequency
+
+		:type coarse_points: int; 32 <= coarse_points <= 512
+		:param coarse_points: Number of points in the coarse sweep.
+
+		:type refine_points: int; 32 <= refine_points <= 512
+		:param refine_points: Number of points in each refining sweep.
+
+		:type ch: int; {1, 2}
+		:param ch: Input channel in which to find features.
+
+		:type max_regions: int
+		:param max_regions: Maximum number of regions to refine in each sweep.
+
+		:type depth: int
+		:param depth: Maximum number of times a region may be refined.
+
+		:type mag_tolerance: float; dB
+		:param mag_tolerance: Magnitude curvature above which a region is refined.
+
+		:type phase_tolerance: float; degrees
+		:param phase_tolerance: Phase curvature above which a region is refined.
+
+		:type timeout: float
+		:param timeout: Maximum time for all sweeps, or *None* for indefinite.
+
+		:rtype: :any:`AdaptiveBodeData`
+		:return: The merged response.
+
+		:raises FrameTimeout: if the sweeps aren't complete within *timeout*.
+		"""
+		_utils.check_parameter_valid('range', f_start, [1,120e6],'sweep start frequency', 'Hz')
+		_utils.check_parameter_valid('range', f_end, [1,120e6],'sweep end frequency', 'Hz')
+		_utils.check_parameter_valid('range', coarse_points, [32,512],'coarse sweep points')
+		_utils.check_parameter_valid('range', refine_points, [32,512],'refining sweep points')
+		_utils.check_parameter_valid('set', ch, [1, 2], 'input channel')
+		_utils.check_parameter_valid('range', max_regions, [0,64],'refined regions')
+		_utils.check_parameter_valid('range', depth, [0,16],'refinement depth')
+		_utils.check_parameter_valid('range', mag_tolerance, [0,1e6], 'magnitude tolerance', 'dB')
+		_utils.check_parameter_valid('range', phase_tolerance, [0,1e6], 'phase tolerance', 'degrees')
+		_utils.check_parameter_valid('float', timeout, desc='data timeout', allow_none=True)
+
+		if f_end <= f_start:
+			raise ValueOutOfRangeException("Sweep end frequency must be above the start frequency: %.2f/%.2f." % (f_start, f_end))
+
+		saved = (self.sweep_freq_min, self.sweep_freq_delta, self.sweep_length, self.log_en, self.single_sweep, self.loop_sweep,
+			self.adc1_en, self.adc2_en, self.dac1_en, self.dac2_en)
+		log_scale = self.log_en
+
+		start = time.time()
+		deadline = None if timeout is None else start + timeout
+		sweeps = [(f_start, f_end, coarse_points)]
+
+		try:
+			frames = [self._single_sweep(f_start, f_end, coarse_points, log_scale, deadline)]
+			pending = frames[:]
+
+			for _ in range(depth):
+				refined = []
+				for frame in pending:
+					fs = self.scales[frame._stateid]['frequency_axis']
+
+					for lo, hi in sorted(_find_features(frame, ch, mag_tolerance, phase_tolerance, max_regions)):
+						# A region covering the whole sweep wouldn't be any finer
+						if frame is not frames[0] and lo == 0 and hi == len(fs) - 1:
+							continue
+
+						sweeps.append((fs[lo], fs[hi], refine_points))
+						refined.append(self._single_sweep(fs[lo], fs[hi], refine_points, log_scale, deadline))
+
+				frames.extend(refined)
+				pending = refined
+		finally:
+			(self.sweep_freq_min, self.sweep_freq_delta, self.sweep_length, self.log_en,
+				self.single_sweep, self.loop_sweep, self.adc1_en, self.adc2_en, self.dac1_en, self.dac2_en) = saved
+			self.commit()
+
+		log.debug("Adaptive sweep refined %d regions", len(sweeps) - 1)
+
+		data = AdaptiveBodeData(self, self.scales)
+		data._merge(frames)
+		data.sweeps = sweeps
+		data.sweep_time = time.time() - start
+
+		return data
+
+	def enable_sweep_statistics(self):
+		""" Start accumulating statistics of the response over repeated sweeps.
+
+		Each complete sweep received from the instrument is added to the statistics, whether or not it's returned
+		by :any:`get_data`. Use :any:`start_sweep` to sweep repeatedly. Enabling the statistics again replaces the
+		previous ones.
+
+		:rtype: :any:`BodeSweepStatistics`
+		:return: The statistics, updated as sweeps arrive.
+		"""
+		self._sweep_stats = BodeSweepStatistics()
+		return self._sweep_stats
+
+	def disable_sweep_statistics(self):
+		""" Stop accumulating sweep statistics. The last statistics returned by :any:`enable_sweep_statistics` are kept. """
+		self._sweep_stats = None
+
+	def iter_sweep_data(self, timeout=None):
+		""" Follow a sweep as it progresses, so sweep points can be processed as they are measured.
+
+		Yields a frame each time further points of the sweep have been measured, together with the range of
+		points that are new in that frame. Finishes once a frame containing the complete sweep has been yielded.
+
+		In *fullframe* X-mode (see :any:`set_xmode`), frames are only sent when a sweep completes, so this yields
+		a single complete frame. Use *sweep* X-mode to receive partial sweeps. Use :any:`estimate_sweep_time`
+		to choose *timeout*.
+
+		:type timeout: float
+		:param timeout: Maximum time to wait for each frame, or *None* for indefinite.
+
+		:rtype: iterator of (:any:`BodeData`, int, int)
+		:return: (frame, first, end), where the points from index *first* up to but excluding *end* are new.
+
+		:raises FrameTimeout: if a frame isn't received within *timeout*.
+		"""
+		_utils.check_parameter_valid('float', timeout, desc='data timeout', allow_none=True)
+
+		done = 0
+		while True:
+			frame = self.get_realtime_data(timeout=timeout, wait=True)
+			measured = frame.measured_points
+
+			# A new sweep has begun, without the previous one having been seen to complete
+			if measured < done:
+				done = 0
+
+			if measured > done:
+				yield frame, done, measured
+				done = measured
+
+			if done and done == len(frame.frequency):
+				return
+
 	def get_data(self, timeout=None, wait=True):
 		""" Get current sweep data.
 		In the BodeAnalyzer this is an alias for ``get_realtime_data`` as the data
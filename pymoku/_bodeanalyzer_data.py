@@ -1,7 +1,10 @@
 import math
-import struct
+import threading
+
+import numpy as np
 
 from . import _frame_instrument
+from ._frame_instrument_data import _to_list
 
 
 class _BodeChannelData():
@@ -9,27 +12,41 @@ class _BodeChannelData():
 	def __init__(self, input_signal, gain_correction, front_end_scale, output_amp):
 
 		# Extract the length of the signal (this varies with number of sweep points)
-		sig_len = len(gain_correction)
+		sig_len = min(len(gain_correction), len(input_signal) // 2)
+		gain_correction = gain_correction[:sig_len]
+
+		# De-interleave IQ values, marking any invalid samples
+		bits = input_signal[:2 * sig_len]
+		inval_i = bits[0::2] == -0x80000000
+		inval_q = bits[1::2] == -0x80000000
+		invalid = inval_i | inval_q
+
+		# Number of points measured so far. They fill in from the start of the sweep, so this is up to the
+		# last valid point, counting any invalid points before it, as a complete sweep may include some.
+		valid = np.flatnonzero(~invalid)
+		self._measured = int(valid[-1]) + 1 if len(valid) else 0
 
-		# De-interleave IQ values
-		self.i_sig, self.q_sig = zip(*zip(*[iter(input_signal)]*2))
-		self.i_sig = self.i_sig[:sig_len]
-		self.q_sig = self.q_sig[:sig_len]
+		iq = bits.astype(np.float64).view(np.complex128)
+		self.i_sig = _to_list(iq.real, inval_i)
+		self.q_sig = _to_list(iq.imag, inval_q)
+		iq[invalid] = 0
 
-		# Calculates magnitude of a sample given I,Q and gain correction factors
-		def calculate_magnitude(I,Q,G,frontend_scale):
-			if I is None or Q is None:
-				return None
-			else:
-				return 2.0 * math.sqrt((I or 0)**2 + (Q or 0)**2) * front_end_scale / (G or 1)
+		# Complex response in volts, kept for sweep statistics
+		self._response = np.where(invalid, np.nan, 2.0 * iq * front_end_scale / gain_correction)
 
-		self.magnitude = [calculate_magnitude(I,Q,G,front_end_scale) for I, Q, G in zip(self.i_sig, self.q_sig, gain_correction)]
+		magnitude = 2.0 * np.abs(iq) * front_end_scale / gain_correction
+		self.magnitude = _to_list(magnitude, invalid)
 
 		# Sometimes there's a transient condition at startup where we don't have a valid output_amp. Return Nones in that
 		# case in preference to exploding.
-		self.magnitude_dB = [ None if not x else 20.0 * math.log10(x / output_amp) if output_amp else None for x in self.magnitude ]
+		if output_amp:
+			no_db = invalid | (magnitude == 0)
+			with np.errstate(divide='ignore'):
+				self.magnitude_dB = _to_list(20.0 * np.log10(magnitude / output_amp), no_db)
+		else:
+			self.magnitude_dB = [None] * sig_len
 
-		self.phase = [ None if (I is None or Q is None) else (math.atan2(Q or 0, I or 0))/(2.0*math.pi) for I, Q in zip(self.i_sig, self.q_sig)]
+		self.phase = _to_list(np.angle(iq) / (2.0 * math.pi), invalid)
 
 	def __json__(self):
 		return { 'magnitude' : self.magnitude, 'magnitude_dB' : self.magnitude_dB, 'phase' : self.phase }
@@ -52,6 +69,7 @@ class BodeData(_frame_instrument.InstrumentData):
 	- ``ch2.magnitude_dB`` = ``[CH2_MAG_DATA_DB]``
 	- ``ch2.phase`` = ``[CH2_PHASE_DATA]``
 	- ``frequency`` = ``[FREQ]``
+	- ``measured_points`` = ``n``
 	- ``waveformid`` = ``n``
 
 	"""
@@ -64,6 +82,9 @@ class BodeData(_frame_instrument.InstrumentData):
 		#: Obtain all data scaling factors relevant to current NetAn configuration
 		self.scales = scales
 
+		#: Number of sweep points measured so far, equal to the length of *frequency* once the sweep is complete
+		self.measured_points = 0
+
 	def __json__(self):
 		# Annoying this doesn't recursively-descend, I thought it did. Manually serialise the children for now
 		return { 'ch1' : self.ch1.__json__(), 'ch2' : self.ch2.__json__(), 'frequency' : self.frequency, 'waveform_id' : self.waveformid }
@@ -82,21 +103,19 @@ class BodeData(_frame_instrument.InstrumentData):
 		try:
 			self.frequency = scales['frequency_axis']
 
-			smpls = int(len(self._raw1) / 4)
-			dat = struct.unpack('<' + 'i' * smpls, self._raw1)
-			dat = [ x if x != -0x80000000 else None for x in dat ]
-
-			self.ch1_bits = [ float(x) if x is not None else None for x in dat ]
+			self.ch1_bits = np.frombuffer(self._raw1, dtype='<i4')
 			self.ch1 = _BodeChannelData(self.ch1_bits, scales['gain_correction'], scales['g1'], scales['sweep_amplitude_ch1'])
 
-			smpls = int(len(self._raw2) / 4)
-			dat = struct.unpack('<' + 'i' * smpls, self._raw2)
-			dat = [ x if x != -0x80000000 else None for x in dat ]
-
-			self.ch2_bits = [ float(x) if x is not None else None for x in dat ]
+			self.ch2_bits = np.frombuffer(self._raw2, dtype='<i4')
 			self.ch2 = _BodeChannelData(self.ch2_bits, scales['gain_correction'], scales['g2'], scales['sweep_amplitude_ch2'])
 
-		except (IndexError, TypeError, struct.error):
+			self.measured_points = min(self.ch1._measured, self.ch2._measured)
+
+			stats = getattr(self._instrument, '_sweep_stats', None)
+			if stats is not None and self.measured_points == len(self.frequency):
+				stats._add(self)
+
+		except (IndexError, TypeError, ValueError):
 			# If the data is bollocksed, force a reinitialisation on next packet
 			#log.exception("Invalid Bode Analyzer packet")
 			self.frameid = None
@@ -104,3 +123,162 @@ class BodeData(_frame_instrument.InstrumentData):
 
 		# A valid frame is there's at least one valid sample in each channel
 		return self.ch1 and self.ch2
+
+
+class BodeSweepStatistics(object):
+	"""
+	Running statistics of the complex response at each point over repeated sweeps of a :any:`BodeAnalyzer`.
+
+	Each complete sweep received from the instrument is added once, however many frames it's repeated in.
+	Statistics are updated as sweeps arrive and their memory use doesn't depend on the number of sweeps.
+	They restart whenever the instrument settings change.
+
+	This object should not be instantiated directly, but is returned by
+	:any:`enable_sweep_statistics <pymoku.instruments.BodeAnalyzer.enable_sweep_statistics>`.
+	"""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		""" Discard all sweeps. """
+		with self._lock:
+			self._stateid = None
+			self._waveformid = None
+			self._acc = None
+
+			#: Number of sweeps included.
+			self.count = 0
+
+			#: The frequency of each point.
+			self.frequency = []
+
+	def _add(self, frame):
+		# A sweep captured under earlier settings, but rendered with the current ones, doesn't belong in them
+		if frame._trigstate != frame._stateid:
+			return
+
+		with self._lock:
+			if frame._stateid != self._stateid or self._acc is None or len(self._acc['n'][0]) != len(frame.frequency):
+				n = len(frame.frequency)
+				self._acc = {
+					'n': np.zeros((2, n)),
+					'mean': np.zeros((2, n), dtype=complex),
+					'm2': np.zeros((2, n)),
+					'min': np.full((2, n), np.nan),
+					'max': np.full((2, n), np.nan),
+				}
+				self._stateid = frame._stateid
+				self._waveformid = None
+				self._amplitude = (frame.scales[frame._stateid]['sweep_amplitude_ch1'], frame.scales[frame._stateid]['sweep_amplitude_ch2'])
+				self.count = 0
+				self.frequency = frame.frequency
+			elif frame.waveformid == self._waveformid:
+				return
+
+			self._waveformid = frame.waveformid
+			self.count += 1
+
+			# Welford's update of the mean and sum of squared distances from it, ignoring invalid points
+			acc = self._acc
+			z = np.vstack((frame.ch1._response, frame.ch2._response))
+			valid = ~np.isnan(z)
+			z = np.where(valid, z, 0)
+
+			acc['n'] += valid
+			d = z - acc['mean']
+			acc['mean'] += np.where(valid, d / np.maximum(acc['n'], 1), 0)
+			acc['m2'] += np.where(valid, (d * np.conj(z - acc['mean'])).real, 0)
+
+			mag = np.where(valid, np.abs(z), np.nan)
+			acc['min'] = np.fmin(acc['min'], mag)
+			acc['max'] = np.fmax(acc['max'], mag)
+
+	def get(self, ch=1):
+		""" Get the statistics of one channel.
+
+		:type ch: int; {1,2}
+		:param ch: Channel
+
+		:rtype: dict
+		:return: Arrays with a value per point: *response*, the mean complex response (volts); *magnitude*,
+			*magnitude_dB* and *phase* (cycles) of the mean response, as in :any:`BodeData`; *variance*, the
+			variance of the complex response (volts squared); and *min* and *max*, the extremes of magnitude.
+			Values are NaN where there's no data.
+		"""
+		if ch not in [1, 2]:
+			raise ValueError("Invalid channel %s" % ch)
+
+		with self._lock:
+			if self._acc is None:
+				empty = np.array([])
+				return { k: empty for k in ['response', 'magnitude', 'magnitude_dB', 'phase', 'variance', 'min', 'max'] }
+
+			acc = self._acc
+			n = acc['n'][ch - 1]
+			mean = np.where(n > 0, acc['mean'][ch - 1], np.nan)
+			amplitude = self._amplitude[ch - 1]
+
+			with np.errstate(divide='ignore', invalid='ignore'):
+				return {
+					'response': mean,
+					'magnitude': np.abs(mean),
+					'magnitude_dB': 20.0 * np.log10(np.abs(mean) / amplitude) if amplitude else np.full(len(n), np.nan),
+					'phase': np.angle(mean) / (2.0 * math.pi),
+					'variance': np.where(n > 1, acc['m2'][ch - 1] / (n - 1), np.nan),
+					'min': acc['min'][ch - 1].copy(),
+					'max': acc['max'][ch - 1].copy(),
+				}
+
+
+class AdaptiveBodeData(BodeData):
+	"""
+	Frequency response made by merging a coarse sweep with finer sweeps around its features, as returned by
+	:any:`get_adaptive_data <pymoku.instruments.BodeAnalyzer.get_adaptive_data>`.
+
+	The data has the same form as :any:`BodeData`, but the points aren't evenly spaced in frequency.
+
+	- ``sweeps`` = ``[(F_START, F_END, POINTS)]``
+	- ``sweep_time`` = ``t``
+	"""
+	def __init__(self, instrument, scales):
+		super(AdaptiveBodeData, self).__init__(instrument, scales)
+
+		#: The frequency range and number of points of each sweep, coarse sweep first
+		self.sweeps = []
+
+		#: Time taken for all sweeps, in seconds
+		self.sweep_time = None
+
+	def __json__(self):
+		d = super(AdaptiveBodeData, self).__json__()
+		d['sweeps'] = self.sweeps
+		return d
+
+	def _merge(self, frames):
+		# The raw IQ values and gain corrections of all sweep points are merged in order of frequency and
+		# scaled together. Later (finer) sweeps take precedence where points coincide.
+		fs, bits1, bits2, gains = [], [], [], []
+		for frame in reversed(frames):
+			scales = self.scales[frame._stateid]
+			n = len(scales['frequency_axis'])
+
+			fs.append(np.asarray(scales['frequency_axis'], dtype=float))
+			bits1.append(frame.ch1_bits[:2 * n].reshape(-1, 2))
+			bits2.append(frame.ch2_bits[:2 * n].reshape(-1, 2))
+			gains.append(np.asarray(scales['gain_correction'][:n], dtype=float))
+
+		f = np.concatenate(fs)
+		order = np.argsort(f, kind='stable')
+		f = f[order]
+		keep = np.concatenate([[True], np.diff(f) > 0])
+		order = order[keep]
+
+		scales = self.scales[frames[0]._stateid]
+		gain = np.concatenate(gains)[order]
+
+		self.frequency = f[keep].tolist()
+		self.ch1 = _BodeChannelData(np.concatenate(bits1)[order].ravel(), gain, scales['g1'], scales['sweep_amplitude_ch1'])
+		self.ch2 = _BodeChannelData(np.concatenate(bits2)[order].ravel(), gain, scales['g2'], scales['sweep_amplitude_ch2'])
+		self.measured_points = len(self.frequency)
+		self.waveformid = frames[-1].waveformid
@@ -12,6 +12,7 @@ from queue import Queue, Empty
 
 from . import *
 from . import _instrument, _get_autocommit, _input_instrument
+from . import _utils
 
 from ._instrument import needs_commit
 
@@ -19,6 +20,9 @@ from ._frame_instrument_data import InstrumentData
 
 log = logging.getLogger(__name__)
 
+# Number of frames that may be waiting for subscriber callbacks before the oldest are dropped
+_DISPATCH_BUFLEN = 16
+
 class FrameQueue(Queue):
 	def put(self, item, block=True, timeout=None):
 		# Behaves the same way as default except that instead of raising Full, it
@@ -62,6 +66,100 @@ class FrameQueue(Queue):
 	def _init(self, maxsize):
 		self.queue = deque(maxlen=maxsize)
 
+class FrameSubscription(object):
+	"""
+	Handle representing a callback registered with :any:`subscribe`. Pass this object to
+	:any:`unsubscribe` to stop receiving frames.
+	"""
+	def __init__(self, callback, only_new, state_filter):
+		self.callback = callback
+		self.only_new = only_new
+		self.state_filter = state_filter
+
+		self._last_waveformid = None
+
+	def _accepts(self, instrument, frame):
+		if self.state_filter == 'current':
+			if frame._trigstate != instrument._stateid:
+				return False
+		elif self.state_filter == 'any':
+			if frame._trigstate != frame._stateid:
+				return False
+		elif not self.state_filter(frame):
+			return False
+
+		if self.only_new:
+			if frame.waveformid == self._last_waveformid:
+				return False
+			self._last_waveformid = frame.waveformid
+
+		return True
+
+	def _dispatch(self, instrument, frame):
+		try:
+			if self._accepts(instrument, frame):
+				self.callback(frame)
+		except Exception:
+			log.exception("Frame subscriber raised an exception")
+
+class FrameConsumer(object):
+	"""
+	Named frame queue registered with :any:`add_consumer`. Each consumer receives every decoded
+	frame independently of other consumers and of the default queue read by :any:`get_realtime_data`.
+
+	*dropped* counts the frames discarded because the consumer's queue was full.
+	"""
+	def __init__(self, name, buflen, drop):
+		self.name = name
+		self.drop = drop
+		self.dropped = 0
+		self.queue = FrameQueue(maxsize=buflen)
+
+	def _put(self, frame):
+		# The queue is only ever added to from the frame worker, so it can't fill between
+		# checking and adding.
+		if self.queue.full():
+			self.dropped += 1
+			if self.drop == 'newest':
+				return
+
+		self.queue.put_nowait(frame)
+
+class _BufferJob(threading.Thread):
+	# Parses a buffer downloaded by iter_data while the instrument captures the next one
+	def __init__(self, instrument, parser, msgs, frame, selection, captured):
+		super(_BufferJob, self).__init__()
+		self.daemon = True
+		self._args = (instrument, parser, msgs, frame, selection)
+		self._captured = captured
+		self._result, self._error = None, None
+
+	def run(self):
+		instrument, parser, msgs, frame, selection = self._args
+		try:
+			for ch, start, coeff, raw in msgs:
+				parser.set_coeff(ch, coeff)
+				parser.parse(raw, ch, start_idx=start)
+
+			# Single-channel sessions are parsed in to the first list
+			if selection[0] and selection[1]:
+				channel_data = parser.processed
+			elif selection[0]:
+				channel_data = [parser.processed[0], []]
+			else:
+				channel_data = [[], parser.processed[0]]
+
+			self._result = instrument._make_buffer(frame, channel_data, selection)
+			self._result._capture_time = self._captured
+		except Exception as e:
+			self._error = e
+
+	def result(self):
+		self.join()
+		if self._error:
+			raise self._error
+		return self._result
+
 # Revisit: Should this be a Mixin? Are there more instrument classifications of this type, recording ability, for example?
 class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuInstrument):
 	def __init__(self):
@@ -70,8 +168,31 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 		self._queue = FrameQueue(maxsize=self._buflen)
 		self._hb_forced = False
 
+		# Frames waiting to be handed to subscribers by the dispatch thread
+		self._subscriptions = []
+		self._sub_lock = threading.Lock()
+		self._dispatch_queue = FrameQueue(maxsize=_DISPATCH_BUFLEN)
+
+		# Named consumer queues. The tuple is replaced rather than modified so the frame worker
+		# can iterate over it without holding the lock.
+		self._consumers = {}
+		self._consumer_list = ()
+
 		self.skt, self.mon_skt = None, None
 
+		self._fr_worker, self._dispatch_worker = None, None
+		self._worker_lock = threading.Lock()
+
+		# Frame receiver used by the asyncio API, created on first use
+		self._async_frames = None
+
+		self._acquisition_stats = {'acquisitions': 0, 'duration': 0.0, 'rate': 0.0}
+
+		# Last full-resolution buffer downloaded by get_data, as (key, data)
+		self._buffer_cache = None
+		self._buffer_cache_hits = 0
+		self._buffer_cache_misses = 0
+
 		# Tracks whether the waveformid of frames received so far has wrapped
 		self._data_syncd = False
 
@@ -105,7 +226,7 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 		self.framerate = 10
 
 
-	def get_data(self, timeout=None, wait=True):
+	def get_data(self, timeout=None, wait=True, ch1=True, ch2=True, window=None):
 		""" Get full-resolution data from the instrument.
 
 		This will pause the instrument and download the entire contents of the instrument's
@@ -127,6 +248,10 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 		captured with that configuration set can become available. This can take an arbitrary amount
 		of time. For this reason the *timeout* should be set appropriately.
 
+		If no new waveform has been captured and the settings are unchanged since the previous call
+		(e.g. the instrument is paused), the previously downloaded data object is returned again without
+		any transfer. See :any:`get_data_cache_stats`.
+
 		:type timeout: float
 		:param timeout: Maximum time to wait for new data, or *None* for indefinite.
 
@@ -134,16 +259,200 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 		:param wait: If *true* (default), waits for a new waveform to be captured with the most
 			recently-applied settings, otherwise just return the most recently captured valid data.
 
+		:type ch1: bool
+		:param ch1: Download Channel 1. If *false*, the returned channel data is empty.
+
+		:type ch2: bool
+		:param ch2: Download Channel 2. If *false*, the returned channel data is empty.
+
+		:type window: (float, float)
+		:param window: Only return samples between these times in seconds, relative to the trigger point,
+			or *None* (default) for the whole buffer. The download stops as soon as the end of the window has
+			been received, so short windows early in the buffer are quicker to fetch.
+
 		:return: :any:`InstrumentData` subclass, specific to the instrument.
+
+		:raises InvalidOperationException: if no channels are selected, or the instrument doesn't support windowed data.
 		"""
-		if self._moku is None: raise NotDeployedException()
+		self._buffer_check_ready()
+		self._buffer_check_selection(ch1, ch2, window)
 
-		if self.check_uncommitted_state():
-			raise UncommittedSettings("Detected uncommitted instrument settings.")
+		frame = self._buffer_wait_frame(timeout, wait)
+		selection = self._buffer_selection(frame, ch1, ch2, window)
+
+		# The instrument memory still holds the same waveform as last time
+		buff = self._buffer_cache_lookup(frame, selection)
+		if buff is not None:
+			return buff
 
 		# Stop existing logging sessions
 		self._stream_stop()
 
+		was_paused = self._buffer_download_start(selection)
+
+		while not self._buffer_download_done(selection):
+			try:
+				self._stream_receive_samples(timeout)
+			except NoDataException:
+				break
+
+		channel_data = self._buffer_download_finish(was_paused)
+
+		return self._make_buffer(frame, channel_data, selection)
+
+	def get_data_many(self, n, timeout=None, wait=True, ch1=True, ch2=True, window=None):
+		""" Get *n* consecutive full-resolution captures from the instrument.
+
+		Equivalent to calling :any:`get_data` *n* times, except that each capture is a new waveform and
+		the instrument is re-armed as soon as its buffer has been transferred. Decoding of each buffer
+		overlaps with the next capture, so more acquisitions per second can be achieved. The rate of the
+		most recent run is available from :any:`get_acquisition_stats`.
+
+		Parameters are as for :any:`get_data`. The *wait* parameter only applies to the first capture.
+
+		:type n: int
+		:param n: Number of captures.
+
+		:rtype: list
+		:return: :any:`InstrumentData` subclasses, specific to the instrument.
+		"""
+		_utils.check_parameter_valid('int', n, desc='number of captures')
+		_utils.check_parameter_valid('range', n, [1, sys.maxsize], 'number of captures')
+
+		return list(self.iter_data(n, timeout=timeout, wait=wait, ch1=ch1, ch2=ch2, window=window))
+
+	def iter_data(self, n=None, timeout=None, wait=True, ch1=True, ch2=True, window=None):
+		""" Iterate over consecutive full-resolution captures from the instrument.
+
+		Generator version of :any:`get_data_many`. If *n* is *None*, captures continue until the
+		iterator is closed. The rate is available from :any:`get_acquisition_stats` once it finishes.
+
+		:type n: int
+		:param n: Number of captures, or *None* for indefinite.
+		"""
+		self._buffer_check_ready()
+		self._buffer_check_selection(ch1, ch2, window)
+
+		pending = None
+		count = 0
+		start = time.time()
+		frame = None
+
+		try:
+			while n is None or count < n:
+				# Each capture must be a new waveform, with the settings in place for the first one
+				frame = self._buffer_wait_frame(timeout, wait if frame is None else False,
+					frame.waveformid if frame else None)
+				captured = time.time()
+				selection = self._buffer_selection(frame, ch1, ch2, window)
+
+				self._stream_stop()
+				was_paused = self._buffer_download_start(selection)
+
+				msgs = []
+				while not self._buffer_download_done(selection):
+					try:
+						msg = self._stream_get_samples_raw(timeout)
+					except NoDataException:
+						break
+
+					# A window needs samples counted as they arrive to know when to stop, so
+					# only whole buffers have their parsing deferred
+					if window is None:
+						msgs.append(msg)
+					else:
+						self._stream_parse_samples(*msg)
+
+				parser = self._strparser
+				self._buffer_download_stop(was_paused)
+
+				job = _BufferJob(self, parser, msgs, frame, selection, captured)
+				job.start()
+				count += 1
+
+				if pending:
+					yield pending.result()
+				pending = job
+
+			if pending:
+				yield pending.result()
+				pending = None
+		finally:
+			elapsed = time.time() - start
+			self._acquisition_stats = {
+				'acquisitions': count,
+				'duration': elapsed,
+				'rate': count / elapsed if elapsed else 0.0
+			}
+			log.info("%d acquisitions at %.2f/s", count, self._acquisition_stats['rate'])
+
+	def get_acquisition_stats(self):
+		""" Get the number and rate of captures in the last :any:`get_data_many` or :any:`iter_data` run.
+
+		:rtype: dict
+		:return: *acquisitions*, *duration* in seconds and *rate* in acquisitions per second.
+		"""
+		return dict(self._acquisition_stats)
+
+	def get_data_async(self, timeout=None, wait=True, ch1=True, ch2=True, window=None):
+		""" Awaitable version of :any:`get_data`.
+
+		Returns a coroutine that downloads the instrument's internal memory without blocking the
+		running :py:mod:`asyncio` event loop. Network data is received on a :py:mod:`zmq.asyncio`
+		socket; control requests to the Moku are short and are run in the loop's default executor.
+
+		Requires Python 3.6 or later.
+
+		:type timeout: float
+		:param timeout: Maximum time to wait for new data, or *None* for indefinite.
+
+		:type wait: bool
+		:param wait: If *true* (default), waits for a new waveform to be captured with the most
+			recently-applied settings, otherwise just return the most recently captured valid data.
+
+		:type ch1: bool
+		:param ch1: Download Channel 1.
+
+		:type ch2: bool
+		:param ch2: Download Channel 2.
+
+		:type window: (float, float)
+		:param window: Times in seconds relative to the trigger point to return samples between, or *None*
+			(default) for the whole buffer.
+
+		:return: coroutine returning an :any:`InstrumentData` subclass, specific to the instrument.
+		"""
+		self._buffer_check_selection(ch1, ch2, window)
+
+		from . import _async_data
+		return _async_data.get_data(self, timeout, wait, ch1, ch2, window)
+
+	def get_data_cache_stats(self):
+		""" Get the number of :any:`get_data` calls answered from the last downloaded buffer.
+
+		:rtype: dict
+		:return: *hits*, calls that returned the cached buffer, and *misses*, calls that downloaded
+			the instrument memory.
+		"""
+		return {'hits': self._buffer_cache_hits, 'misses': self._buffer_cache_misses}
+
+	def _buffer_cache_lookup(self, frame, selection):
+		key = (frame.waveformid, frame._stateid, frame._trigstate, selection)
+
+		if self._buffer_cache is not None and self._buffer_cache[0] == key:
+			self._buffer_cache_hits += 1
+			return self._buffer_cache[1]
+
+		self._buffer_cache_misses += 1
+		return None
+
+	def _buffer_check_ready(self):
+		if self._moku is None: raise NotDeployedException()
+
+		if self.check_uncommitted_state():
+			raise UncommittedSettings("Detected uncommitted instrument settings.")
+
+	def _buffer_wait_frame(self, timeout, wait, last_waveformid=None):
 		# Block waiting on state to propagate (if wait=True) or a trigger to occur (wait=False)
 		# This also gives us acquisition parameters for the buffer we will subsequently stream
 		frame = self.get_realtime_data(timeout=timeout, wait=wait)
@@ -154,11 +463,53 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 		# but can mean that the function's maximum return time is several times longer than the
 		# user wanted.
 		start = time.time()
-		while not(frame.synchronised):
+		while not(frame.synchronised) or frame.waveformid == last_waveformid:
 			if timeout is not None and (time.time() > start + timeout):
 				raise FrameTimeout("Timed out waiting on instrument data.")
 			frame = self.get_realtime_data(timeout=timeout, wait=wait)
 
+		return frame
+
+	def _buffer_check_selection(self, ch1, ch2, window):
+		_utils.check_parameter_valid('bool', ch1, desc='download channel 1')
+		_utils.check_parameter_valid('bool', ch2, desc='download channel 2')
+
+		if not (ch1 or ch2):
+			raise InvalidOperationException("No channels were selected for download")
+
+		if window is not None:
+			if len(window) != 2 or window[0] > window[1]:
+				raise InvalidParameterException("Invalid window %s. Expected (start, end) times." % (window,))
+			_utils.check_parameter_valid('float', window[0], desc='window start', units='sec')
+			_utils.check_parameter_valid('float', window[1], desc='window end', units='sec')
+
+	def _buffer_selection(self, frame, ch1, ch2, window):
+		# Returns (ch1, ch2, start, end) where start and end are the indices of the buffer samples
+		# covering the window, or (0, None) for the entire buffer
+		if window is None:
+			return (ch1, ch2, 0, None)
+
+		try:
+			scales = self.scales[frame._stateid]
+			t0, ts = scales['buff_time_min'], scales['buff_time_step']
+		except (AttributeError, KeyError):
+			raise InvalidOperationException("Instrument doesn't support windowed data")
+
+		# Tolerate rounding error when the window falls exactly on a sample time
+		start = max(0, int(math.ceil((window[0] - t0) / ts - 1e-9)))
+		end = max(start, int(math.floor((window[1] - t0) / ts + 1e-9)) + 1)
+
+		return (ch1, ch2, start, end)
+
+	def _buffer_download_done(self, selection):
+		end = selection[3]
+		if end is None:
+			return False
+
+		processed = self._stream_get_processed_samples()
+		return all(len(p) >= end for c, p in zip(selection[:2], processed) if c)
+
+	def _buffer_download_start(self, selection, asynchronous=False):
 		# Check if it is already paused
 		was_paused = self._get_pause()
 
@@ -169,14 +520,20 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 				self.commit()
 
 		# Get buffer data using a network stream
-		self._stream_start(start=0, duration=0, use_sd=False, ch1=True, ch2=True, filetype='net')
+		self._stream_start(start=0, duration=0, use_sd=False, ch1=selection[0], ch2=selection[1],
+			filetype='net', asynchronous=asynchronous)
 
-		while True:
-			try:
-				self._stream_receive_samples(timeout)
-			except NoDataException:
-				break
+		return was_paused
+
+	def _buffer_download_finish(self, was_paused):
+		self._buffer_download_stop(was_paused)
+
+		channel_data = self._stream_get_processed_samples()
+		self._stream_clear_processed_samples()
+
+		return channel_data
 
+	def _buffer_download_stop(self, was_paused):
 		# Clean up data streaming threads
 		self._stream_stop()
 
@@ -186,19 +543,21 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 			if not _get_autocommit():
 				self.commit()
 
-		channel_data = self._stream_get_processed_samples()
-		self._stream_clear_processed_samples()
-
+	def _make_buffer(self, frame, channel_data, selection):
 		# Take the channel buffer data and put it into an 'InstrumentData' object
 		if(getattr(self, '_frame_class', None)):
+			start, end = selection[2:]
 			buff = self._frame_class(**self._frame_kwargs)
-			buff.ch1 = channel_data[0]
-			buff.ch2 = channel_data[1]
+			buff.ch1 = channel_data[0][start:end]
+			buff.ch2 = channel_data[1][start:end]
+			buff._buffer_offset = start
 			buff.waveformid = frame.waveformid
 			buff._stateid = frame._stateid
 			buff._trigstate = frame._trigstate
 			# Finalise the buffer processing stage
 			buff.process_buffer()
+
+			self._buffer_cache = ((frame.waveformid, frame._stateid, frame._trigstate, selection), buff)
 			return buff
 		else:
 			raise Exception("Unable to process instrument data.")
@@ -209,7 +568,7 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 		self.framerate = fr
 
 
-	def get_realtime_data(self, timeout=None, wait=True):
+	def get_realtime_data(self, timeout=None, wait=True, consumer=None):
 		""" Get downsampled data from the instrument with low latency.
 
 		Returns a new :any:`InstrumentData` subclass (instrument-specific), containing
@@ -240,18 +599,31 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 		:param wait: If *true* (default), waits for a new waveform to be captured with the most
 			recently-applied settings, otherwise just return the most recently captured valid data.
 
+		:type consumer: string
+		:param consumer: Name of a consumer registered with :any:`add_consumer` to read frames from,
+			or *None* (default) to use the instrument's default frame queue.
+
 		:return: :any:`InstrumentData` subclass, specific to the instrument.
+
+		:raises InvalidOperationException: if the consumer is not registered.
 		"""
+		if consumer is None:
+			queue = self._queue
+		else:
+			queue = self._get_consumer(consumer).queue
+
+		self._start_frame_worker()
+
 		try:
 			# Dodgy hack, infinite timeout gets translated in to just an exceedingly long one
 			endtime = time.time() + (timeout or sys.maxsize)
 			while self._running:
-				frame = self._queue.get(block=True, timeout=timeout)
+				frame = queue.get(block=True, timeout=timeout)
 				# Return only frames with a triggered and rendered state being equal (so we can
 				# interpret the data correctly using the entire state)
 				# If wait is set, only frames that have the triggered state equal to the
 				# currently committed state will be returned.
-				if (not wait and frame._trigstate == frame._stateid) or (frame._trigstate == self._stateid):
+				if self._frame_accepted(frame, wait):
 					return frame
 				elif time.time() > endtime:
 					raise FrameTimeout()
@@ -260,26 +632,177 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 		except Empty:
 			raise FrameTimeout()
 
+	def _frame_accepted(self, frame, wait):
+		return (not wait and frame._trigstate == frame._stateid) or (frame._trigstate == self._stateid)
+
+	def get_realtime_data_async(self, timeout=None, wait=True):
+		""" Awaitable version of :any:`get_realtime_data`.
+
+		Returns a coroutine that receives frames on a :py:mod:`zmq.asyncio` socket owned by the
+		running event loop, so many instruments can be driven from a single loop without a frame
+		thread per device.
+
+		Requires Python 3.6 or later.
+
+		:type timeout: float
+		:param timeout: Maximum time to wait for new data, or *None* for indefinite.
+
+		:type wait: bool
+		:param wait: If *true* (default), waits for a new waveform to be captured with the most
+			recently-applied settings, otherwise just return the most recently captured valid data.
+
+		:return: coroutine returning an :any:`InstrumentData` subclass, specific to the instrument.
+		"""
+		from . import _async_data
+		return _async_data.get_realtime_data(self, timeout, wait)
+
+	def subscribe(self, callback, only_new=True, state_filter='current'):
+		""" Register a function to be called with each new frame of data.
+
+		Callbacks are run on a dedicated dispatch thread as soon as each frame has been received
+		and decoded, so consumers don't need to poll :any:`get_realtime_data`. Callbacks should return
+		promptly; if they fall behind, the oldest undelivered frames are dropped.
+
+		:type callback: callable
+		:param callback: Function taking a single :any:`InstrumentData` argument.
+
+		:type only_new: bool
+		:param only_new: If *true* (default), only deliver frames with a new *waveformid*, i.e. skip repeated
+			frames sent while the instrument is paused or waiting on a trigger.
+
+		:type state_filter: string, {'current', 'any'} or callable
+		:param state_filter: Which frames to deliver. 'current' (default) only delivers frames captured with
+			the most recently-applied settings, 'any' delivers all frames that can be interpreted with their own
+			settings. Alternatively, a function taking the frame and returning *True* if it should be delivered.
+
+		:rtype: :any:`FrameSubscription`
+		:return: Handle to pass to :any:`unsubscribe`.
+		"""
+		if not callable(state_filter):
+			_utils.check_parameter_valid('set', state_filter, ['current', 'any'], 'state filter')
+		_utils.check_parameter_valid('bool', only_new, desc='only new frames')
+
+		sub = FrameSubscription(callback, only_new, state_filter)
+
+		with self._sub_lock:
+			self._subscriptions.append(sub)
+
+		self._start_frame_worker()
+
+		return sub
+
+	def unsubscribe(self, subscription):
+		""" Stop delivering frames to a callback registered with :any:`subscribe`.
+
+		:type subscription: :any:`FrameSubscription`
+		:param subscription: Handle returned by :any:`subscribe`.
+
+		:raises InvalidOperationException: if the subscription is not registered.
+		"""
+		with self._sub_lock:
+			try:
+				self._subscriptions.remove(subscription)
+			except ValueError:
+				raise InvalidOperationException("Not a current frame subscription")
+
+	def add_consumer(self, name, buflen=1, drop='oldest'):
+		""" Register a named consumer with its own frame queue.
+
+		Every decoded frame is handed to each consumer's queue, so several threads (e.g. plotting and
+		logging) can each see every frame by passing their own *consumer* name to :any:`get_realtime_data`.
+		Frames are decoded once and shared between consumers, so they should be treated as read-only.
+
+		:type name: string
+		:param name: Name identifying the consumer.
+
+		:type buflen: int
+		:param buflen: Maximum number of frames waiting in the consumer's queue.
+
+		:type drop: string, {'oldest', 'newest'}
+		:param drop: Frame discarded when a new frame arrives and the queue is full. 'oldest' (default)
+			keeps the consumer up to date, 'newest' keeps a contiguous run of frames.
+
+		:rtype: :any:`FrameConsumer`
+		:return: The consumer; its *dropped* attribute counts discarded frames.
+
+		:raises InvalidOperationException: if a consumer with that name already exists.
+		"""
+		_utils.check_parameter_valid('int', buflen, desc='consumer buffer length')
+		_utils.check_parameter_valid('range', buflen, [1, sys.maxsize], 'consumer buffer length')
+		_utils.check_parameter_valid('set', drop, ['oldest', 'newest'], 'drop policy')
+
+		with self._sub_lock:
+			if name in self._consumers:
+				raise InvalidOperationException("Frame consumer '%s' already exists" % name)
+
+			consumer = FrameConsumer(name, buflen, drop)
+			self._consumers[name] = consumer
+			self._consumer_list = tuple(self._consumers.values())
+
+		return consumer
+
+	def remove_consumer(self, name):
+		""" Remove a consumer registered with :any:`add_consumer`.
+
+		:type name: string
+		:param name: Name of the consumer.
+
+		:raises InvalidOperationException: if the consumer is not registered.
+		"""
+		with self._sub_lock:
+			if name not in self._consumers:
+				raise InvalidOperationException("No frame consumer named '%s'" % name)
+
+			del self._consumers[name]
+			self._consumer_list = tuple(self._consumers.values())
+
+	def _get_consumer(self, name):
+		try:
+			return self._consumers[name]
+		except KeyError:
+			raise InvalidOperationException("No frame consumer named '%s'" % name)
+
 	def _set_running(self, state):
 		prev_state = self._running
 		super(FrameBasedInstrument, self)._set_running(state)
-		if state and not prev_state:
+		if not state and prev_state:
+			if self._async_frames:
+				self._async_frames.close()
+				self._async_frames = None
+
+			with self._worker_lock:
+				if self._fr_worker:
+					self._fr_worker.join()
+					self._dispatch_worker.join()
+				self._fr_worker, self._dispatch_worker = None, None
+
+	def _start_frame_worker(self):
+		# The frame and dispatch threads are only started once frames are first requested
+		# synchronously, so instruments driven purely through the asyncio API don't need them.
+		with self._worker_lock:
+			if self._fr_worker or not self._running:
+				return
+
 			self._fr_worker = threading.Thread(target=self._frame_worker)
 			self._fr_worker.start()
-		elif not state and prev_state:
-			self._fr_worker.join()
+			self._dispatch_worker = threading.Thread(target=self._frame_dispatcher)
+			self._dispatch_worker.daemon = True
+			self._dispatch_worker.start()
+
+	def _frame_socket(self, ctx):
+		skt = ctx.socket(zmq.SUB)
+		skt.connect("tcp://%s:27185" % self._moku._ip)
+		skt.setsockopt_string(zmq.SUBSCRIBE, u'')
+		skt.setsockopt(zmq.RCVHWM, 2)
+		skt.setsockopt(zmq.LINGER, 0)
+		return skt
 
 	def _make_frame_socket(self):
 
 		if self.skt:
 			self.skt.close()
 
-		ctx = zmq.Context.instance()
-		self.skt = ctx.socket(zmq.SUB)
-		self.skt.connect("tcp://%s:27185" % self._moku._ip)
-		self.skt.setsockopt_string(zmq.SUBSCRIBE, u'')
-		self.skt.setsockopt(zmq.RCVHWM, 2)
-		self.skt.setsockopt(zmq.LINGER, 0)
+		self.skt = self._frame_socket(zmq.Context.instance())
 
 	def _frame_worker(self):
 		connected = False
@@ -297,6 +820,10 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 
 						if fr._complete:
 							self._queue.put_nowait(fr)
+							for consumer in self._consumer_list:
+								consumer._put(fr)
+							if self._subscriptions:
+								self._dispatch_queue.put_nowait(fr)
 							fr = self._frame_class(**self._frame_kwargs)
 					else:
 						if connected:
@@ -307,3 +834,16 @@ class FrameBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuIn
 				log.exception("Closed Frame worker")
 			finally:
 				self.skt.close()
+
+	def _frame_dispatcher(self):
+		while self._running:
+			try:
+				frame = self._dispatch_queue.get(block=True, timeout=1.0)
+			except Empty:
+				continue
+
+			with self._sub_lock:
+				subs = list(self._subscriptions)
+
+			for sub in subs:
+				sub._dispatch(self, frame)
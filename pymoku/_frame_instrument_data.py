@@ -1,8 +1,19 @@
 import struct
 
+import numpy as np
+
 import logging
 log = logging.getLogger('frdat')
 
+def _to_list(data, invalid):
+	# Convert a processed channel array to the list form presented to the user, with
+	# invalid samples marked as None.
+	out = data.tolist()
+	if invalid.any():
+		for i in np.flatnonzero(invalid):
+			out[i] = None
+	return out
+
 class InstrumentData(object):
 	"""
 	Superclass representing a full frame of some kind of data. This class is never used directly,
@@ -38,6 +49,9 @@ class InstrumentData(object):
 
 		self._flags = None
 
+		# Index in the instrument memory of the first sample, for partial buffers from get_data
+		self._buffer_offset = 0
+
 	def add_packet(self, packet):
 		hdr_len = 8
 		meta_len = 8 * 4
@@ -140,7 +140,7 @@ class InputInstrument(_instrument.MokuInstrument):
 			f = self.fmtstr.format(ch1=ch1, ch2=ch2, t=-1, T=-1, n=1, d=0.1) # Dummy values chosen for maximum formatted length
 			return (duration / self.timestep) *  len(f)
 
-	def _stream_start(self, start, duration, use_sd, ch1, ch2, filetype):
+	def _stream_start(self, start, duration, use_sd, ch1, ch2, filetype, asynchronous=False):
 		""" Start an instrument streaming session.
 
 		If the duration is non-zero, the device must be in ROLL mode (via a call to :any:`set_xmode`).
@@ -171,6 +171,9 @@ class InputInstrument(_instrument.MokuInstrument):
 		- **mat** -- MATLAB file
 		- **npy** -- NPY (Numpy) data file
 		- **net** -- Log to network, retrieve data with :any:`_stream_receive_samples`
+
+		:type asynchronous: bool
+		:param asynchronous: For 'net' streams, receive data on a :py:mod:`zmq.asyncio` socket.
 		"""
 		if (not ch1) and (not ch2):
 			raise InvalidOperationException("No channels were selected for logging")
@@ -247,7 +250,7 @@ class InputInstrument(_instrument.MokuInstrument):
 			self._stream_error(status=e.err)
 
 		if filetype == 'net':
-			self._streamsub_init(self.tag)
+			self._streamsub_init(self.tag, asynchronous)
 
 		log.info("Starting new data streaming session.")
 		self._moku._stream_start()
@@ -394,8 +397,14 @@ class InputInstrument(_instrument.MokuInstrument):
 		if not self._stream_net_is_running():
 			raise StreamException("No network stream is currently running.")
 
-		ch, start, coeff, raw = self._stream_get_samples_raw(timeout)
+		self._stream_parse_samples(*self._stream_get_samples_raw(timeout))
+
+	def _stream_parse_samples(self, ch, start, coeff, raw):
+		"""
+			Parses a block of raw samples received off the network.
 
+			:raises DataIntegrityException: If the network layer detects dropped data
+		"""
 		self._strparser.set_coeff(ch, coeff)
 		self._strparser.parse(raw, ch, start_idx=start)
 
@@ -441,26 +450,41 @@ class InputInstrument(_instrument.MokuInstrument):
 		"""
 		if self._dlskt in zmq.select([self._dlskt], [], [], timeout)[0]:
 			hdr, data = self._dlskt.recv_multipart()
+			return self._stream_decode_msg(hdr, data)
+		else:
+			raise FrameTimeout("Data log timed out after %d seconds", timeout)
+
+	def _stream_decode_msg(self, hdr, data):
+		"""
+			Decodes a stream message received off the network
 
-			hdr = hdr.decode('ascii')
-			tag, ch, start, coeff = hdr.split('|')
-			ch = int(ch)
-			start = int(start)
-			coeff = float(coeff)
+			:raises NoDataException: Once the stream terminates.
+		"""
+		hdr = hdr.decode('ascii')
+		tag, ch, start, coeff = hdr.split('|')
+		ch = int(ch)
+		start = int(start)
+		coeff = float(coeff)
 
-			# Special value to indicate the stream has finished
-			if ch == -1:
-				raise NoDataException("Data log terminated")
+		# Special value to indicate the stream has finished
+		if ch == -1:
+			raise NoDataException("Data log terminated")
 
-			return ch, start, coeff, data
-		else:
-			raise FrameTimeout("Data log timed out after %d seconds", timeout)
+		return ch, start, coeff, data
 
-	def _streamsub_init(self, tag):
+	def _streamsub_init(self, tag, asynchronous=False):
 		"""
 			Initialises a ZMQ stream subscriber and data parser for current session.
+
+			If *asynchronous* is set, the subscriber is a :py:mod:`zmq.asyncio` socket to be
+			read from a coroutine.
 		"""
-		ctx = zmq.Context.instance()
+		if asynchronous:
+			from ._async_data import _context
+			ctx = _context()
+		else:
+			ctx = zmq.Context.instance()
+
 		self._dlskt = ctx.socket(zmq.SUB)
 		self._dlskt.connect("tcp://%s:27186" % self._moku._ip)
 		self._dlskt.setsockopt_string(zmq.SUBSCRIBE, tag)
@@ -5,11 +5,12 @@ import re
 
 from ._instrument import *
 from . import _frame_instrument
+from . import dataparser
 from . import _waveform_generator
 from . import _utils
 from ._trigger import Trigger
 
-from ._oscilloscope_data import VoltsData, _OSC_SCREEN_WIDTH
+from ._oscilloscope_data import VoltsData, SegmentedVoltsData, RecordVoltsData, _OSC_SCREEN_WIDTH
 
 log = logging.getLogger(__name__)
 
@@ -252,6 +253,122 @@ class _CoreOscilloscope(_frame_instrument.FrameBasedInstrument):
 		xmode = _utils.str_to_val(_str_to_xmode, xmode, 'X-mode')
 		self.x_mode = xmode
 
+	def get_segmented_data(self, n, timeout=None, ch1=True, ch2=True, window=None):
+		""" Capture *n* consecutive triggered buffers at full resolution.
+
+		Each trigger event is streamed out of the instrument memory and the instrument re-armed
+		immediately, with decoding overlapped with the next capture (see :any:`get_data_many`).
+		The captures are collected in to two-dimensional arrays of shape (n, samples).
+
+		The instrument must be in 'sweep' or 'fullframe' x-mode, see :any:`set_xmode`.
+
+		:type n: int
+		:param n: Number of segments to capture.
+
+		:type timeout: float
+		:param timeout: Maximum time to wait for each segment, or *None* for indefinite.
+
+		:type ch1: bool
+		:param ch1: Capture Channel 1.
+
+		:type ch2: bool
+		:param ch2: Capture Channel 2.
+
+		:type window: (float, float)
+		:param window: Times in seconds relative to the trigger point to capture between, or *None*
+			(default) for the whole buffer.
+
+		:rtype: :any:`SegmentedVoltsData`
+		:return: The captured segments.
+
+		:raises InvalidOperationException: if the instrument is in roll mode.
+		"""
+		if self.x_mode == _OSC_ROLL:
+			raise InvalidOperationException("Segmented capture requires a triggered x-mode, not roll")
+
+		_utils.check_parameter_valid('int', n, desc='number of segments')
+		_utils.check_parameter_valid('range', n, [1, 2**31], 'number of segments')
+
+		segments = None
+		for i, data in enumerate(self.iter_data(n, timeout=timeout, ch1=ch1, ch2=ch2, window=window)):
+			if segments is None:
+				segments = SegmentedVoltsData(n, data.time)
+			segments._set_segment(i, data)
+
+		return segments
+
+	def get_long_record(self, duration, ch1=True, ch2=True, timeout=None):
+		""" Capture a continuous record longer than the instrument memory.
+
+		The instrument is switched to roll mode and its samples streamed over the network for *duration*
+		seconds, then returned to its previous x-mode. Samples are decoded straight in to arrays, so records
+		of millions of samples are practical at rates the network stream can sustain.
+
+		All settings must be committed before calling this function. The sample rate is set by the timebase,
+		or directly with :any:`set_samplerate`.
+
+		:type duration: float
+		:param duration: Record length in seconds.
+
+		:type ch1: bool
+		:param ch1: Record Channel 1.
+
+		:type ch2: bool
+		:param ch2: Record Channel 2.
+
+		:type timeout: float
+		:param timeout: Maximum time to wait for each block of samples, or *None* for indefinite.
+
+		:rtype: :any:`RecordVoltsData`
+		:return: The record, with time in seconds from its first sample.
+
+		:raises DataIntegrityException: if samples were lost from the stream. The record is discarded rather than
+			returned with gaps.
+		:raises FrameTimeout: if the timeout expired.
+		"""
+		_utils.check_parameter_valid('bool', ch1, desc='record channel 1')
+		_utils.check_parameter_valid('bool', ch2, desc='record channel 2')
+		_utils.check_parameter_valid('float', duration, desc='record duration', units='sec')
+		_utils.check_parameter_valid('range', duration, (0, float('inf')), 'record duration', 'sec')
+
+		if self._moku is None: raise NotDeployedException()
+
+		if self.check_uncommitted_state():
+			raise UncommittedSettings("Detected uncommitted instrument settings.")
+
+		samplerate = self.get_samplerate()
+		if samplerate > self._max_stream_rate(False, 'net'):
+			log.warning("Sample rate %g smp/s may be too high to stream without data loss", samplerate)
+
+		prev_xmode = self.x_mode
+		self.x_mode = _OSC_ROLL
+
+		self._stream_stop()
+
+		try:
+			self._stream_start(start=0, duration=duration, use_sd=False, ch1=ch1, ch2=ch2, filetype='net')
+
+			# Decode in to arrays sized for the whole record, rather than the general-purpose parser
+			# set up by the stream.
+			self._strparser = dataparser.ArrayDataParser(ch1, ch2, self.binstr, self.procstr,
+				[0] * self.nch, capacity=int(math.ceil(duration * samplerate)) + 1)
+
+			while True:
+				try:
+					self._stream_receive_samples(timeout)
+				except NoDataException:
+					break
+
+			channel_data = self._stream_get_processed_samples()
+		finally:
+			self._stream_stop()
+
+			if prev_xmode != _OSC_ROLL:
+				self.x_mode = prev_xmode
+				self.commit()
+
+		return RecordVoltsData(self, self.scales, channel_data, 1.0 / samplerate)
+
 	@needs_commit
 	def set_precision_mode(self, state):
 		""" Change aquisition mode between downsampling and decimation.
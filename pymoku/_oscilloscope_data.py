@@ -1,5 +1,7 @@
 import struct
 
+import numpy as np
+
 from . import _frame_instrument
 
 _OSC_SCREEN_WIDTH	= 1024
@@ -87,7 +89,8 @@ class VoltsData(_frame_instrument.InstrumentData):
 		if self._stateid not in self._scales:
 			return
 		scales = self._scales[self._stateid]
-		self.time = [scales['buff_time_min'] + (scales['buff_time_step'] * x) for x in range(len(self.ch1))]
+		n = max(len(self.ch1), len(self.ch2))
+		self.time = [scales['buff_time_min'] + (scales['buff_time_step'] * (x + self._buffer_offset)) for x in range(n)]
 		return True
 
 	def _get_timescale(self, tspan):
@@ -139,3 +142,79 @@ class VoltsData(_frame_instrument.InstrumentData):
 	def get_ycoord_fmt(self, y):
 		""" Function suitable to use as argument to a matplotlib FuncFormatter for Y (voltage) coordinate """
 		return self._get_yaxis_fmt(y,None)['ycoord']
+
+
+class SegmentedVoltsData(object):
+	"""
+	Object representing a series of full-resolution triggered captures, in units of Volts, and time in
+	units of seconds relative to the trigger point. Each row of *ch1* and *ch2* is one capture, with invalid
+	samples (and disabled channels) set to NaN.
+
+	The *waveformid* and *timestamp* of each segment allow missed trigger events to be found, see :any:`gaps`.
+
+	This object should not be instantiated directly, but will be returned by a call to
+	:any:`get_segmented_data <pymoku.instruments.Oscilloscope.get_segmented_data>`.
+	"""
+	def __init__(self, n, time):
+		samples = len(time)
+
+		#: Channel 1 data, array of shape (segments, samples).
+		self.ch1 = np.full((n, samples), np.nan)
+
+		#: Channel 2 data, array of shape (segments, samples).
+		self.ch2 = np.full((n, samples), np.nan)
+
+		#: Timebase, common to all segments.
+		self.time = np.asarray(time, dtype=float)
+
+		#: Waveform ID of each segment.
+		self.waveformid = np.zeros(n, dtype=np.int64)
+
+		#: Host time at which each segment was captured, in seconds since the epoch.
+		self.timestamp = np.zeros(n)
+
+	def _set_segment(self, i, data):
+		for ch, out in ((data.ch1, self.ch1), (data.ch2, self.ch2)):
+			if len(ch):
+				# None (invalid) samples become NaN
+				seg = np.array(ch[:out.shape[1]], dtype=float)
+				out[i, :len(seg)] = seg
+
+		self.waveformid[i] = data.waveformid
+		self.timestamp[i] = data._capture_time
+
+	def gaps(self):
+		""" Find segments preceded by trigger events that weren't captured.
+
+		:rtype: array
+		:return: Indices of the segments, and the number of missed waveforms before each.
+		"""
+		# Waveform IDs wrap at 32 bits
+		missed = (np.diff(self.waveformid) % 2**32) - 1
+		idx = np.flatnonzero(missed > 0)
+		return idx + 1, missed[idx]
+
+
+class RecordVoltsData(VoltsData):
+	"""
+	Object representing a continuous record of dual-channel data in units of Volts, and time in units of
+	seconds from the first sample. As :any:`VoltsData` except that *ch1*, *ch2* and *time* are arrays, and
+	a disabled channel's data is empty.
+
+	This object should not be instantiated directly, but will be returned by a call to
+	:any:`get_long_record <pymoku.instruments.Oscilloscope.get_long_record>`.
+	"""
+	def __init__(self, instrument, scales, channel_data, timestep):
+		super(RecordVoltsData, self).__init__(instrument, scales)
+
+		self.ch1 = np.asarray(channel_data[0], dtype=float)
+		self.ch2 = np.asarray(channel_data[1], dtype=float)
+
+		#: Time between samples, in seconds.
+		self.timestep = timestep
+
+		self.time = np.arange(max(len(self.ch1), len(self.ch2))) * timestep
+		self.synchronised = True
+
+	def __json__(self):
+		return { 'ch1': self.ch1.tolist(), 'ch2' : self.ch2.tolist(), 'time' : self.time.tolist(), 'waveform_id' : self.waveformid }
@@ -1,11 +1,17 @@
 import math
 import logging
+import time
+
+import numpy as np
+
+from bisect import bisect_right
+from collections import OrderedDict
 
 from ._instrument import *
 from . import _frame_instrument
 from . import _utils
 
-from ._specan_data import SpectrumData
+from ._specan_data import SpectrumData, SpectrumWaterfall, StitchedSpectrumData, _SpectrumTrace
 
 log = logging.getLogger(__name__)
 
@@ -59,6 +65,13 @@ _SA_FREQ_SCALE		= 2**32 / _SA_ADC_SMPS
 _SA_INT_VOLTS_SCALE = (1.437*pow(2.0,-8.0))
 _SA_SG_FREQ_SCALE	= 2**48 / (_SA_ADC_SMPS * 2.0)
 
+_SA_FCORRS_CACHE_SIZE = 64
+
+# Allowance for each segment of a stitched sweep: the commit round trip (s), and the number of screen
+# updates before a complete sweep with the new settings is received
+_SA_STITCH_COMMIT_TIME = 0.05
+_SA_STITCH_SETTLE_FRAMES = 2
+
 '''
 	FILTER GAINS AND CORRECTION FACTORS
 '''
@@ -132,6 +145,18 @@ _SA_ADC_FREQ_RESP_20 = [ 1.0000,
 	0.6320, 0.6270, 0.6211, 0.6158, 0.6107, 0.6061, 0.6016, 0.5972, 0.5929, 0.5895, 0.5863, 0.5832, 0.5814, 0.5794, 0.5780, 0.5765 ]
 
 
+def _vrms_to_dbm_offset(corrs):
+	# Power (dBm, 50Ohm load) of an RMS voltage v = bits * corrs is 20*log10(bits) plus the
+	# per-bin offset returned here.
+	return 20.0 * np.log10(corrs) - 10.0 * math.log10(50.0) + 30.0
+
+def _stitch_segment(frame, lo, hi):
+	# The points of a stitched sweep segment's frame from lo up to hi, with invalid (None) points as NaN
+	f = np.asarray(frame.frequency, dtype=float)
+	keep = (f >= lo) & (f < hi)
+	return f[keep], np.asarray(frame.ch1, dtype=float)[keep], np.asarray(frame.ch2, dtype=float)[keep]
+
+
 class SpectrumAnalyzer(_frame_instrument.FrameBasedInstrument):
 	""" Spectrum Analyzer instrument object.
 
@@ -161,6 +186,13 @@ class SpectrumAnalyzer(_frame_instrument.FrameBasedInstrument):
 		self.scales = {}
 		self._set_frame_class(SpectrumData, instrument=self, scales=self.scales)
 
+		# Frequency dependent corrections, keyed on the registers that determine them
+		self._fcorrs_cache = OrderedDict()
+
+		# Host-side averaging/hold of successive sweeps
+		self._trace = _SpectrumTrace()
+		self._waterfall = None
+
 		self.id = 2
 		self.type = "spectrumanalyzer"
 		self.calibration = None
@@ -177,13 +209,12 @@ class SpectrumAnalyzer(_frame_instrument.FrameBasedInstrument):
 		self.dbmscale = True
 
 
-	def _calculate_decimations(self):
-		# Computes the decimations given the input span
+	def _calculate_decimations(self, fspan=None):
+		# Computes the decimations given the input span, or that of the current settings
 		# Doesn't guarantee a total decimation of the ideal value, even if such an integer sequence exists
-		f1 = self.f1
-		f2 = self.f2
+		if fspan is None:
+			fspan = self.f2 - self.f1
 
-		fspan = f2 - f1
 		ideal = math.floor(_SA_ADC_SMPS / 8.0 /  fspan)
 		if ideal < 2:
 			d1 = 1
@@ -360,6 +391,193 @@ class SpectrumAnalyzer(_frame_instrument.FrameBasedInstrument):
 		_utils.check_parameter_valid('bool', dbm, desc='enable dBm scale')
 		self.dbmscale = dbm
 
+	def set_trace_mode(self, mode='normal', count=10):
+		""" Configures processing of successive sweeps before they are returned.
+
+		The trace is computed on the host as each new sweep arrives and returned in place of the
+		channel data of each frame. It restarts whenever the instrument settings change. Averages are
+		of power, whether the amplitude scale is dBm or RMS Voltage.
+
+		- **normal** -- Each frame contains the latest sweep
+		- **average** -- Equally-weighted average of all sweeps since the trace restarted
+		- **exp_average** -- Exponential average, with each new sweep given a weight of 1/*count*
+		- **max_hold** -- Maximum of each bin since the trace restarted
+		- **min_hold** -- Minimum of each bin since the trace restarted
+
+		:type mode: string, {'normal', 'average', 'exp_average', 'max_hold', 'min_hold'}
+		:param mode: Trace mode
+
+		:type count: int
+		:param count: Number of sweeps in the exponential average.
+		"""
+		_utils.check_parameter_valid('set', mode, ['normal', 'average', 'exp_average', 'max_hold', 'min_hold'], 'trace mode')
+		_utils.check_parameter_valid('int', count, desc='trace average count')
+		_utils.check_parameter_valid('range', count, [1, 2**31], 'trace average count')
+
+		self._trace.set_mode(mode, count)
+
+	def reset_trace(self):
+		""" Restart the trace, discarding all previous sweeps. See :any:`set_trace_mode`. """
+		self._trace.reset()
+
+	def plan_stitched_sweep(self, f1, f2, rbw, overlap=0.1):
+		""" Plan the segments of a stitched sweep, see :any:`get_stitched_data`.
+
+		:type f1: float
+		:param f1: Left-most frequency (Hz)
+		:type f2: float
+		:param f2: Right-most frequency (Hz)
+		:type rbw: float
+		:param rbw: Desired resolution bandwidth (Hz)
+		:type overlap: float
+		:param overlap: Fraction of each segment's span that overlaps the next.
+
+		:rtype: dict
+		:return: *segments*, a list of the (f1, f2) span of each segment; *rbw*, the resolution bandwidth
+			that will be used, after rounding; and *sweep_time*, the estimated time to sweep all segments
+			in seconds.
+
+		:raises InvalidConfigurationException: if the span is not positive-definite.
+		"""
+		_utils.check_parameter_valid('range', f1, [0,250e6], 'left frequency', 'Hz')
+		_utils.check_parameter_valid('range', f2, [0,250e6], 'right frequency', 'Hz')
+		_utils.check_parameter_valid('range', rbw, [0,250e6], 'resolution bandwidth', 'Hz')
+		_utils.check_parameter_valid('range', overlap, [0,0.5], 'segment overlap')
+		if f2 <= f1:
+			raise InvalidConfigurationException("Span must be non-negative with f2 > f1")
+		if rbw <= 0:
+			raise ValueOutOfRangeException("Resolution bandwidth must be positive")
+
+		# Segments are made as wide as possible while still resolving the requested bandwidth, which is the
+		# span at which the automatic RBW would be the one requested
+		fspan = f2 - f1
+		span = rbw * _SA_SCREEN_STEPS / 5.0
+
+		if span >= fspan:
+			n, span = 1, fspan
+		else:
+			n = int(math.ceil((fspan - span) / (span * (1 - overlap)))) + 1
+			span = fspan / (n - (n - 1) * overlap)
+
+		step = span * (1 - overlap)
+		segments = [(f1 + k * step, min(f1 + k * step + span, f2)) for k in range(n)]
+
+		# All segments have the same span, so the same decimation and sweep time
+		d1, d2, d3, d4, _ = self._calculate_decimations(span)
+		decimation = d1 * d2 * d3 * d4
+		window_factor = _SA_WINDOW_WIDTH[self.window]
+		fbin_resolution = _SA_ADC_SMPS / 2.0 / _SA_FFT_LENGTH / decimation
+		rbw = min(max(rbw, (17.0 / 16.0) * fbin_resolution * window_factor), 2**10.0 * fbin_resolution * window_factor)
+
+		_, frame_time = self._calculate_sweep_time(decimation, rbw / window_factor / fbin_resolution)
+
+		return {'segments': segments, 'rbw': rbw,
+			'sweep_time': n * (_SA_STITCH_SETTLE_FRAMES * frame_time + _SA_STITCH_COMMIT_TIME)}
+
+	def get_stitched_data(self, f1, f2, rbw, overlap=0.1, timeout=None):
+		""" Sweep a span in several segments and join them, for a finer resolution bandwidth than a single
+		sweep of the whole span could give.
+
+		Segments overlap by the fraction *overlap* of their span, and each point in an overlap is taken from
+		the segment in which it's furthest from the edge. The estimated sweep time is logged before sweeping,
+		and can be found without sweeping using :any:`plan_stitched_sweep`.
+
+		Each segment's settings are committed as soon as the previous segment's data has arrived, so the
+		instrument is settling on the next segment while the previous one is stitched. The span and resolution
+		bandwidth are restored afterwards.
+
+		:type f1: float
+		:param f1: Left-most frequency (Hz)
+		:type f2: float
+		:param f2: Right-most frequency (Hz)
+		:type rbw: float
+		:param rbw: Desired resolution bandwidth (Hz)
+		:type overlap: float
+		:param overlap: Fraction of each segment's span that overlaps the next.
+		:type timeout: float
+		:param timeout: Maximum time to wait for each segment, or *None* for indefinite.
+
+		:rtype: :any:`StitchedSpectrumData`
+		:return: The joined spectrum.
+
+		:raises InvalidConfigurationException: if the span is not positive-definite.
+		:raises FrameTimeout: if a segment isn't received within *timeout*.
+		"""
+		_utils.check_parameter_valid('float', timeout, desc='data timeout', allow_none=True)
+		plan = self.plan_stitched_sweep(f1, f2, rbw, overlap)
+		segments = plan['segments']
+
+		log.info("Stitched sweep of %d segments, estimated %.2f seconds", len(segments), plan['sweep_time'])
+
+		# Each segment supplies the points up to the middle of its overlap with the next
+		cuts = [-np.inf] + [(a[1] + b[0]) / 2.0 for a, b in zip(segments[:-1], segments[1:])] + [np.inf]
+
+		saved = (self.f1, self.f2, self.rbw)
+		start = time.time()
+		parts = []
+
+		try:
+			self.f1, self.f2 = segments[0]
+			self.rbw = rbw
+			self.commit()
+
+			for k in range(len(segments)):
+				frame = self.get_realtime_data(timeout=timeout, wait=True)
+
+				# The instrument starts on the next segment before this one is stitched
+				if k + 1 < len(segments):
+					self.f1, self.f2 = segments[k + 1]
+					self.commit()
+
+				parts.append(_stitch_segment(frame, cuts[k], cuts[k + 1]))
+		finally:
+			self.f1, self.f2, self.rbw = saved
+			self.commit()
+
+		data = StitchedSpectrumData(self, self.scales)
+		data._join(parts)
+		data.dbm = frame.dbm
+		data.waveformid = frame.waveformid
+		data.segments = segments
+		data.sweep_time = time.time() - start
+		data.sweep_time_estimate = plan['sweep_time']
+
+		return data
+
+	def enable_waterfall(self, rows=256, decimation=1, reduce='mean'):
+		""" Start recording a history of sweeps for display as a waterfall.
+
+		Each new sweep received from the instrument is added to the waterfall, whether or not it's
+		returned by :any:`get_realtime_data`. The waterfall keeps a fixed number of rows, discarding the
+		oldest once full. Sweeps are recorded before any trace processing (see :any:`set_trace_mode`).
+
+		Enabling the waterfall again replaces the previous one.
+
+		:type rows: int
+		:param rows: Number of rows of history to keep.
+
+		:type decimation: int
+		:param decimation: Number of sweeps combined in to each row.
+
+		:type reduce: string, {'mean', 'max'}
+		:param reduce: Combine sweeps by their mean (of power) or maximum.
+
+		:rtype: :any:`SpectrumWaterfall`
+		:return: The waterfall, updated as sweeps arrive.
+		"""
+		_utils.check_parameter_valid('int', rows, desc='waterfall rows')
+		_utils.check_parameter_valid('range', rows, [1, 2**20], 'waterfall rows')
+		_utils.check_parameter_valid('int', decimation, desc='waterfall decimation')
+		_utils.check_parameter_valid('range', decimation, [1, 2**20], 'waterfall decimation')
+		_utils.check_parameter_valid('set', reduce, ['mean', 'max'], 'waterfall reduction')
+
+		self._waterfall = SpectrumWaterfall(rows, decimation, reduce)
+		return self._waterfall
+
+	def disable_waterfall(self):
+		""" Stop recording the waterfall. The last waterfall returned by :any:`enable_waterfall` keeps its history. """
+		self._waterfall = None
+
 	@needs_commit
 	def set_defaults(self):
 		""" Reset the Spectrum Analyzer to sane defaults. """
@@ -411,25 +629,61 @@ class SpectrumAnalyzer(_frame_instrument.FrameBasedInstrument):
 		return (dev_stop_freq - _SA_SCREEN_WIDTH * freq_step)
 
 	def _calculate_adc_freq_resp(self, f, atten):
-		frac_idx = f / (_SA_ADC_SMPS / 2.0)
-
-		idx = (len(_SA_ADC_FREQ_RESP_0) - 1) * min(max(frac_idx, 0.0), 1.0)
+		"""
+		Calculate the ADC frequency response at frequency 'f' (Hz), which may be a scalar or an array.
+		"""
+		frac_idx = np.clip(np.asarray(f) / (_SA_ADC_SMPS / 2.0), 0.0, 1.0)
 		r = _SA_ADC_FREQ_RESP_20 if atten else _SA_ADC_FREQ_RESP_0
 
 		# Return linear interpolation of table values
-		correction = r[int(math.floor(idx))] + (idx - math.floor(idx)) * (r[int(math.ceil(idx))] - r[int(math.floor(idx))])
-		return correction
+		return np.interp(frac_idx * (len(r) - 1), np.arange(len(r)), r)
 
 	def _calculate_cic_freq_resp(self, f, dec, order):
 		"""
 		Calculate the CIC filter droop correction.
-		In this case 'f' is the frequency (Hz) relative to the demodulation frequency.
+		In this case 'f' is the frequency (Hz) relative to the demodulation frequency, and may be a scalar or an array.
+		"""
+		freq = np.asarray(f) / _SA_ADC_SMPS
+
+		with np.errstate(divide='ignore', invalid='ignore'):
+			correction = np.abs(np.sin(math.pi * freq * dec) / (np.sin(math.pi * freq) * dec)) ** order
+
+		return np.where(freq == 0.0, 1.0, correction)
+
+	def _calculate_freq_corrections(self):
+		"""
+		Returns the frequency bins and their frequency dependent correction factors for the current state.
+
+		These depend only on the decimation and rendering registers, so they are memoized in order that
+		repeated configurations (e.g. span or RBW sweeps) don't recompute them on every commit.
 		"""
-		freq = f/_SA_ADC_SMPS
+		key = (self._total_decimation, self.demod, self.render_dds, self.offset)
+
+		try:
+			return self._fcorrs_cache[key]
+		except KeyError:
+			pass
+
+		# Find approximate frequency bin values
+		dev_start_freq = self._calculate_start_freq()
+		dev_freq_step = self._calculate_freq_step()
+		bins = np.arange(_SA_SCREEN_WIDTH)
+		freqs = dev_start_freq + dev_freq_step * bins
+
+		# Compute the frequency dependent correction arrays
+		# The CIC correction is only for CIC1 which is decimation=4 only, and 10th order
+		if self._total_decimation >= 4:
+			cic_corrs = self._calculate_cic_freq_resp(bins * dev_freq_step, 4, 10)
+		else:
+			cic_corrs = 1.0
+
+		fcorrs = 1.0 / self._calculate_adc_freq_resp(freqs, True) / cic_corrs
 
-		correction = 1.0 if (freq == 0.0) else math.pow(math.fabs(math.sin(math.pi*freq*dec)/(math.sin(math.pi*freq)*dec)), order)
+		if len(self._fcorrs_cache) >= _SA_FCORRS_CACHE_SIZE:
+			self._fcorrs_cache.popitem(last=False)
+		self._fcorrs_cache[key] = (freqs.tolist(), fcorrs)
 
-		return correction
+		return self._fcorrs_cache[key]
 
 	def _calculate_scales(self):
 		"""
@@ -450,21 +704,21 @@ class SpectrumAnalyzer(_frame_instrument.FrameBasedInstrument):
 		g1 *= _SA_INT_VOLTS_SCALE * filt_gain * window_gain * self.rbw_ratio * (2**10)
 		g2 *= _SA_INT_VOLTS_SCALE * filt_gain * window_gain * self.rbw_ratio * (2**10)
 
-		# Find approximate frequency bin values
-		dev_start_freq = self._calculate_start_freq()
-		dev_freq_step = self._calculate_freq_step()
-		freqs = [ (dev_start_freq + dev_freq_step*i) for i in range(_SA_SCREEN_WIDTH)]
+		freqs, fcorrs = self._calculate_freq_corrections()
 
-		# Compute the frequency dependent correction arrays
-		# The CIC correction is only for CIC1 which is decimation=4 only, and 10th order
-		if self._total_decimation >= 4:
-			cic_corrs = [ self._calculate_cic_freq_resp(i*dev_freq_step, 4, 10) for i in range(len(freqs))]
-		else:
-			cic_corrs = [1.0] * len(freqs)
+		# Combine the channel gains with the frequency dependent corrections so incoming frames
+		# only need a single multiply (linear) or add (dBm) per bin.
+		lin_corrs1 = fcorrs * g1
+		lin_corrs2 = fcorrs * g2
 
-		fcorrs = [ (1 / self._calculate_adc_freq_resp(f, True) / cic_corr) for f, cic_corr in zip(freqs, cic_corrs)]
+		# Find the starting index for the valid frame data
+		# SpectrumAnalyzer generally gives more than we ask for due to integer decimations
+		start_index = bisect_right(freqs, self.f1)
 
-		return {'g1': g1, 'g2': g2, 'fs': freqs, 'fcorrs': fcorrs, 'fspan': [self.f1, self.f2], 'dbmscale': self.dbmscale}
+		return {'g1': g1, 'g2': g2, 'fs': freqs, 'fcorrs': fcorrs, 'fspan': [self.f1, self.f2], 'dbmscale': self.dbmscale,
+				'start_index': start_index, 'frequency': freqs[start_index:-1], 'freq_axis': np.asarray(freqs[start_index:-1]),
+				'lin_corrs1': lin_corrs1, 'lin_corrs2': lin_corrs2,
+				'dbm_corrs1': _vrms_to_dbm_offset(lin_corrs1), 'dbm_corrs2': _vrms_to_dbm_offset(lin_corrs2)}
 
 	@needs_commit
 	def gen_off(self, ch=None):
@@ -529,21 +783,28 @@ class SpectrumAnalyzer(_frame_instrument.FrameBasedInstrument):
 				self.tr2_stop = 0
 				self.tr2_incr = 0
 
+	def _calculate_sweep_time(self, decimation, rbw_ratio):
+		"""
+		Returns the FFT computation time and the resulting screen update period, in seconds.
+		"""
+		framerate = self.framerate
+		samplerate = _SA_ADC_SMPS / decimation
+		windowed_points = 2*_SA_FFT_LENGTH/rbw_ratio
+		fft_time = windowed_points / samplerate + (2*_SA_FFT_LENGTH - windowed_points)/125e6 + (1.0/1788.8)
+
+		return fft_time, max(round(fft_time*framerate)/framerate, 1.0/framerate)
+
 	def _set_sweep_increments(self):
 		"""
 		Calculates the optimal frequency increment for the generated output sinewaves sweep
 		based on FFT computation time and framerate.
 		"""
 		fspan = self.f2 - self.f1
-		framerate = self.framerate
 		decimation = self._total_decimation
 
 		increment = 0
 		if self.sweep1 or self.sweep2:
-			samplerate = _SA_ADC_SMPS / decimation
-			windowed_points = 2*_SA_FFT_LENGTH/self.rbw_ratio
-			fft_time = windowed_points / samplerate + (2*_SA_FFT_LENGTH - windowed_points)/125e6 + (1.0/1788.8)
-			screen_update_time = max(round(fft_time*framerate)/framerate, 1.0/framerate)
+			fft_time, screen_update_time = self._calculate_sweep_time(decimation, self.rbw_ratio)
 
 			increment =  fspan / 100.5 * (fft_time / screen_update_time)
 
@@ -1,13 +1,241 @@
 import struct
 import math
+import threading
+import time
 
-from . import _instrument, _frame_instrument
+import numpy as np
 
-from bisect import bisect_right
+from . import _instrument, _frame_instrument, markers
+from ._frame_instrument_data import _to_list
 
 _SA_SCREEN_WIDTH	= 1024
 _SA_BUFLEN = _instrument.CHN_BUFLEN
 
+class _SpectrumTrace(object):
+	# Host-side trace processing of successive spectra, see SpectrumAnalyzer.set_trace_mode.
+	# Averages are taken of power rather than of dBm or RMS voltage, holds of the displayed values.
+	# Frames are processed on the frame worker and get_data threads, so all state is under the lock.
+	def __init__(self):
+		self._lock = threading.RLock()
+		self.mode = 'normal'
+		self.count = None
+		self.reset()
+
+	def set_mode(self, mode, count=None):
+		with self._lock:
+			self.mode = mode
+			self.count = count
+			self.reset()
+
+	def reset(self):
+		with self._lock:
+			self._stateid = None
+			self._waveformid = None
+			self._acc = [None, None]
+
+			# Number of valid values averaged in to each bin
+			self._n = [None, None]
+
+	@staticmethod
+	def _to_power(data, dbm):
+		return 10.0 ** (data / 10.0) if dbm else data ** 2
+
+	@staticmethod
+	def _from_power(power, dbm):
+		return 10.0 * np.log10(power) if dbm else np.sqrt(power)
+
+	def _update(self, acc, n, data, dbm):
+		valid = ~np.isnan(data)
+		n = n + valid
+
+		if self.mode == 'max_hold':
+			return np.fmax(acc, data), n
+		elif self.mode == 'min_hold':
+			return np.fmin(acc, data), n
+
+		# Equal weighting for the first sweeps so the exponential average isn't biased by the first. Bins
+		# are weighted by their own count, as they may have been invalid in some sweeps.
+		with np.errstate(divide='ignore'):
+			if self.mode == 'average' or not self.count:
+				w = 1.0 / n
+			else:
+				w = 1.0 / np.minimum(n, self.count)
+
+		p = self._to_power(data, dbm)
+		return np.where(np.isnan(acc), p, np.where(valid, acc + w * (p - acc), acc)), n
+
+	def apply(self, frame, ch1, ch2):
+		# A sweep captured under earlier settings, but rendered with the current ones, is passed through
+		# rather than held or averaged in to the trace of the current settings
+		if frame._trigstate != frame._stateid:
+			return ch1, ch2
+
+		with self._lock:
+			# Sweeps are only added once, however many times the frame repeats
+			if frame._stateid != self._stateid or (self._acc[0] is not None and len(self._acc[0]) != len(ch1)):
+				self.reset()
+				self._stateid = frame._stateid
+
+			if frame.waveformid != self._waveformid:
+				self._waveformid = frame.waveformid
+
+				if self._acc[0] is None:
+					self._acc = [np.full(len(d), np.nan) for d in (ch1, ch2)]
+					self._n = [np.zeros(len(d), dtype=int) for d in (ch1, ch2)]
+
+				updated = [self._update(a, n, d, frame.dbm) for a, n, d in zip(self._acc, self._n, (ch1, ch2))]
+				self._acc = [u[0] for u in updated]
+				self._n = [u[1] for u in updated]
+
+			if self.mode in ('max_hold', 'min_hold'):
+				return self._acc[0].copy(), self._acc[1].copy()
+
+			return self._from_power(self._acc[0], frame.dbm), self._from_power(self._acc[1], frame.dbm)
+
+class SpectrumWaterfall(object):
+	"""
+	Fixed-size history of spectra from a :any:`SpectrumAnalyzer`, one row per sweep (or per group of
+	*decimation* sweeps), for display as a spectrogram or waterfall.
+
+	The history is a circular buffer allocated once, so memory use doesn't grow however long the
+	instrument runs. Rows are added by the instrument as each new sweep arrives; the history restarts
+	whenever the instrument settings change. Invalid points are NaN.
+
+	This object should not be instantiated directly, but is returned by
+	:any:`enable_waterfall <pymoku.instruments.SpectrumAnalyzer.enable_waterfall>`.
+	"""
+	def __init__(self, rows, decimation=1, reduce='mean'):
+		#: Maximum number of rows kept.
+		self.capacity = rows
+
+		#: Number of sweeps combined in to each row.
+		self.decimation = decimation
+
+		#: How sweeps are combined in to a row, 'mean' (of power) or 'max'.
+		self.reduce = reduce
+
+		#: The frequency of each column.
+		self.frequency = []
+
+		#: Whether the data is in logarithmic (dBm) scale.
+		self.dbm = None
+
+		self._lock = threading.Lock()
+		self._buf = None
+		self.reset()
+
+	def reset(self):
+		""" Discard all rows. """
+		with self._lock:
+			self._stateid = None
+			self._waveformid = None
+			self._head = 0
+			self._rows = 0
+			self._acc = None
+			self._k = 0
+
+	def __len__(self):
+		return self._rows
+
+	def _allocate(self, frame, bins):
+		# Each row is written twice, at i and i + capacity, so the most recent rows are always contiguous
+		if self._buf is None or self._buf.shape[2] != bins:
+			self._buf = np.full((2, 2 * self.capacity, bins), np.nan, dtype=np.float32)
+			self._times = np.zeros(2 * self.capacity)
+			self._cnt = np.zeros((2, bins))
+
+		self._stateid = frame._stateid
+		self._head = 0
+		self._rows = 0
+		self._acc = None
+		self._k = 0
+		self.frequency = frame.frequency
+		self.dbm = frame.dbm
+
+	def _add(self, frame, ch1, ch2):
+		# Sweeps captured under earlier settings aren't part of the current history
+		if frame._trigstate != frame._stateid:
+			return
+
+		with self._lock:
+			if frame._stateid != self._stateid or self._buf is None or self._buf.shape[2] != len(ch1):
+				self._allocate(frame, len(ch1))
+			elif frame.waveformid == self._waveformid:
+				return
+
+			self._waveformid = frame.waveformid
+			data = np.vstack((ch1, ch2))
+
+			if self.reduce == 'max':
+				self._acc = data if self._acc is None else np.fmax(self._acc, data)
+			else:
+				# Mean of power, ignoring invalid points
+				p = _SpectrumTrace._to_power(data, self.dbm)
+				valid = ~np.isnan(p)
+				if self._acc is None:
+					self._acc = np.zeros_like(p)
+					self._cnt[:] = 0
+				self._acc += np.where(valid, p, 0)
+				self._cnt += valid
+
+			self._k += 1
+			if self._k < self.decimation:
+				return
+
+			if self.reduce == 'max':
+				row = self._acc
+			else:
+				with np.errstate(divide='ignore', invalid='ignore'):
+					row = _SpectrumTrace._from_power(np.where(self._cnt > 0, self._acc / self._cnt, np.nan), self.dbm)
+
+			i, n = self._head, self.capacity
+			self._buf[:, i, :] = row
+			self._buf[:, i + n, :] = row
+			self._times[i] = self._times[i + n] = time.time()
+
+			self._head = (i + 1) % n
+			self._rows = min(self._rows + 1, n)
+			self._acc = None
+			self._k = 0
+
+	def _window(self):
+		end = self._head + self.capacity
+		return slice(end - self._rows, end)
+
+	def view(self, ch=1):
+		""" The rows of one channel, oldest first.
+
+		The returned array is a read-only view of the history rather than a copy, so it's cheap to
+		get for every display update. It's only valid until the next row is added; copy it to keep it.
+
+		:type ch: int; {1,2}
+		:param ch: Channel
+
+		:rtype: array
+		:return: Array of shape (rows, bins).
+		"""
+		if ch not in [1, 2]:
+			raise ValueError("Invalid channel %s" % ch)
+
+		with self._lock:
+			if self._buf is None:
+				return np.empty((0, 0), dtype=np.float32)
+			v = self._buf[ch - 1, self._window(), :]
+
+		v.flags.writeable = False
+		return v
+
+	@property
+	def time(self):
+		""" Host time at which each row was completed, in seconds since the epoch, oldest first. """
+		with self._lock:
+			if self._buf is None:
+				return np.empty(0)
+			v = self._times[self._window()]
+
+		v.flags.writeable = False
+		return v
+
 class SpectrumData(_frame_instrument.InstrumentData):
 	"""
 	Object representing a frame of dual-channel frequency spectrum data (amplitude vs frequency in Hz).
@@ -55,6 +283,9 @@ class SpectrumData(_frame_instrument.InstrumentData):
 		#: Obtain all data scaling factors relevant to current SpectrumAnalyzer configuration
 		self._scales = scales
 
+		# Frequency axis and channel data as arrays with NaN for invalid points
+		self._arrays = None
+
 	def __json__(self):
 		return { 'ch1' : self.ch1, 'ch2' : self.ch2, 'frequency' : self.frequency, 'dbm' : self.dbm, 'waveform_id' : self.waveformid }
 
@@ -62,6 +293,23 @@ class SpectrumData(_frame_instrument.InstrumentData):
 	def _vrms_to_dbm(self, v):
 		return 10.0*math.log(v*v/50.0,10) + 30.0
 
+	def _process_channel(self, raw, corrs):
+		# SpectrumAnalyzer data is backwards because $(EXPLETIVE), also remove zeros for the sake of common
+		# display on a log axis.
+		bits = np.frombuffer(raw, dtype='<i4')[_SA_SCREEN_WIDTH - 1::-1]
+		invalid = bits == -0x80000000
+		bits = np.maximum(bits, 1).astype(float)
+		corrs = corrs[:len(bits)]
+
+		# Apply the frequency dependent corrections. In dBm mode these have been pre-computed as
+		# an additive offset (in dB) so only the log of the raw bits is required per frame.
+		if self.dbm:
+			data = 20.0 * np.log10(bits) + corrs
+		else:
+			data = bits * corrs
+
+		return bits, data, invalid
+
 	def process_complete(self):
 		super(SpectrumData, self).process_complete()
 
@@ -70,59 +318,85 @@ class SpectrumData(_frame_instrument.InstrumentData):
 
 		# Get scaling/correction factors based on current instrument configuration
 		scales = self._scales[self._stateid]
-		scale1 = scales['g1']
-		scale2 = scales['g2']
-		fs = scales['fs']
-		f1, f2 = scales['fspan']
-		fcorrs = scales['fcorrs']
 		dbmscale = scales['dbmscale']
+		start_index = scales['start_index']
+		valid = False
 
 		try:
 			self.dbm = dbmscale
 
-			# Find the starting index for the valid frame data
-			# SpectrumAnalyzer generally gives more than we ask for due to integer decimations
-			start_index = bisect_right(fs,f1)
-
 			# Set the frequency range of valid data in the current frame (same for both channels)
-			self.frequency = fs[start_index:-1]
-
-			##################################
-			# Process Ch1 Data
-			##################################
-			smpls = int(len(self._raw1) / 4)
-			dat = struct.unpack('<' + 'i' * smpls, self._raw1)
-			dat = [ x if x != -0x80000000 else None for x in dat ]
+			self.frequency = scales['frequency']
 
-			# SpectrumAnalyzer data is backwards because $(EXPLETIVE), also remove zeros for the sake of common
-			# display on a log axis.
-			self._ch1_bits = [ max(float(x), 1) if x is not None else None for x in reversed(dat[:_SA_SCREEN_WIDTH]) ]
+			corrs1, corrs2 = (scales['dbm_corrs1'], scales['dbm_corrs2']) if dbmscale else (scales['lin_corrs1'], scales['lin_corrs2'])
 
-			# Apply frequency dependent corrections
-			self.ch1 = [ self._vrms_to_dbm(a*c*scale1) if dbmscale else a*c*scale1 if a is not None else None for a,c in zip(self._ch1_bits, fcorrs)]
+			self._ch1_bits, ch1, inval1 = self._process_channel(self._raw1, corrs1)
+			self._ch2_bits, ch2, inval2 = self._process_channel(self._raw2, corrs2)
 
 			# Trim invalid part of frame
-			self.ch1 = self.ch1[start_index:-1]
+			ch1, inval1 = ch1[start_index:-1], inval1[start_index:-1]
+			ch2, inval2 = ch2[start_index:-1], inval2[start_index:-1]
+
+			# A valid frame is there's at least one valid sample in each channel
+			valid = not (inval1.all() or inval2.all())
+
+			ch1, ch2 = np.where(inval1, np.nan, ch1), np.where(inval2, np.nan, ch2)
 
-			##################################
-			# Process Ch2 Data
-			##################################
-			smpls = int(len(self._raw2) / 4)
-			dat = struct.unpack('<' + 'i' * smpls, self._raw2)
-			dat = [ x if x != -0x80000000 else None for x in dat ]
+			trace = getattr(self._instrument, '_trace', None)
+			waterfall = getattr(self._instrument, '_waterfall', None)
+			if valid:
+				# The waterfall records each sweep, not the trace
+				if waterfall is not None:
+					waterfall._add(self, ch1, ch2)
 
-			self._ch2_bits = [ max(float(x), 1) if x is not None else None for x in reversed(dat[:_SA_SCREEN_WIDTH]) ]
+				if trace is not None and trace.mode != 'normal':
+					ch1, ch2 = trace.apply(self, ch1, ch2)
+					inval1, inval2 = np.isnan(ch1), np.isnan(ch2)
 
-			self.ch2 = [ self._vrms_to_dbm(a*c*scale2) if dbmscale else a*c*scale2 if a is not None else None for a,c in zip(self._ch2_bits, fcorrs)]
-			self.ch2 = self.ch2[start_index:-1]
+			# Kept for the marker functions, so they needn't convert the lists back
+			self._arrays = (scales['freq_axis'], ch1, ch2)
 
-		except (IndexError, TypeError, struct.error):
+			self.ch1 = _to_list(ch1, inval1)
+			self.ch2 = _to_list(ch2, inval2)
+
+		except (IndexError, TypeError, ValueError):
 			# If the data is bollocksed, force a reinitialisation on next packet
 			self._frameid = None
 			self._complete = False
 
-		# A valid frame is there's at least one valid sample in each channel
-		return any(self.ch1) and any(self.ch2)
+		return valid
+
+	def peaks(self, ch=1, n=1, threshold=None, separation=0):
+		""" Find the highest peaks in the spectrum, see :any:`pymoku.markers.peaks`.
+
+		:rtype: list of (float, float)
+		:return: (frequency, amplitude) of each peak, highest first.
+		"""
+		return markers.peaks(self, ch, n, threshold, separation)
+
+	def bandwidth(self, ch=1, n_db=3.0, peak=None):
+		""" Measure the width of a peak at *n_db* below its maximum, see :any:`pymoku.markers.bandwidth`.
+
+		:rtype: (float, float, float)
+		:return: (width, lower frequency, upper frequency) in Hz.
+		"""
+		return markers.bandwidth(self, ch, n_db, peak)
+
+	def noise_floor(self, ch=1):
+		""" Estimate the noise floor of the spectrum, see :any:`pymoku.markers.noise_floor`.
+
+		:rtype: float
+		:return: Noise floor, in the amplitude units of the spectrum.
+		"""
+		return markers.noise_floor(self, ch)
+
+	def harmonics(self, ch=1, n=5, fundamental=None, tolerance=None):
+		""" Measure harmonics and total harmonic distortion, see :any:`pymoku.markers.harmonics`.
+
+		:rtype: dict
+		:return: *fundamental*, *harmonics*, *thd* and *thd_db*.
+		"""
+		return markers.harmonics(self, ch, n, fundamental, tolerance)
 
 	def process_buffer(self):
 		# Compute the x-axis of the buffer
@@ -201,3 +475,43 @@ class SpectrumData(_frame_instrument.InstrumentData):
 	def get_ycoord_fmt(self, y):
 		""" Function suitable to use as argument to a matplotlib FuncFormatter for Y (voltage) coordinate """
 		return self._get_yaxis_fmt(y,None)['ycoord']
+
+class StitchedSpectrumData(SpectrumData):
+	"""
+	Spectrum over a wider span than a single sweep of the :any:`SpectrumAnalyzer` can cover at the requested
+	resolution bandwidth, made by joining the sweeps of several narrower segments.
+
+	This object should not be instantiated directly, but will be returned by a call to
+	:any:`get_stitched_data <pymoku.instruments.SpectrumAnalyzer.get_stitched_data>`.
+
+	.. autoinstanceattribute:: pymoku._frame_instrument.StitchedSpectrumData.segments
+		:annotation: = [(F1, F2)]
+
+	.. autoinstanceattribute:: pymoku._frame_instrument.StitchedSpectrumData.sweep_time
+		:annotation: = t
+	"""
+	def __init__(self, instrument, scales):
+		super(StitchedSpectrumData, self).__init__(instrument, scales)
+
+		#: The span (f1, f2) of each segment, in Hz
+		self.segments = []
+
+		#: Time taken to sweep all segments, in seconds
+		self.sweep_time = None
+
+		#: Sweep time estimated before the sweep, in seconds
+		self.sweep_time_estimate = None
+
+	def __json__(self):
+		d = super(StitchedSpectrumData, self).__json__()
+		d['segments'] = self.segments
+		return d
+
+	def _join(self, parts):
+		# Each part is (frequency, ch1, ch2) arrays with NaN for invalid points
+		freq, ch1, ch2 = [np.concatenate(p) for p in zip(*parts)]
+		self._arrays = (freq, ch1, ch2)
+
+		self.frequency = freq.tolist()
+		self.ch1 = _to_list(ch1, np.isnan(ch1))
+		self.ch2 = _to_list(ch2, np.isnan(ch2))
@@ -0,0 +1,226 @@
+import numbers
+import tempfile
+
+import numpy as np
+
+from . import StreamException
+
+# Overflow policies of a _SampleRing, see StreamBasedInstrument.set_stream_buffer
+OVERFLOW_POLICIES = ['grow', 'drop_oldest', 'drop_newest', 'error', 'spill']
+
+# Policies under which a _SampleRing never holds more than its capacity
+_BOUNDED_POLICIES = ['drop_oldest', 'drop_newest', 'error']
+
+# Maximum number of samples moved at once when compacting a spill file
+_SPILL_COMPACT_BLOCK = 2**16
+
+
+class _SpillFile(object):
+	""" First-in first-out store of samples in a temporary memory-mapped file.
+
+	Unread samples are moved to the front of the file once more than half of it has been read, or
+	when it's full, so it only grows (by doubling) with the number of unread samples, not with the
+	total written. It's deleted when closed.
+	"""
+	def __init__(self, shape, directory=None):
+		self._shape = shape
+		self._file = tempfile.TemporaryFile(prefix='pymoku-stream-', dir=directory)
+		self._map = None
+		self._head = 0
+		self._tail = 0
+
+	def __len__(self):
+		return self._tail - self._head
+
+	def _remap(self, capacity):
+		self._map = None
+		self._file.truncate(capacity * int(np.prod(self._shape, dtype=int)) * 8)
+		self._map = np.memmap(self._file, dtype=float, mode='r+', shape=(capacity,) + self._shape)
+
+	def _compact(self):
+		# Move the unread samples to the front, a block at a time so memory use stays bounded. Blocks
+		# no longer than the distance moved don't overlap their destination.
+		n = len(self)
+		step = min(self._head, _SPILL_COMPACT_BLOCK)
+
+		for i in range(0, n, step):
+			m = min(step, n - i)
+			self._map[i:i + m] = self._map[self._head + i:self._head + i + m]
+
+		self._head, self._tail = 0, n
+
+	def write(self, vals):
+		if self._map is not None and self._head and self._tail + len(vals) > len(self._map):
+			self._compact()
+
+		need = self._tail + len(vals)
+		if self._map is None or need > len(self._map):
+			self._remap(max(need, 2 * (len(self._map) if self._map is not None else 0)))
+
+		self._map[self._tail:need] = vals
+		self._tail = need
+
+	def read(self, n):
+		out = np.array(self._map[self._head:self._head + min(n, len(self))])
+		self._head += len(out)
+
+		if self._head == self._tail:
+			self._head, self._tail = 0, 0
+		elif self._head > len(self._map) // 2:
+			self._compact()
+
+		return out
+
+	def close(self):
+		self._map = None
+		self._file.close()
+
+class _SampleRing(object):
+	""" Preallocated circular store of processed samples from one stream channel.
+
+	Samples are scalars, or fixed-length records (e.g. tuples from the Phasemeter) which are stored as
+	the rows of a 2D array. Pushing and popping *n* samples costs O(n) whatever the number stored.
+	:any:`pop_list` returns samples as they were pushed, with integer fields (e.g. counters) as integers.
+	The storage is allocated when the first samples arrive, once their width is known.
+	With the 'spill' overflow policy, samples that don't fit are written to a :any:`_SpillFile` in
+	*spill_dir* (default the system temporary directory) and moved back as space is freed, so memory use
+	stays at *capacity* samples.
+	"""
+	def __init__(self, capacity, overflow='grow', spill_dir=None):
+		if overflow not in OVERFLOW_POLICIES:
+			raise ValueError("Invalid overflow policy %s" % overflow)
+
+		self.capacity = capacity
+		self.overflow = overflow
+		self.spill_dir = spill_dir
+
+		#: Number of samples discarded due to overflow
+		self.dropped = 0
+		#: Number of samples written to disk due to overflow
+		self.spilled = 0
+
+		self._data = None
+		self._ints = None
+		self._spill = None
+		self._head = 0
+		self._len = 0
+
+	def __len__(self):
+		return self._len + (len(self._spill) if self._spill is not None else 0)
+
+	def _write(self, vals):
+		cap = len(self._data)
+		tail = (self._head + self._len) % cap
+		first = min(len(vals), cap - tail)
+
+		self._data[tail:tail + first] = vals[:first]
+		self._data[:len(vals) - first] = vals[first:]
+		self._len += len(vals)
+
+	def _read(self, n):
+		cap = len(self._data)
+		first = min(n, cap - self._head)
+
+		out = np.empty((n,) + self._data.shape[1:])
+		out[:first] = self._data[self._head:self._head + first]
+		out[first:] = self._data[:n - first]
+		return out
+
+	def _resize(self, capacity):
+		data = np.empty((capacity,) + self._data.shape[1:])
+		data[:self._len] = self._read(self._len)
+		self._data = data
+		self._head = 0
+
+	def push(self, samples):
+		vals = np.asarray(samples, dtype=float)
+		if not len(vals):
+			return
+
+		if self._data is None:
+			self._data = np.empty((self.capacity,) + vals.shape[1:])
+
+			# Which fields are integers, to restore them when popped as a list
+			first = samples[0]
+			fields = first if vals.ndim > 1 else [first]
+			self._ints = [isinstance(f, numbers.Integral) for f in fields]
+
+		free = len(self._data) - self._len
+		if self._spill is not None and len(self._spill):
+			# Keep the samples in order behind those already on disk
+			self._spill.write(vals)
+			self.spilled += len(vals)
+			return
+
+		if len(vals) > free:
+			if self.overflow == 'spill':
+				if self._spill is None:
+					self._spill = _SpillFile(vals.shape[1:], self.spill_dir)
+				self._spill.write(vals[free:])
+				self.spilled += len(vals) - free
+				vals = vals[:free]
+			elif self.overflow == 'grow':
+				self._resize(max(2 * len(self._data), self._len + len(vals)))
+			elif self.overflow == 'drop_oldest':
+				cap = len(self._data)
+				if len(vals) >= cap:
+					self.dropped += self._len + len(vals) - cap
+					vals = vals[-cap:]
+					self._head, self._len = 0, 0
+				else:
+					n = len(vals) - free
+					self.dropped += n
+					self._head = (self._head + n) % cap
+					self._len -= n
+			elif self.overflow == 'drop_newest':
+				self.dropped += len(vals) - free
+				vals = vals[:free]
+			else:
+				raise StreamException("Stream buffer overflowed its capacity of %d samples" % len(self._data))
+
+		self._write(vals)
+
+	def _pop(self, n):
+		out = self._read(n)
+		self._head = (self._head + n) % len(self._data)
+		self._len -= n
+		return out
+
+	def _unspill(self):
+		# Move samples back from disk in to the free space in memory
+		if self._spill is not None and len(self._spill):
+			self._write(self._spill.read(len(self._data) - self._len))
+
+	def pop(self, n=None):
+		""" Remove and return the oldest *n* samples (all if *None*) as a new array. """
+		n = len(self) if n is None else min(n, len(self))
+
+		if self._data is None:
+			return np.empty(0)
+
+		if n <= self._len:
+			out = self._pop(n)
+		else:
+			parts = [self._pop(self._len)]
+			parts.append(self._spill.read(n - len(parts[0])))
+			out = np.concatenate(parts)
+
+		self._unspill()
+		return out
+
+	def pop_list(self, n=None):
+		""" Remove and return the oldest *n* samples (all if *None*) as a list, with records as tuples. """
+		out = self.pop(n)
+		if not len(out):
+			return []
+
+		cols = out.T if out.ndim > 1 else [out]
+		cols = [c.astype(np.int64).tolist() if i else c.tolist() for c, i in zip(cols, self._ints)]
+
+		return list(zip(*cols)) if out.ndim > 1 else cols[0]
+
+	def close(self):
+		""" Release the spill file, if any. """
+		if self._spill is not None:
+			self._spill.close()
+			self._spill = None
@@ -4,8 +4,12 @@ import os, os.path
 import logging, time, threading, math
 import zmq
 
+import numpy as np
+
 from . import *
 from . import dataparser, _input_instrument, _instrument
+from ._stream_buffer import _SampleRing, OVERFLOW_POLICIES, _BOUNDED_POLICIES
+from ._stream_recorder import StreamRecorder, RECORD_FILETYPES, FSYNC_POLICIES
 from . import _utils
 
 log = logging.getLogger(__name__)
@@ -17,6 +21,12 @@ class StreamBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuI
 
 		self._strparser = None
 
+		# Processed samples of the current network stream, per channel, waiting to be read
+		self._samples = None
+		self._samples_capacity = 2**16
+		self._samples_overflow = 'grow'
+		self._samples_spill_dir = None
+
 		# Flag to indicate if there is no more stream data to get for last session
 		self._no_data = True
 
@@ -53,8 +63,55 @@ class StreamBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuI
 		if self.check_uncommitted_state():
 			raise UncommittedSettings("Can't start a streaming session due to uncommitted device settings.")
 		self._stream_start(start=0, duration=duration, ch1=ch1, ch2=ch2, use_sd=False, filetype='net')
+		self._stream_samples_reset()
 		self._no_data = False
 
+	def set_stream_buffer(self, capacity=2**16, overflow='grow', spill_dir=None):
+		""" Configure the host buffer holding streamed samples until they are read by `get_stream_data`.
+
+		The buffer is preallocated per channel for *capacity* samples. The *overflow* policy determines what
+		happens when samples arrive faster than they are read and the buffer is full:
+
+		- **grow** -- Double the capacity, so no samples are lost but memory use is unbounded
+		- **drop_oldest** -- Discard the oldest unread samples
+		- **drop_newest** -- Discard the newly arrived samples
+		- **error** -- Raise a :any:`StreamException` from `get_stream_data`
+		- **spill** -- Write the newly arrived samples to a temporary memory-mapped file, from which they're
+		  read back in order as the buffer empties, so no samples are lost and memory use stays bounded
+
+		The number of samples discarded or spilled to disk is reported by :any:`get_stream_buffer_stats`. New
+		settings apply from the next streaming session.
+
+		:type capacity: int
+		:param capacity: Number of samples per channel.
+		:type overflow: string, {'grow', 'drop_oldest', 'drop_newest', 'error', 'spill'}
+		:param overflow: Overflow policy.
+		:type spill_dir: string
+		:param spill_dir: Directory for the spill file, or *None* for the system temporary directory.
+		"""
+		_utils.check_parameter_valid('int', capacity, desc='stream buffer capacity')
+		_utils.check_parameter_valid('range', capacity, [1, 2**31], 'stream buffer capacity', 'samples')
+		_utils.check_parameter_valid('set', overflow, OVERFLOW_POLICIES, 'stream buffer overflow policy')
+		_utils.check_parameter_valid('string', spill_dir, desc='stream buffer spill directory', allow_none=True)
+
+		self._samples_capacity = capacity
+		self._samples_overflow = overflow
+		self._samples_spill_dir = spill_dir
+
+	def get_stream_buffer_stats(self):
+		""" Get the state of the stream buffer, see :any:`set_stream_buffer`.
+
+		:rtype: dict
+		:return: *buffered*, the number of samples waiting to be read, including any on disk; *dropped*, the
+			number discarded due to overflow this session; and *spilled*, the number written to disk this
+			session; each as a list with an entry per channel.
+		"""
+		if self._samples is None:
+			return {'buffered': [0, 0], 'dropped': [0, 0], 'spilled': [0, 0]}
+
+		return {'buffered': [len(r) for r in self._samples], 'dropped': [r.dropped for r in self._samples],
+			'spilled': [r.spilled for r in self._samples]}
+
 	def stop_stream_data(self):
 		""" Stops instrument data being streamed over the network.
 
@@ -65,7 +122,7 @@ class StreamBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuI
 		self._no_data = True
 		self._stream_stop()
 
-	def get_stream_data(self, n=0, timeout=None):
+	def get_stream_data(self, n=0, timeout=None, as_array=False):
 		""" Get any new instrument samples that have arrived on the network.
 
 		This returns a tuple containing two arrays (one per channel) of up to 'n' samples of instrument data.
@@ -75,9 +132,13 @@ class StreamBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuI
 		:type n: int
 		:param n: Number of samples to get off the network. Set this to '0' to get
 			all currently available samples, or '-1' to wait on all samples of the currently
-			running streaming session to be received.
+			running streaming session to be received. With the 'drop_oldest', 'drop_newest' or 'error'
+			overflow policies (see `set_stream_buffer`), must be at most the stream buffer capacity.
 		:type timeout: float
 		:param timeout: Timeout in seconds
+		:type as_array: bool
+		:param as_array: Return each channel as a NumPy array, rather than a list. Records with several
+			fields (e.g. from the Phasemeter) are the rows of a 2D array.
 
 		:rtype: tuple
 		:returns: ([CH1_DATA], [CH2_DATA])
@@ -87,6 +148,7 @@ class StreamBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuI
 		:raises InvalidOperationException: if there is no streaming session running
 		:raises ValueOutOfRangeException: invalid input parameters
 		:raises DataIntegrityException: If the network layer detects dropped data
+		:raises StreamException: if the stream buffer overflows with the 'error' policy
 		"""
 		if timeout and timeout <= 0:
 			raise ValueOutOfRangeException("Timeout must be positive or 'None'")
@@ -102,11 +164,17 @@ class StreamBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuI
 		if type(n) is not int:
 			raise TypeError("Sample number 'n' must be an integer")
 
+		self._stream_buffer_samples()
+
+		# A bounded buffer never holds more than its capacity, so would never have enough samples to return
+		ring = self._samples[0]
+		if ring.overflow in _BOUNDED_POLICIES and n > ring.capacity:
+			raise ValueOutOfRangeException("Invalid number of samples. Expected n <= %d, the stream buffer capacity with the '%s' overflow policy." % (ring.capacity, ring.overflow))
+
 		# Check how many samples are already processed and waiting to be read out
-		processed_samples = self._stream_get_processed_samples()
 		if n > 0:
 			# Actual number of samples processed already
-			num_processed_samples = [len(x) for x in processed_samples]
+			num_processed_samples = [len(x) for x in self._samples]
 		else:
 			# We don't need to track the number of processed samples if n = [0,1]
 			num_processed_samples = [-1,-1]
@@ -114,8 +182,8 @@ class StreamBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuI
 		# Only "get" samples off the network if we haven't already processed enough to return 'n'
 		# for all enabled channels.
 		while ((n == -1) or
-			(self.ch1 and ((num_processed_samples[0] <= n) or (num_processed_samples[0] <= 0))) or
-			(self.ch2 and ((num_processed_samples[1] <= n) or (num_processed_samples[1] <= 0)))):
+			(self.ch1 and ((num_processed_samples[0] < n) or (num_processed_samples[0] <= 0))) or
+			(self.ch2 and ((num_processed_samples[1] < n) or (num_processed_samples[1] <= 0)))):
 			try:
 				self._stream_receive_samples(timeout)
 			except NoDataException:
@@ -123,27 +191,177 @@ class StreamBasedInstrument(_input_instrument.InputInstrument, _instrument.MokuI
 				self._no_data = True
 
 			# Update our list of current processed samples
-			processed_samples = self._stream_get_processed_samples()
+			self._stream_buffer_samples()
 			if n != -1:
 				# Update the number of processed samples if we aren't asking for 'all' of them
-				num_processed_samples = [len(x) for x in processed_samples]
+				num_processed_samples = [len(x) for x in self._samples]
 
 			# Check if the streaming session has completed
 			if self._no_data:
 				break
 
+		return self._stream_pop_samples(n, as_array)
+
+	def _stream_samples_reset(self):
+		if self._samples is not None:
+			for ring in self._samples:
+				ring.close()
+
+		self._samples = [_SampleRing(self._samples_capacity, self._samples_overflow, self._samples_spill_dir)
+			for _ in range(2)]
+
+	def _stream_buffer_samples(self):
+		# Move samples from the parser's lists in to the stream buffer, so the lists stay short. Only
+		# samples present on every enabled channel are moved, so the buffers of all channels always hold
+		# the same samples and any overflow drops the same samples from each. Samples of a channel that
+		# has arrived ahead wait in the parser for the others.
+		if self._samples is None:
+			self._stream_samples_reset()
+
+		active_channels = [self.ch1, self.ch2]
+		processed = self._stream_get_processed_samples()
+
+		n = min([len(p) for c, p in zip(active_channels, processed) if c] or [0])
+		if not n:
+			return
+
+		for c, ring, p in zip(active_channels, self._samples, processed):
+			if c:
+				ring.push(p[:n])
+
+		self._stream_clear_processed_samples(n)
+
+	def _stream_pop_samples(self, n=0, as_array=False):
+		# Remove and return up to 'n' (or all if n <= 0) samples that have been processed on every
+		# enabled channel
+		self._stream_buffer_samples()
+
 		active_channels = [self.ch1, self.ch2]
-		to_return = min([len(p) for c, p in zip(active_channels, processed_samples) if c])
+		to_return = min([len(r) for c, r in zip(active_channels, self._samples) if c])
 
 		if n > 0:
 			to_return = min(n, to_return)
 
-		dout_ch1 = processed_samples[0][0:to_return] if self.ch1 else []
-		dout_ch2 = processed_samples[1][0:to_return] if self.ch2 else []
+		dout = []
+		for c, ring in zip(active_channels, self._samples):
+			if not c:
+				dout.append(np.empty(0) if as_array else [])
+			elif as_array:
+				dout.append(ring.pop(to_return))
+			else:
+				dout.append(ring.pop_list(to_return))
+
+		return tuple(dout)
+
+	def start_stream_record(self, path, duration=10, ch1=True, ch2=True, filetype='li',
+			rollover_size=None, rollover_time=None, fsync='rollover', queue_size=256):
+		""" Start streaming instrument data over the network and recording it to files on the local PC.
+
+		The stream is received and written in background threads, see :any:`StreamRecorder`. Call
+		:any:`StreamRecorder.stop` on the returned recorder to end the recording, in place of
+		`stop_stream_data`; it can also be used as a context manager::
+
+			with i.start_stream_record('capture.li', duration=60) as rec:
+				rec.wait()
+
+		Recordings may be split in to several files by size and/or time, in which case a four digit file
+		number is added to the name, e.g. *capture_0000.li*. Each file's time axis continues from the last.
+
+		The *fsync* policy determines when written data is forced to disk:
+
+		- **never** -- Leave it to the operating system
+		- **rollover** -- As each file is closed
+		- **always** -- After every block of data
+		- *float* -- At most this many seconds apart, and as each file is closed
+
+		:type path: string
+		:param path: Output file name. The extension for the file type is added if there is none.
+		:type duration: float
+		:param duration: Log duration in seconds
+		:type ch1: bool
+		:param ch1: Enable streaming on Channel 1
+		:type ch2: bool
+		:param ch2: Enable streaming on Channel 2
+		:type filetype: string, {'li', 'npy', 'parquet'}
+		:param filetype: Raw LI (v2) data, or processed samples as a NumPy array or Parquet table. Parquet
+			requires *pyarrow* and LI requires *pycapnp*.
+		:type rollover_size: int
+		:param rollover_size: Bytes of stream data per file, or *None* for no limit.
+		:type rollover_time: float
+		:param rollover_time: Seconds of stream data per file, or *None* for no limit.
+		:type fsync: string or float
+		:param fsync: Policy for forcing data to disk, as above.
+		:type queue_size: int
+		:param queue_size: Number of blocks of stream data held in memory while waiting to be written.
+
+		:rtype: :any:`StreamRecorder`
+		:returns: The running recorder.
+
+		:raises ValueError: if invalid channel enable parameter
+		:raises ValueOutOfRangeException: if duration or a rollover limit is invalid
+		"""
+		_utils.check_parameter_valid('bool', ch1, desc='stream channel 1')
+		_utils.check_parameter_valid('bool', ch2, desc='stream channel 2')
+		_utils.check_parameter_valid('float', duration, desc='stream duration', units='sec')
+		_utils.check_parameter_valid('set', filetype, list(RECORD_FILETYPES), 'record filetype')
+		_utils.check_parameter_valid('int', rollover_size, desc='record rollover size', units='bytes', allow_none=True)
+		_utils.check_parameter_valid('range', rollover_size, [1, 2**63], 'record rollover size', 'bytes', allow_none=True)
+		_utils.check_parameter_valid('float', rollover_time, desc='record rollover time', units='sec', allow_none=True)
+		_utils.check_parameter_valid('range', rollover_time, [0, 1e9], 'record rollover time', 'sec', allow_none=True)
+		_utils.check_parameter_valid('int', queue_size, desc='record queue size')
+		_utils.check_parameter_valid('range', queue_size, [1, 2**20], 'record queue size')
+		if fsync not in FSYNC_POLICIES:
+			_utils.check_parameter_valid('float', fsync, desc='record fsync policy', units='sec')
+			fsync = float(fsync)
+
+		if self.check_uncommitted_state():
+			raise UncommittedSettings("Can't start a streaming session due to uncommitted device settings.")
+		self._stream_start(start=0, duration=duration, ch1=ch1, ch2=ch2, use_sd=False, filetype='net')
+
+		try:
+			rec = StreamRecorder(self, path, filetype, rollover_size, rollover_time, fsync, queue_size)
+		except Exception:
+			self._stream_stop()
+			raise
+
+		rec.start()
+		return rec
+
+	def stream_data_async(self, duration=10, ch1=True, ch2=True, timeout=None):
+		""" Stream instrument data over the network as an asynchronous iterator.
+
+		Starts a streaming session and yields a tuple *([CH1_DATA], [CH2_DATA])* of new samples each
+		time a block arrives, for use with *async for*. Data is received on a :py:mod:`zmq.asyncio`
+		socket so the running event loop isn't blocked. The session is stopped when the iterator
+		finishes or is closed, e.g. by breaking out of the loop.
+
+		Requires Python 3.6 or later.
+
+		:type duration: float
+		:param duration: Log duration in seconds
+		:type ch1: bool
+		:param ch1: Enable streaming on Channel 1
+		:type ch2: bool
+		:param ch2: Enable streaming on Channel 2
+		:type timeout: float
+		:param timeout: Maximum time to wait for each block of samples, or *None* for indefinite.
+
+		:raises ValueError: if invalid channel enable parameter
+		:raises ValueOutOfRangeException: if duration or timeout is invalid
+		:raises FrameTimeout: if the timeout expired
+		:raises DataIntegrityException: If the network layer detects dropped data
+		"""
+		_utils.check_parameter_valid('bool', ch1, desc='stream channel 1')
+		_utils.check_parameter_valid('bool', ch2, desc='stream channel 2')
+		_utils.check_parameter_valid('float', duration, desc='stream duration', units='sec')
+		if timeout and timeout <= 0:
+			raise ValueOutOfRangeException("Timeout must be positive or 'None'")
 
-		self._stream_clear_processed_samples(to_return)
+		if self.check_uncommitted_state():
+			raise UncommittedSettings("Can't start a streaming session due to uncommitted device settings.")
 
-		return (dout_ch1, dout_ch2)
+		from . import _async_data
+		return _async_data.stream_data(self, duration, ch1, ch2, timeout)
 
 	def start_data_log(self, duration=10, ch1=True, ch2=True, use_sd=True, filetype='csv'):
 		"""	Start logging instrument data to a file.
@@ -0,0 +1,424 @@
+import os, os.path
+import logging, time, threading
+
+from queue import Queue, Empty, Full
+
+import numpy as np
+
+from . import *
+from . import dataparser
+from ._stream_buffer import _SampleRing
+
+log = logging.getLogger(__name__)
+
+# File types a StreamRecorder can write, with their extensions
+RECORD_FILETYPES = { 'li': '.li', 'npy': '.npy', 'parquet': '.parquet' }
+
+# Named fsync policies, see StreamBasedInstrument.start_stream_record
+FSYNC_POLICIES = ['never', 'rollover', 'always']
+
+# Interval at which the receiver thread checks for a stop request (sec)
+_REC_POLL_TIME = 0.1
+
+# Rows buffered before writing a Parquet row group
+_REC_PARQUET_ROWS = 2**16
+
+# Length of the NPY header, fixed so it can be rewritten in place with the final shape
+_REC_NPY_HEADER_LEN = 128
+
+
+class _RecordFile(object):
+	# Output file of a recording, which owns the open Python file object 'file'
+	def __init__(self, fname):
+		self.fname = fname
+		self.file = None
+		self._synced = time.time()
+
+	def sync(self, policy, force=False):
+		now = time.time()
+		if policy == 'never' or not (force or policy == 'always' or
+				(not isinstance(policy, str) and now - self._synced >= policy)):
+			return
+
+		self.file.flush()
+		os.fsync(self.file.fileno())
+		self._synced = now
+
+
+class _LIRecordFile(_RecordFile):
+	# Raw stream data in LI v2 format
+	def __init__(self, fname, instr, chs, procstr, coeffs, starttime, startoffset):
+		super(_LIRecordFile, self).__init__(fname)
+		self._writer = dataparser.LIDataFileWriterV2(fname, instr.id, 0, chs,
+			instr.binstr, procstr, instr.fmtstr, instr.hdrstr, coeffs,
+			instr.timestep, starttime, startoffset)
+		self.file = self._writer.file
+
+	def write(self, ch, data):
+		self._writer.add_data(data, ch)
+
+	def close(self):
+		self._writer.finalize()
+
+
+class _NPYRecordFile(_RecordFile):
+	# Processed samples as a 2D float64 array with a row per record
+	def __init__(self, fname, names):
+		super(_NPYRecordFile, self).__init__(fname)
+		self._width = len(names)
+		self._rows = 0
+
+		self.file = open(fname, 'wb')
+		self._write_header()
+
+	def _write_header(self):
+		hdr = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d, %d), }" % (self._rows, self._width)
+		magic = np.lib.format.magic(1, 0)
+		hdr = hdr.ljust(_REC_NPY_HEADER_LEN - len(magic) - 3) + '\n'
+
+		self.file.write(magic + np.uint16(len(hdr)).astype('<u2').tobytes() + hdr.encode('latin1'))
+
+	def write(self, rows):
+		self.file.write(np.ascontiguousarray(rows, dtype='<f8').tobytes())
+		self._rows += len(rows)
+
+	def close(self):
+		self.file.seek(0)
+		self._write_header()
+		self.file.close()
+
+
+class _ParquetRecordFile(_RecordFile):
+	# Processed samples as a Parquet table with a column per record field
+	def __init__(self, fname, names):
+		super(_ParquetRecordFile, self).__init__(fname)
+		try:
+			import pyarrow, pyarrow.parquet
+		except ImportError:
+			raise InvalidOperationException("Recording Parquet files requires 'pyarrow' to be installed.")
+
+		self._pa = pyarrow
+		self._names = names
+		self._pending = []
+		self._npending = 0
+
+		self.file = open(fname, 'wb')
+		schema = pyarrow.schema([(n, pyarrow.float64()) for n in names])
+		self._writer = pyarrow.parquet.ParquetWriter(self.file, schema)
+
+	def _flush(self):
+		if not self._npending:
+			return
+
+		rows = np.concatenate(self._pending)
+		self._writer.write_table(self._pa.Table.from_arrays(
+			[self._pa.array(rows[:, i]) for i in range(len(self._names))], names=self._names))
+		self._pending, self._npending = [], 0
+
+	def write(self, rows):
+		self._pending.append(rows)
+		self._npending += len(rows)
+		if self._npending >= _REC_PARQUET_ROWS:
+			self._flush()
+
+	def sync(self, policy, force=False):
+		# Only whole row groups can be synced, so buffered rows are written first
+		if force or policy == 'always':
+			self._flush()
+		super(_ParquetRecordFile, self).sync(policy, force)
+
+	def close(self):
+		self._flush()
+		self._writer.close()
+		self.file.close()
+
+
+class StreamRecorder(object):
+	"""
+	Records a network stream to files on the local PC in the background.
+
+	Created and started by :any:`start_stream_record`. A receiver thread takes data off the network in to
+	a bounded queue, and a writer thread empties the queue in to the files. If the writer falls behind
+	and the queue fills, the receiver waits for space, so data is held in the network buffers rather
+	than in unbounded host memory.
+
+	'li' files hold the raw stream data and can be converted with :any:`LIDataFileReader` or the
+	*moku_convert* tool. 'npy' and 'parquet' files hold the processed samples, one row per record, with
+	a *time* column (sec) followed by a column per channel, or per field of multi-field records.
+
+	Recordings may be split in to several files, numbered from zero, each holding the same number of
+	records. The recording stops at the end of the stream; :any:`stop` must always be called to release
+	the stream, and raises any error that occurred while recording.
+	"""
+	def __init__(self, instrument, path, filetype='li', rollover_size=None, rollover_time=None,
+			fsync='rollover', queue_size=256):
+		self._instr = instrument
+		self.filetype = filetype
+		self.fsync = fsync
+
+		base, ext = os.path.splitext(path)
+		if not ext:
+			ext = RECORD_FILETYPES[filetype]
+
+		if rollover_size or rollover_time:
+			self._fname = base + '_%04d' + ext
+		else:
+			self._fname = base + ext
+
+		# Parser channel indices are in order of the enabled channels, as are the processing strings,
+		# while the instrument has one per physical channel
+		self._channels = [c for c, en in [(1, instrument.ch1), (2, instrument.ch2)] if en]
+		self._procstr = [instrument.procstr[c - 1] for c in self._channels]
+		self._starttime = int(time.time())
+
+		reclen = dataparser.LIDataParser.record_length(instrument.binstr)
+
+		# Records per file, the same for every channel
+		self._file_records = None
+		if rollover_time:
+			self._file_records = max(1, int(round(rollover_time / instrument.timestep)))
+		if rollover_size:
+			n = max(1, int(8 * rollover_size // (reclen * len(self._channels))))
+			self._file_records = min(n, self._file_records or n)
+
+		if filetype == 'li' and self._file_records and reclen % 8:
+			raise InvalidOperationException("Can't split 'li' recordings of records that aren't a whole number of bytes")
+
+		self._reclen = reclen // 8
+
+		self._queue = Queue(maxsize=queue_size)
+		self._stopping = threading.Event()
+		self._error = None
+
+		self._files = {}
+		self._pos = [0] * len(self._channels)
+
+		if filetype == 'li':
+			self._coeffs = [None] * len(self._channels)
+			self._pending = []
+		else:
+			self._parser = dataparser.LIDataParser(instrument.ch1, instrument.ch2,
+				instrument.binstr, self._procstr, instrument.fmtstr, instrument.hdrstr,
+				instrument.timestep, self._starttime, [0] * len(self._channels), 0)
+			self._rings = [_SampleRing(_REC_PARQUET_ROWS) for _ in self._channels]
+			self._names = None
+
+		#: Names of the files written, in order
+		self.files = []
+		#: Number of bytes of stream data received
+		self.bytes_received = 0
+		#: Number of records written per channel
+		self.samples = 0
+		#: Largest number of messages waiting in the queue
+		self.queue_high_water = 0
+
+		self._receiver = threading.Thread(target=self._receive)
+		self._writer = threading.Thread(target=self._write)
+		self._receiver.daemon = self._writer.daemon = True
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.stop()
+
+	def start(self):
+		self._receiver.start()
+		self._writer.start()
+
+	@property
+	def running(self):
+		""" Whether the recording is still in progress. """
+		return self._writer.is_alive()
+
+	def wait(self, timeout=None):
+		""" Wait for the stream to end and all data to be written.
+
+		:type timeout: float
+		:param timeout: Maximum time to wait (sec), or *None* for indefinite.
+
+		:rtype: bool
+		:return: True if the recording has finished.
+		"""
+		self._writer.join(timeout)
+		return not self._writer.is_alive()
+
+	def stop(self):
+		""" Stop the stream, write any remaining data and close the files.
+
+		:raises StreamException: if the stream failed
+		:raises DataIntegrityException: if data was lost on the network
+		"""
+		self._stopping.set()
+		self._receiver.join()
+
+		if self._instr._stream_net_is_running():
+			self._instr._stream_stop()
+
+		self._writer.join()
+
+		if self._error is not None:
+			raise self._error
+
+	def _fail(self, e):
+		if self._error is None:
+			self._error = e
+		self._stopping.set()
+
+	def _receive(self):
+		try:
+			while not self._stopping.is_set():
+				try:
+					msg = self._instr._stream_get_samples_raw(_REC_POLL_TIME)
+				except FrameTimeout:
+					continue
+				except NoDataException:
+					break
+
+				self._put(msg)
+		except Exception as e:
+			self._fail(e)
+		finally:
+			self._put(None, force=True)
+
+	def _put(self, msg, force=False):
+		# Blocks while the queue is full, unless the recording has failed
+		while True:
+			try:
+				self._queue.put(msg, timeout=_REC_POLL_TIME)
+				break
+			except Full:
+				if self._error is not None and not force:
+					return
+				if not self._writer.is_alive():
+					return
+
+		self.queue_high_water = max(self.queue_high_water, self._queue.qsize())
+
+	def _write(self):
+		try:
+			while True:
+				msg = self._queue.get()
+				if msg is None:
+					break
+
+				self._handle(*msg)
+
+				for f in self._files.values():
+					f.sync(self.fsync)
+		except Exception as e:
+			self._fail(e)
+		finally:
+			self._close_files(None)
+
+			# Let a receiver blocked on a full queue finish
+			while True:
+				try:
+					self._queue.get_nowait()
+				except Empty:
+					break
+
+	def _handle(self, ch, start, coeff, data):
+		if start != self._pos[ch]:
+			raise DataIntegrityException("Data loss detected on stream interface")
+
+		self._pos[ch] += len(data)
+		self.bytes_received += len(data)
+
+		if self.filetype == 'li':
+			self._handle_raw(ch, start, coeff, data)
+		else:
+			self._handle_samples(ch, coeff, data)
+
+	def _file_index(self, record):
+		return record // self._file_records if self._file_records else 0
+
+	def _open(self, index, *args):
+		fname = self._fname % index if self._file_records else self._fname
+		startoffset = index * (self._file_records or 0) * self._instr.timestep
+
+		if self.filetype == 'li':
+			f = _LIRecordFile(fname, self._instr, sum(1 << (c - 1) for c in self._channels),
+				self._procstr, self._coeffs, self._starttime, startoffset)
+		elif self.filetype == 'npy':
+			f = _NPYRecordFile(fname, *args)
+		else:
+			f = _ParquetRecordFile(fname, *args)
+
+		log.debug("Recording stream to %s", fname)
+		self._files[index] = f
+		self.files.append(fname)
+		return f
+
+	def _close_files(self, before):
+		# Close files holding only records before 'before', or all if None
+		for index in sorted(self._files):
+			if before is not None and (index + 1) * self._file_records > before:
+				break
+
+			f = self._files.pop(index)
+			f.sync(self.fsync, force=self.fsync != 'never')
+			f.close()
+
+	def _handle_raw(self, ch, start, coeff, data):
+		# The LI header holds the calibration of every channel, so data is held back until each
+		# channel has sent some
+		if None in self._coeffs:
+			self._coeffs[ch] = coeff
+			self._pending.append((ch, start, data))
+			if None in self._coeffs:
+				return
+		else:
+			self._pending.append((ch, start, data))
+
+		pending, self._pending = self._pending, []
+		for ch, start, data in pending:
+			while len(data):
+				index = self._file_index(start // self._reclen)
+				n = len(data)
+				if self._file_records:
+					n = min(n, (index + 1) * self._file_records * self._reclen - start)
+
+				f = self._files.get(index) or self._open(index)
+				f.write(ch, data[:n])
+				start, data = start + n, data[n:]
+
+		self.samples = min(self._pos) // self._reclen
+		if self._file_records:
+			self._close_files(min(self._pos) // self._reclen)
+
+	def _handle_samples(self, ch, coeff, data):
+		self._parser.set_coeff(ch, coeff)
+		self._parser.parse(data, ch)
+
+		for ring, processed in zip(self._rings, self._parser.processed):
+			ring.push(processed)
+		self._parser.clear_processed()
+
+		n = min(len(r) for r in self._rings)
+		if not n:
+			return
+
+		cols = [r.pop(n).reshape(n, -1) for r in self._rings]
+		if self._names is None:
+			self._names = ['time']
+			for c, col in zip(self._channels, cols):
+				width = col.shape[1]
+				self._names.extend(['ch%d' % c] if width == 1 else ['ch%d_%d' % (c, k) for k in range(width)])
+
+		t = (self.samples + np.arange(n)) * self._instr.timestep
+		rows = np.column_stack([t] + cols)
+
+		while len(rows):
+			index = self._file_index(self.samples)
+			m = len(rows)
+			if self._file_records:
+				m = min(m, (index + 1) * self._file_records - self.samples)
+
+			f = self._files.get(index) or self._open(index, self._names)
+			f.write(rows[:m])
+			rows = rows[m:]
+			self.samples += m
+
+			if self._file_records:
+				self._close_files(self.samples)
@@ -6,6 +6,8 @@ import os, os.path, time, datetime, math
 import logging
 import re, struct
 
+import numpy as np
+
 log = logging.getLogger(__name__)
 
 try:
@@ -815,4 +817,99 @@ try:
 
 except ImportError:
 	log.debug("liquidreader module unable to be imported. Falling back to default data parser.")
-	LIDataParser = SlowDataParser
\ No newline at end of file
+	LIDataParser = SlowDataParser
+
+class ArrayDataParser(object):
+	""" Parses streams whose records are a single fixed-width integer field directly in to
+	NumPy arrays, vectorising both the binary decoding and the processing operations.
+
+	Only binary strings of one un-matched 8, 16, 32 or 64-bit integer field (e.g. "<s32") and
+	processing strings made of the arithmetic operations *, /, + and - are supported. The arrays
+	are preallocated to *capacity* samples and grow as required.
+
+	Presents the same *processed*, *set_coeff*, *parse* and *clear_processed* interface as
+	:any:`LIDataParser`, with *processed* holding arrays rather than lists."""
+
+	def __init__(self, ch1, ch2, binstr, procstr, calcoeffs, capacity=0):
+		binfmt = LIDataParser._parse_binstr(binstr)
+
+		if len(binfmt) != 1 or binfmt[0][0] not in 'su' or binfmt[0][1] not in (8, 16, 32, 64) or binfmt[0][2] is not None:
+			raise InvalidFormatException("Can't parse '%s' in to arrays" % binstr)
+
+		typ, bitlen, _ = binfmt[0]
+		self.dtype = np.dtype('<%s%d' % ('i' if typ == 's' else 'u', bitlen // 8))
+
+		self.ch1 = bool(ch1)
+		self.ch2 = bool(ch2)
+		self.nch = int(self.ch1) + int(self.ch2)
+
+		# Processing strings and data are indexed by session channel, not physical channel
+		self.procstr = [p for p, c in zip(procstr, [self.ch1, self.ch2]) if c]
+		self.procfmt = [None] * self.nch
+		for ch in range(self.nch):
+			self.set_coeff(ch, calcoeffs[ch])
+
+		self._data = [np.empty(capacity) for _ in range(self.nch)]
+		self._len = [0] * self.nch
+		self._dcache = [b''] * self.nch
+		self._byteidx = [0] * self.nch
+
+	@property
+	def processed(self):
+		return [d[:n] for d, n in zip(self._data, self._len)]
+
+	def set_coeff(self, ch, coeff):
+		ops = LIDataParser._parse_procstr(self.procstr[ch], coeff)[0]
+
+		for op, lit in ops:
+			if op not in '*/+-':
+				raise InvalidFormatException("Can't process '%s' in to arrays" % self.procstr[ch])
+
+		self.procfmt[ch] = ops
+
+	def _append(self, ch, vals):
+		end = self._len[ch] + len(vals)
+
+		if end > len(self._data[ch]):
+			data = np.empty(max(end, 2 * len(self._data[ch])))
+			data[:self._len[ch]] = self._data[ch][:self._len[ch]]
+			self._data[ch] = data
+
+		self._data[ch][self._len[ch]:end] = vals
+		self._len[ch] = end
+
+	def parse(self, data, ch, start_idx=None):
+		""" Parse a chunk of data.
+
+		:param data: bytestring of new data
+		:param ch: Channel to which the data belongs
+
+		:raises DataIntegrityException: if *start_idx* shows data has been lost"""
+		if start_idx is not None:
+			if self._byteidx[ch] == start_idx:
+				self._byteidx[ch] += len(data)
+			else:
+				raise DataIntegrityException("Data loss detected on stream interface")
+
+		# Records may be split across chunks
+		buf = self._dcache[ch] + data
+		whole = len(buf) - len(buf) % self.dtype.itemsize
+		self._dcache[ch] = buf[whole:]
+
+		vals = np.frombuffer(buf[:whole], dtype=self.dtype).astype(float)
+
+		for op, lit in self.procfmt[ch]:
+			if   op == '*': vals *= lit
+			elif op == '/': vals /= lit
+			elif op == '+': vals += lit
+			elif op == '-': vals -= lit
+
+		self._append(ch, vals)
+
+	def clear_processed(self, _len=None):
+		""" Flush processed data. """
+		for ch in range(self.nch):
+			n = self._len[ch] if _len is None else min(_len, self._len[ch])
+			remaining = self._len[ch] - n
+			self._data[ch][:remaining] = self._data[ch][n:self._len[ch]]
+			self._len[ch] = remaining
@@ -23,8 +23,15 @@ from . import _laser_lock_box
 
 InstrumentData = _frame_instrument.InstrumentData
 VoltsData = _oscilloscope.VoltsData
+SegmentedVoltsData = _oscilloscope.SegmentedVoltsData
+RecordVoltsData = _oscilloscope.RecordVoltsData
 SpectrumData = _specan.SpectrumData
+SpectrumWaterfall = _specan.SpectrumWaterfall
+StitchedSpectrumData = _specan.StitchedSpectrumData
 BodeData = _bodeanalyzer.BodeData
+AdaptiveBodeData = _bodeanalyzer.AdaptiveBodeData
+BodeSweepStatistics = _bodeanalyzer.BodeSweepStatistics
+StreamRecorder = _stream_instrument.StreamRecorder
 
 MokuInstrument = _instrument.MokuInstrument
 
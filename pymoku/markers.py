@@ -0,0 +1,290 @@
+"""
+Peak search and marker measurements on SpectrumAnalyzer data.
+
+The functions take a :any:`SpectrumData` frame, or plain amplitude and frequency arrays, and are
+vectorised over the frequency bins so they can be run on every frame as it arrives. They're also
+available as methods of :any:`SpectrumData`::
+
+	data = i.get_data()
+	for f, a in data.peaks(n=3):
+		print("%.3f MHz: %.1f dBm" % (f / 1e6, a))
+	print(data.bandwidth(n_db=3))
+
+Peak frequencies and amplitudes are refined by fitting a parabola through the highest bin and its
+neighbours. All level comparisons are made in dB, so the results are the same whether the frame is
+in dBm or RMS Voltage scale; amplitudes are returned in the units of the frame.
+"""
+import numpy as np
+
+
+def _spectrum(data, ch, frequency, dbm):
+	# Returns (frequency, amplitude in dB, dbm) as float arrays, with NaN for invalid points
+	if ch not in [1, 2]:
+		raise ValueError("Invalid channel %s" % ch)
+
+	if hasattr(data, 'ch1'):
+		# Frames keep their channel data as arrays alongside the per-state frequency axis
+		arrays = getattr(data, '_arrays', None)
+		if arrays is not None:
+			f, y = arrays[0], arrays[ch]
+		else:
+			f = np.asarray(data.frequency, dtype=float)
+			y = np.asarray(getattr(data, 'ch%d' % ch), dtype=float)
+		dbm = data.dbm
+	else:
+		if frequency is None:
+			raise ValueError("A frequency axis is required for plain amplitude arrays")
+		f = np.asarray(frequency, dtype=float)
+		y = np.asarray(data, dtype=float)
+
+	if len(f) != len(y):
+		raise ValueError("Amplitude and frequency arrays differ in length")
+
+	if not dbm:
+		with np.errstate(divide='ignore', invalid='ignore'):
+			y = 20.0 * np.log10(y)
+
+	return f, y, dbm
+
+
+def _from_db(z, dbm):
+	return z if dbm else 10.0 ** (np.asarray(z) / 20.0)
+
+
+def _to_db(y, dbm):
+	return y if dbm else 20.0 * np.log10(y)
+
+
+def _interpolate(f, z, i):
+	# Vertex of the parabola through bins i - 1, i and i + 1, for an array of bin indices
+	i = np.clip(np.asarray(i), 1, len(z) - 2)
+	z0, z1, z2 = z[i - 1], z[i], z[i + 1]
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		denom = z0 - 2 * z1 + z2
+		p = np.where(np.isfinite(denom) & (denom != 0), 0.5 * (z0 - z2) / denom, 0.0)
+
+	p = np.clip(p, -0.5, 0.5)
+	return np.interp(i + p, np.arange(len(f)), f), z1 - 0.25 * (z0 - z2) * p
+
+
+def _find_peaks(f, z, n, threshold, separation):
+	if len(z) < 3:
+		return np.array([], dtype=int)
+
+	mid = z[1:-1]
+	idx = np.flatnonzero((mid > z[:-2]) & (mid >= z[2:])) + 1
+
+	if threshold is not None:
+		idx = idx[z[idx] >= threshold]
+
+	idx = idx[np.argsort(-z[idx], kind='stable')]
+
+	if not separation:
+		return idx[:n]
+
+	picked = []
+	while len(idx) and len(picked) < n:
+		picked.append(idx[0])
+		idx = idx[np.abs(f[idx] - f[idx[0]]) > separation]
+
+	return np.array(picked, dtype=int)
+
+
+def peaks(data, ch=1, n=1, threshold=None, separation=0, frequency=None, dbm=True):
+	""" Find the highest peaks in a spectrum.
+
+	:type data: :any:`SpectrumData` or array
+	:param data: Spectrum to search. Plain arrays require *frequency*.
+
+	:type ch: int; {1,2}
+	:param ch: Channel to search.
+
+	:type n: int
+	:param n: Maximum number of peaks to return.
+
+	:type threshold: float
+	:param threshold: Minimum peak amplitude, or *None* for no limit.
+
+	:type separation: float
+	:param separation: Minimum separation between peaks (Hz). Lower peaks closer than this to a higher one
+		are ignored.
+
+	:type frequency: array
+	:param frequency: Frequency axis of plain array data (Hz).
+
+	:type dbm: bool
+	:param dbm: Whether plain array data is in dBm, rather than RMS Voltage, scale.
+
+	:rtype: list of (float, float)
+	:return: (frequency, amplitude) of each peak, highest first.
+	"""
+	f, z, dbm = _spectrum(data, ch, frequency, dbm)
+
+	if threshold is not None:
+		threshold = _to_db(threshold, dbm)
+
+	pf, pz = _interpolate(f, z, _find_peaks(f, z, n, threshold, separation))
+	return list(zip(pf.tolist(), np.atleast_1d(_from_db(pz, dbm)).tolist()))
+
+
+def bandwidth(data, ch=1, n_db=3.0, peak=None, frequency=None, dbm=True):
+	""" Measure the width of a peak at *n_db* below its maximum.
+
+	:type data: :any:`SpectrumData` or array
+	:param data: Spectrum to measure. Plain arrays require *frequency*.
+
+	:type ch: int; {1,2}
+	:param ch: Channel to measure.
+
+	:type n_db: float
+	:param n_db: Level below the peak at which to measure (dB).
+
+	:type peak: float
+	:param peak: Frequency of the peak to measure (Hz), or *None* for the highest peak.
+
+	:type frequency: array
+	:param frequency: Frequency axis of plain array data (Hz).
+
+	:type dbm: bool
+	:param dbm: Whether plain array data is in dBm, rather than RMS Voltage, scale.
+
+	:rtype: (float, float, float)
+	:return: (width, lower frequency, upper frequency) in Hz. The frequencies are NaN if the spectrum
+		doesn't fall below the level on that side of the peak, and the width is NaN if either is.
+	"""
+	f, z, dbm = _spectrum(data, ch, frequency, dbm)
+
+	if peak is None:
+		i = _find_peaks(f, z, 1, None, 0)
+		if not len(i):
+			return (np.nan, np.nan, np.nan)
+		i = i[0]
+	else:
+		i = int(np.argmin(np.abs(f - peak)))
+
+	_, top = _interpolate(f, z, i)
+	level = top - n_db
+
+	with np.errstate(invalid='ignore'):
+		below = z < level
+
+	# Interpolated crossing between the last bin below the level and the one after it, on each side
+	left = np.flatnonzero(below[:i])
+	right = np.flatnonzero(below[i + 1:])
+
+	if len(left):
+		j = left[-1]
+		lo = f[j] + (f[j + 1] - f[j]) * (level - z[j]) / (z[j + 1] - z[j])
+	else:
+		lo = np.nan
+
+	if len(right):
+		j = right[0] + i + 1
+		hi = f[j - 1] + (f[j] - f[j - 1]) * (z[j - 1] - level) / (z[j - 1] - z[j])
+	else:
+		hi = np.nan
+
+	return (float(hi - lo), float(lo), float(hi))
+
+
+def noise_floor(data, ch=1, frequency=None, dbm=True):
+	""" Estimate the noise floor of a spectrum as its median level.
+
+	The median is insensitive to the few bins occupied by signals, but is below the mean noise power
+	(by about 1.6 dB for noise-like bins).
+
+	:type data: :any:`SpectrumData` or array
+	:param data: Spectrum to measure. Plain arrays require *frequency*.
+
+	:type ch: int; {1,2}
+	:param ch: Channel to measure.
+
+	:type frequency: array
+	:param frequency: Frequency axis of plain array data (Hz).
+
+	:type dbm: bool
+	:param dbm: Whether plain array data is in dBm, rather than RMS Voltage, scale.
+
+	:rtype: float
+	:return: Noise floor, in the amplitude units of the spectrum.
+	"""
+	f, z, dbm = _spectrum(data, ch, frequency, dbm)
+	return float(_from_db(np.nanmedian(z), dbm))
+
+
+def harmonics(data, ch=1, n=5, fundamental=None, tolerance=None, frequency=None, dbm=True):
+	""" Measure the harmonics of a signal and its total harmonic distortion (THD).
+
+	Each harmonic is the highest point within *tolerance* of the multiple of the fundamental frequency.
+	Harmonics outside the spectrum are NaN and don't count towards the THD.
+
+	:type data: :any:`SpectrumData` or array
+	:param data: Spectrum to measure. Plain arrays require *frequency*.
+
+	:type ch: int; {1,2}
+	:param ch: Channel to measure.
+
+	:type n: int
+	:param n: Highest harmonic to measure, where the fundamental is the first.
+
+	:type fundamental: float
+	:param fundamental: Frequency of the fundamental (Hz), or *None* for the highest peak.
+
+	:type tolerance: float
+	:param tolerance: Distance from each multiple of the fundamental frequency to search (Hz), or *None*
+		for two bins.
+
+	:type frequency: array
+	:param frequency: Frequency axis of plain array data (Hz).
+
+	:type dbm: bool
+	:param dbm: Whether plain array data is in dBm, rather than RMS Voltage, scale.
+
+	:rtype: dict
+	:return: *fundamental* and *harmonics*, the (frequency, amplitude) of the fundamental and of each
+		harmonic from the second to the *n*'th; *thd*, the RMS amplitude of the harmonics as a fraction
+		of the fundamental; and *thd_db*, the harmonic power relative to the fundamental in dB.
+	"""
+	f, z, dbm = _spectrum(data, ch, frequency, dbm)
+
+	if tolerance is None:
+		tolerance = 2 * abs(f[-1] - f[0]) / max(len(f) - 1, 1)
+
+	if fundamental is None:
+		i = _find_peaks(f, z, 1, None, 0)
+		if not len(i):
+			raise ValueError("No peak found in the spectrum")
+		fundamental = _interpolate(f, z, i[0])[0]
+
+	# Range of bins searched for each harmonic
+	centres = fundamental * np.arange(1, n + 1)
+	lo = np.searchsorted(f, centres - tolerance, side='left')
+	hi = np.searchsorted(f, centres + tolerance, side='right')
+
+	idx = np.full(n, -1)
+	for k in np.flatnonzero(hi > lo):
+		seg = z[lo[k]:hi[k]]
+		if not np.isnan(seg).all():
+			idx[k] = lo[k] + np.nanargmax(seg)
+
+	found = idx >= 0
+	hf, hz = np.full(n, np.nan), np.full(n, np.nan)
+	hf[found], hz[found] = _interpolate(f, z, idx[found])
+
+	if not found[0]:
+		raise ValueError("Fundamental is outside the spectrum")
+
+	power = 10.0 ** (hz / 10.0)
+	ratio = np.nansum(power[1:]) / power[0]
+
+	with np.errstate(divide='ignore'):
+		thd_db = 10.0 * np.log10(ratio)
+
+	amp = np.atleast_1d(_from_db(hz, dbm))
+	return {
+		'fundamental': (float(hf[0]), float(amp[0])),
+		'harmonics': list(zip(hf[1:].tolist(), amp[1:].tolist())),
+		'thd': float(np.sqrt(ratio)),
+		'thd_db': float(thd_db),
+	}
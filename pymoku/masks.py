@@ -0,0 +1,163 @@
+"""
+Mask (limit line) testing of Oscilloscope and SpectrumAnalyzer frames.
+
+A mask is an upper and/or lower limit line given as breakpoints in the units of the frame's
+x-axis: seconds for :any:`VoltsData`, Hz for :any:`SpectrumData`. The limit lines are
+interpolated on to each instrument state's axis once, and every frame is then checked with a
+few array operations. A mask test can be fed every new frame by subscribing it to the
+instrument::
+
+	from pymoku.masks import MaskTest
+
+	mask = MaskTest(upper=[(0, -20), (1e6, -20), (1e6, -50), (250e6, -50)], capture=10)
+	i.subscribe(mask.test)
+	...
+	print(mask.passed, mask.failed)
+"""
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# Number of distinct frame axes for which compiled limit lines are kept
+_MASK_CACHE_SIZE = 64
+
+
+def _limit_points(points):
+	if points is None:
+		return None
+
+	points = np.asarray(points, dtype=float)
+	if points.ndim != 2 or points.shape[1] != 2 or len(points) < 2:
+		raise ValueError("Limit lines must be at least two (x, y) breakpoints")
+
+	if np.any(np.diff(points[:, 0]) < 0):
+		raise ValueError("Limit line breakpoints must be in order of increasing x")
+
+	return points
+
+
+def _compile(points, x):
+	# Limit at each point of the axis, NaN outside the limit line so that it isn't tested there
+	if points is None:
+		return None
+	return np.interp(x, points[:, 0], points[:, 1], left=np.nan, right=np.nan)
+
+
+class MaskTest(object):
+	"""
+	Tests frames against upper and lower limit lines, counting passes and failures.
+
+	A frame fails if any valid sample of the tested channel is above the upper limit or below the
+	lower limit. Points outside the x-range of a limit line aren't tested against it. At a step in
+	the limit, give two breakpoints at the same x; the limit there is the value after the step.
+
+	:type upper: list of (float, float)
+	:param upper: Upper limit breakpoints (x, y), in order of increasing x, or *None*.
+
+	:type lower: list of (float, float)
+	:param lower: Lower limit breakpoints (x, y), in order of increasing x, or *None*.
+
+	:type ch: int; {1,2}
+	:param ch: Channel to test.
+
+	:type capture: int
+	:param capture: Number of the most recent failing frames to keep in *failures*.
+	"""
+	def __init__(self, upper=None, lower=None, ch=1, capture=0):
+		if upper is None and lower is None:
+			raise ValueError("A mask needs an upper or lower limit line")
+		if ch not in [1, 2]:
+			raise ValueError("Invalid channel %s" % ch)
+
+		self._upper = _limit_points(upper)
+		self._lower = _limit_points(lower)
+		self.ch = ch
+
+		self._compiled = OrderedDict()
+		self._lock = threading.Lock()
+
+		#: Most recent failing frames, oldest first.
+		self.failures = deque(maxlen=capture)
+
+		self.reset()
+
+	def reset(self):
+		""" Zero the counters and discard any captured failing frames. """
+		with self._lock:
+			#: Number of frames tested.
+			self.tested = 0
+			#: Number of frames within the mask.
+			self.passed = 0
+			#: Number of frames outside the mask.
+			self.failed = 0
+			#: Total number of samples outside the mask, over all frames.
+			self.violations = 0
+
+			self.failures.clear()
+
+	def _limits(self, x):
+		# Keyed on the whole axis, as e.g. linear and logarithmic axes can share their length and end points
+		key = x.tobytes()
+
+		limits = self._compiled.get(key)
+		if limits is None:
+			limits = (_compile(self._upper, x), _compile(self._lower, x))
+			self._compiled[key] = limits
+
+			if len(self._compiled) > _MASK_CACHE_SIZE:
+				self._compiled.popitem(last=False)
+
+		return limits
+
+	def violations_of(self, frame):
+		""" Find the samples of a frame outside the mask, without counting the frame.
+
+		:type frame: :any:`VoltsData` or :any:`SpectrumData`
+		:param frame: Frame to test.
+
+		:rtype: array of bool
+		:return: True for each sample outside the mask.
+		"""
+		x = np.asarray(frame.frequency if hasattr(frame, 'frequency') else frame.time, dtype=float)
+
+		# Invalid (None) samples become NaN, which compare false against both limits
+		y = np.asarray(getattr(frame, 'ch%d' % self.ch), dtype=float)
+
+		if len(x) != len(y):
+			raise ValueError("Frame axis and channel data differ in length")
+
+		upper, lower = self._limits(x)
+
+		with np.errstate(invalid='ignore'):
+			bad = np.zeros(len(y), dtype=bool)
+			if upper is not None:
+				bad |= y > upper
+			if lower is not None:
+				bad |= y < lower
+
+		return bad
+
+	def test(self, frame):
+		""" Test a frame against the mask and update the counters.
+
+		:type frame: :any:`VoltsData` or :any:`SpectrumData`
+		:param frame: Frame to test.
+
+		:rtype: bool
+		:return: True if the frame is within the mask.
+		"""
+		n = int(np.count_nonzero(self.violations_of(frame)))
+
+		with self._lock:
+			self.tested += 1
+			self.violations += n
+
+			if n:
+				self.failed += 1
+				if self.failures.maxlen:
+					self.failures.append(frame)
+			else:
+				self.passed += 1
+
+		return not n
@@ -0,0 +1,275 @@
+"""
+Waveform measurements on Oscilloscope data, calculated in a single vectorised pass over a
+frame or a batch of frames.
+
+Measurements can be made directly on :any:`VoltsData`, a list of frames, the segments of
+a :any:`SegmentedVoltsData` or plain arrays::
+
+	from pymoku.measurements import Measurements
+
+	meas = Measurements()
+	data = i.get_data()
+	print(meas.measure(data, ch=1)['rise_time'])
+
+Edges are detected with hysteresis between the *low* and *high* reference levels, so noise
+around the middle level doesn't create extra edges. Levels are calculated from each frame's own
+data, and reused when the same frames are measured again, e.g. for further measurements.
+"""
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+# Number of frames (or batches of frames) for which reference levels are remembered
+_MEAS_LEVELS_CACHE_SIZE = 64
+
+#: Names of all available measurements
+MEASUREMENTS = ['vpp', 'max', 'min', 'mean', 'rms', 'top', 'base', 'frequency', 'period',
+	'rise_time', 'fall_time', 'duty', 'overshoot', 'undershoot']
+
+
+def _samples(data, ch, time):
+	# Returns (samples, time, key, batch) with samples as a 2D array, one row per frame. The key
+	# identifies the frames by instrument state and waveform ID, or is None for plain arrays.
+	if hasattr(data, 'ch1'):
+		y = np.asarray(getattr(data, 'ch%d' % ch), dtype=float)
+		t = data.time
+		frames = [data]
+	elif len(data) and hasattr(data[0], 'ch1'):
+		y = np.array([getattr(d, 'ch%d' % ch) for d in data], dtype=float)
+		t = data[0].time
+		frames = data
+	else:
+		y = np.asarray(data, dtype=float)
+		t = time
+		frames = []
+
+	key = tuple((getattr(d, '_stateid', None), getattr(d, 'waveformid', None)) for d in frames)
+	if not key or any(None in k for k in key):
+		key = None
+
+	if t is None:
+		raise ValueError("A time axis is required to measure raw sample arrays")
+
+	batch = y.ndim == 2
+	y = np.atleast_2d(y)
+	t = np.asarray(t, dtype=float)
+
+	if y.shape[1] != len(t):
+		raise ValueError("Sample and time arrays differ in length")
+
+	return y, t, key, batch
+
+
+def _levels(y):
+	# Top and base are the medians of the samples above and below the middle of the range,
+	# which are insensitive to overshoot and ringing
+	ymax = np.nanmax(y, axis=1)
+	ymin = np.nanmin(y, axis=1)
+	mid = ((ymax + ymin) / 2)[:, None]
+
+	# A flat signal has nothing below the middle
+	with warnings.catch_warnings():
+		warnings.simplefilter('ignore', RuntimeWarning)
+		top = np.nanmedian(np.where(y >= mid, y, np.nan), axis=1)
+		base = np.nanmedian(np.where(y < mid, y, np.nan), axis=1)
+
+	base = np.where(np.isnan(base), top, base)
+
+	return top, base
+
+
+def _last_index(mask):
+	# For each sample, the index of the most recent sample (inclusive) where mask is set, or -1
+	idx = np.where(mask, np.arange(mask.shape[1]), -1)
+	return np.maximum.accumulate(idx, axis=1)
+
+
+def _crossing(y, t0, dt, rows, i, level):
+	# Interpolated time at which the signal crosses level[rows] between samples i and i + 1
+	y0, y1 = y[rows, i], y[rows, i + 1]
+	return t0 + dt * (i + (level[rows] - y0) / (y1 - y0))
+
+
+def _row_mean(rows, values, n):
+	count = np.bincount(rows, minlength=n)
+	total = np.bincount(rows, weights=values, minlength=n)
+
+	with np.errstate(invalid='ignore', divide='ignore'):
+		return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+
+def _edges(y, low, high):
+	# Returns (rows, index) of the first sample of each rising and each falling edge, where
+	# the signal has moved between the low and high levels
+	state = np.where(y >= high[:, None], 1, np.where(y <= low[:, None], -1, 0))
+
+	# Carry the last definite state through the samples between the levels
+	last = _last_index(state != 0)
+	held = np.where(last >= 0, np.take_along_axis(state, np.maximum(last, 0), axis=1), 0)
+
+	change = held[:, 1:] * held[:, :-1] == -1
+	rows, i = np.nonzero(change)
+	i = i + 1
+
+	rising = held[rows, i] == 1
+	return (rows[rising], i[rising]), (rows[~rising], i[~rising])
+
+
+def _measure(y, t, levels, low, mid, high):
+	n = y.shape[0]
+	t0 = t[0]
+	dt = t[1] - t[0] if len(t) > 1 else 1.0
+
+	top, base = levels
+	amp = top - base
+
+	res = {}
+	res['max'] = np.nanmax(y, axis=1)
+	res['min'] = np.nanmin(y, axis=1)
+	res['vpp'] = res['max'] - res['min']
+	res['mean'] = np.nanmean(y, axis=1)
+	res['rms'] = np.sqrt(np.nanmean(y ** 2, axis=1))
+	res['top'] = top
+	res['base'] = base
+
+	with np.errstate(invalid='ignore', divide='ignore'):
+		res['overshoot'] = np.where(amp > 0, 100.0 * (res['max'] - top) / amp, np.nan)
+		res['undershoot'] = np.where(amp > 0, 100.0 * (base - res['min']) / amp, np.nan)
+
+	lo = base + low * amp
+	md = base + mid * amp
+	hi = base + high * amp
+
+	(rr, ri), (fr, fi) = _edges(y, lo, hi)
+
+	# Each edge passes through every level between the last sample on the far side of that level
+	# and the first sample of the edge
+	below_lo = _last_index(y <= lo[:, None])
+	below_md = _last_index(y < md[:, None])
+	above_hi = _last_index(y >= hi[:, None])
+	above_md = _last_index(y > md[:, None])
+
+	r_mid = _crossing(y, t0, dt, rr, below_md[rr, ri - 1], md)
+	f_mid = _crossing(y, t0, dt, fr, above_md[fr, fi - 1], md)
+
+	rise = _crossing(y, t0, dt, rr, ri - 1, hi) - _crossing(y, t0, dt, rr, below_lo[rr, ri - 1], lo)
+	fall = _crossing(y, t0, dt, fr, fi - 1, lo) - _crossing(y, t0, dt, fr, above_hi[fr, fi - 1], hi)
+
+	res['rise_time'] = _row_mean(rr, rise, n)
+	res['fall_time'] = _row_mean(fr, fall, n)
+
+	# Period from successive rising edges in the same frame
+	same = rr[1:] == rr[:-1]
+	res['period'] = _row_mean(rr[1:][same], np.diff(r_mid)[same], n)
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		res['frequency'] = 1.0 / res['period']
+
+	# Edges alternate, so each rising edge followed by an edge in the same frame starts a high time
+	rows = np.concatenate([rr, fr])
+	times = np.concatenate([r_mid, f_mid])
+	rising = np.concatenate([np.ones(len(rr), dtype=bool), np.zeros(len(fr), dtype=bool)])
+
+	order = np.lexsort((times, rows))
+	rows, times, rising = rows[order], times[order], rising[order]
+
+	high_time = rising[:-1] & (rows[1:] == rows[:-1])
+	high = _row_mean(rows[:-1][high_time], np.diff(times)[high_time], n)
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		res['duty'] = 100.0 * high / res['period']
+
+	return res
+
+
+class Measurements(object):
+	"""
+	Calculates waveform measurements, remembering the reference levels used for recently measured frames.
+
+	The reference levels are fractions of the signal amplitude between its *base* and *top* levels.
+	Rise and fall times are measured between the *low* and *high* levels; frequency, period and duty
+	cycle at the *mid* level.
+
+	:type low: float
+	:param low: Low reference level as a fraction of amplitude.
+
+	:type mid: float
+	:param mid: Middle reference level as a fraction of amplitude.
+
+	:type high: float
+	:param high: High reference level as a fraction of amplitude.
+	"""
+	def __init__(self, low=0.1, mid=0.5, high=0.9):
+		if not 0 <= low < mid < high <= 1:
+			raise ValueError("Reference levels must satisfy 0 <= low < mid < high <= 1")
+
+		self.low = low
+		self.mid = mid
+		self.high = high
+
+		self._levels = OrderedDict()
+
+	def reset(self):
+		""" Forget all remembered reference levels. """
+		self._levels.clear()
+
+	def _get_levels(self, y, frames, ch):
+		if frames is None:
+			return _levels(y)
+
+		key = (frames, ch)
+
+		if key not in self._levels:
+			self._levels[key] = _levels(y)
+
+			if len(self._levels) > _MEAS_LEVELS_CACHE_SIZE:
+				self._levels.popitem(last=False)
+
+		return self._levels[key]
+
+	def measure(self, data, ch=1, which=None, time=None):
+		""" Measure a frame or a batch of frames.
+
+		:type data: :any:`VoltsData`, list of :any:`VoltsData`, :any:`SegmentedVoltsData` or array
+		:param data: Data to measure. Plain arrays may be one- or two-dimensional, with a row per frame,
+			and require *time*. A batch of frames must all have the same time axis.
+
+		:type ch: int; {1,2}
+		:param ch: Channel to measure.
+
+		:type which: list of string
+		:param which: Names of the measurements to return, or *None* for all of :any:`MEASUREMENTS`.
+
+		:type time: array
+		:param time: Time axis of plain array data, in seconds.
+
+		:rtype: dict
+		:return: Measurement name to value. Values are floats for a single frame or arrays with one entry
+			per frame for a batch, and are NaN where the measurement isn't possible (e.g. frequency of a
+			signal without two rising edges). Times are in seconds, frequency in Hz and duty cycle, overshoot
+			and undershoot in percent.
+		"""
+		if ch not in [1, 2]:
+			raise ValueError("Invalid channel %s" % ch)
+
+		which = MEASUREMENTS if which is None else which
+		unknown = set(which) - set(MEASUREMENTS)
+		if unknown:
+			raise ValueError("Unknown measurements %s" % ', '.join(sorted(unknown)))
+
+		y, t, frames, batch = _samples(data, ch, time)
+		res = _measure(y, t, self._get_levels(y, frames, ch), self.low, self.mid, self.high)
+
+		if batch:
+			return { k: res[k] for k in which }
+		else:
+			return { k: float(res[k][0]) for k in which }
+
+
+def measure(data, ch=1, which=None, time=None, low=0.1, mid=0.5, high=0.9):
+	""" Measure a frame or a batch of frames, without remembering reference levels.
+
+	See :any:`Measurements.measure` for parameters and return value.
+	"""
+	return Measurements(low, mid, high).measure(data, ch, which, time)
@@ -0,0 +1,284 @@
+"""
+Frequency stability analysis of streamed data, as overlapping Allan (ADEV), modified Allan (MDEV)
+and time (TDEV) deviations at octave-spaced averaging times.
+
+Samples are added incrementally, so results are available while a long streaming session is still
+running::
+
+	from pymoku.stability import AllanDeviation
+
+	adev = AllanDeviation(i.get_timestep())
+	i.start_stream_data(duration=86400, ch2=False)
+	while True:
+		ch1, _ = i.get_stream_data(as_array=True)
+		adev.add_phasemeter(ch1)
+		print(adev.result()['adev'])
+
+Memory use doesn't grow with the length of the run. Averaging times up to *resolution* samples use
+every overlapping estimate. Beyond that, the phase is kept at a stride of a power of two, so
+averaging time *m* samples uses estimates starting every *m / resolution* samples. The deviations are
+still unbiased, with slightly wider confidence intervals than the fully overlapping estimators.
+"""
+import math
+
+import numpy as np
+
+# Index of the frequency and phase fields of a Phasemeter record
+_PM_FREQUENCY_FIELD = 1
+_PM_PHASE_FIELD = 3
+
+# Records read from an LI file between updates of the estimators
+_STAB_FILE_CHUNK = 2**16
+
+
+class _Level(object):
+	# Phase at a stride of 2**level samples, with the sum of the phase over each stride, and the
+	# estimator sums for each lag (in strides) measured at this level
+	def __init__(self, lags):
+		self.lags = lags
+		self.history = 3 * max(lags) - 1
+
+		self.x = np.empty(0)
+		self.s = np.empty(0)
+		self.start = 0
+
+		# Index of the next estimate to calculate, and the estimator sums, per lag
+		self.next = dict((q, 0) for q in lags)
+		self.adev = dict((q, 0.0) for q in lags)
+		self.mdev = dict((q, 0.0) for q in lags)
+		self.count = dict((q, 0) for q in lags)
+
+		# Unpaired entry carried over to the next level
+		self.carry = None
+
+	def add(self, x, s):
+		x = np.concatenate([self.x, x])
+		s = np.concatenate([self.s, s])
+
+		# Sums of the phase over windows of q strides, from the cumulative sum of the buffer only so
+		# rounding doesn't grow with the length of the run
+		p = np.concatenate([[0.0], np.cumsum(s)])
+
+		for q in self.lags:
+			j = np.arange(self.next[q] - self.start, len(x) - 3 * q + 1)
+			if not len(j):
+				continue
+
+			a = x[j + 2 * q] - 2 * x[j + q] + x[j]
+			w = p[j + 3 * q] - 3 * p[j + 2 * q] + 3 * p[j + q] - p[j]
+
+			self.adev[q] += np.dot(a, a)
+			self.mdev[q] += np.dot(w, w)
+			self.count[q] += len(j)
+			self.next[q] = self.start + j[-1] + 1
+
+		keep = min(len(x), self.history)
+		self.start += len(x) - keep
+		self.x, self.s = x[len(x) - keep:], s[len(s) - keep:]
+
+	def decimate(self, x, s):
+		# Entries for the next level, at twice the stride
+		if self.carry is not None:
+			x = np.concatenate([[self.carry[0]], x])
+			s = np.concatenate([[self.carry[1]], s])
+
+		n = len(x) // 2 * 2
+		self.carry = (x[n], s[n]) if n < len(x) else None
+
+		return x[:n:2], s[:n:2] + s[1:n:2]
+
+
+class AllanDeviation(object):
+	"""
+	Streaming estimator of the overlapping Allan, modified Allan and time deviations of phase or
+	frequency data.
+
+	Deviations are calculated at averaging times of *m* samples for every power of two *m*, once there
+	are at least 3 *m* samples. The Allan deviation uses the same estimates as the modified Allan
+	deviation, i.e. it omits the last *m* - 1 of the N - 2 *m* overlapping estimates usually included.
+
+	:type tau0: float
+	:param tau0: Time between samples (sec), e.g. from :any:`get_timestep`.
+
+	:type resolution: int
+	:param resolution: Largest averaging time, in samples, calculated from every overlapping estimate.
+		Rounded up to a power of two. Memory use is proportional to this and to the log of the number of
+		samples.
+	"""
+	def __init__(self, tau0, resolution=256):
+		if tau0 <= 0:
+			raise ValueError("Time between samples must be positive")
+		if resolution < 1:
+			raise ValueError("Resolution must be at least one sample")
+
+		self.tau0 = float(tau0)
+		self._octaves = int(math.ceil(math.log(resolution, 2)))
+
+		self.reset()
+
+	def reset(self):
+		""" Discard all data. """
+		self._levels = []
+		self._x = 0.0
+		self._nominal = None
+
+		#: Number of phase samples added
+		self.samples = 0
+
+	def _level(self, i):
+		if i == len(self._levels):
+			# The first level measures every octave up to the resolution, higher levels only the last
+			lags = [2**k for k in range(self._octaves + 1)] if i == 0 else [2**self._octaves]
+			self._levels.append(_Level(lags))
+		return self._levels[i]
+
+	def add_phase(self, x):
+		""" Add phase samples.
+
+		:type x: array of float
+		:param x: Phase as time error (sec). Phase in other units, e.g. radians, gives deviations scaled
+			by the same factor.
+		"""
+		x = np.asarray(x, dtype=float).ravel()
+		if not len(x):
+			return
+
+		self.samples += len(x)
+
+		s, i = x, 0
+		while len(x):
+			level = self._level(i)
+			level.add(x, s)
+			x, s = level.decimate(x, s)
+			i += 1
+
+	def add_frequency(self, y):
+		""" Add frequency samples.
+
+		Frequency is integrated to phase, with an initial phase of zero.
+
+		:type y: array of float
+		:param y: Fractional frequency of each sample.
+		"""
+		y = np.asarray(y, dtype=float).ravel()
+		if not len(y):
+			return
+
+		# The phase at the start of each sample interval, so the first sample adds the initial phase
+		x = self._x + self.tau0 * np.concatenate([[0.0], np.cumsum(y)])
+		self._x = x[-1]
+		self.add_phase(x[1:] if self.samples else x)
+
+	def add_phasemeter(self, records, source='phase', nominal=None):
+		""" Add Phasemeter records, as returned by :any:`get_stream_data` for one channel.
+
+		:type records: list of tuple or 2D array
+		:param records: Phasemeter records.
+
+		:type source: string, {'phase', 'frequency'}
+		:param source: Record field to analyse.
+
+		:type nominal: float
+		:param nominal: Nominal frequency of the signal (Hz), which normalises phase to time error and
+			frequency to fractional frequency. *None* for the first measured frequency.
+		"""
+		if source not in ['phase', 'frequency']:
+			raise ValueError("Invalid source %s" % source)
+
+		records = np.asarray(records, dtype=float)
+		if not len(records):
+			return
+
+		if nominal is not None:
+			self._nominal = float(nominal)
+		elif self._nominal is None:
+			self._nominal = records[0, _PM_FREQUENCY_FIELD]
+
+		if source == 'phase':
+			self.add_phase(records[:, _PM_PHASE_FIELD] / self._nominal)
+		else:
+			self.add_frequency(records[:, _PM_FREQUENCY_FIELD] / self._nominal - 1.0)
+
+	def result(self):
+		""" Get the deviations of the data added so far.
+
+		:rtype: dict
+		:return: *tau*, the averaging times (sec); *adev*, *mdev* and *tdev*, the overlapping Allan,
+			modified Allan and time deviations; and *n*, the number of terms in each estimate, which
+			determines its confidence interval. Each is an array with an entry per averaging time.
+			Deviations without enough data are NaN.
+		"""
+		m, adev, mdev, n = [], [], [], []
+
+		for i, level in enumerate(self._levels):
+			for q in level.lags:
+				m.append(q * 2**i)
+				adev.append(level.adev[q])
+				mdev.append(level.mdev[q])
+				n.append(level.count[q])
+
+		m = np.array(m, dtype=float)
+		n = np.array(n, dtype=int)
+		tau = m * self.tau0
+
+		with np.errstate(divide='ignore', invalid='ignore'):
+			adev = np.sqrt(np.array(adev) / (2 * tau**2 * n))
+			mdev = np.sqrt(np.array(mdev) / (2 * m**2 * tau**2 * n))
+
+		adev[n == 0] = np.nan
+		mdev[n == 0] = np.nan
+
+		return {
+			'tau': tau,
+			'adev': adev,
+			'mdev': mdev,
+			'tdev': tau * mdev / math.sqrt(3),
+			'n': n,
+		}
+
+	@classmethod
+	def from_file(cls, filename, ch=1, source='phase', nominal=None, resolution=256):
+		""" Analyse a Phasemeter LI file, reading it a block at a time.
+
+		:type filename: string
+		:param filename: LI file name.
+
+		:type ch: int; {1,2}
+		:param ch: Channel to analyse.
+
+		:type source: string, {'phase', 'frequency'}
+		:param source: Record field to analyse.
+
+		:type nominal: float
+		:param nominal: Nominal frequency of the signal (Hz), or *None* for the first measured frequency.
+
+		:type resolution: int
+		:param resolution: See :any:`AllanDeviation`.
+
+		:rtype: :any:`AllanDeviation`
+		:return: Estimator holding the file's data.
+		"""
+		from .dataparser import LIDataFileReader
+
+		reader = LIDataFileReader(filename)
+		try:
+			channels = [c for c, en in [(1, reader.ch1), (2, reader.ch2)] if en]
+			if ch not in channels:
+				raise ValueError("Channel %s isn't in the file" % ch)
+			idx = channels.index(ch)
+
+			est = cls(reader.deltat, resolution)
+
+			more = True
+			while more:
+				more = reader._process_chunk()
+				if more and len(reader.records[idx]) < _STAB_FILE_CHUNK:
+					continue
+
+				est.add_phasemeter(reader.records[idx], source, nominal)
+				for r in reader.records:
+					del r[:]
+		finally:
+			reader.close()
+
+		return est
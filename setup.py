@@ -34,6 +34,7 @@ setup(
 		'pyzmq>=15.3.0',
 		'requests>=2.18.0',
 		'decorator',
+		'numpy',
 	],
 
 	zip_safe=False, # Due to bitstream download
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+
+import pytest
+import zmq
+
+from pymoku import FrameTimeout
+from pymoku._frame_instrument import FrameBasedInstrument
+
+class Frame(object):
+	def __init__(self):
+		self._complete = False
+
+	def add_packet(self, d):
+		self.waveformid, self._trigstate, self._stateid = map(int, d.decode().split(','))
+		self._complete = True
+
+class Instrument(FrameBasedInstrument):
+	# Receives frames from an in-process publisher rather than a Moku
+	def __init__(self, addr):
+		super(Instrument, self).__init__()
+		self._set_frame_class(Frame)
+		self._addr = addr
+		self._running = True
+		self._stateid = 1
+
+	def _frame_socket(self, ctx):
+		skt = ctx.socket(zmq.SUB)
+		skt.connect(self._addr)
+		skt.setsockopt_string(zmq.SUBSCRIBE, u'')
+		skt.setsockopt(zmq.LINGER, 0)
+		return skt
+
+@pytest.fixture
+def instrument():
+	addr = 'inproc://frames-%d' % id(object())
+	pub = zmq.Context.instance().socket(zmq.PUB)
+	pub.bind(addr)
+
+	i = Instrument(addr)
+	i._publisher = pub
+	yield i
+
+	i._set_running(False)
+	pub.close(linger=0)
+
+def publish(i, count):
+	for k in range(count):
+		i._publisher.send(('%d,1,1' % k).encode())
+
+def run(coro):
+	loop = asyncio.new_event_loop()
+	try:
+		return loop.run_until_complete(coro)
+	finally:
+		loop.close()
+
+def test_frame(instrument):
+	async def main():
+		task = asyncio.ensure_future(instrument.get_realtime_data_async(timeout=5))
+		while not task.done():
+			publish(instrument, 1)
+			await asyncio.sleep(0.01)
+		return task.result()
+
+	assert run(main())._trigstate == 1
+
+def test_timeout(instrument):
+	with pytest.raises(FrameTimeout):
+		run(instrument.get_realtime_data_async(timeout=0.05))
+
+def test_stopped(instrument):
+	# Stopping the instrument from another thread ends the wait, closing the socket on the loop's thread
+	stop = threading.Thread(target=instrument._set_running, args=(False,))
+
+	async def main():
+		asyncio.get_event_loop().call_later(0.05, stop.start)
+		await instrument.get_realtime_data_async(timeout=5)
+
+	with pytest.raises(FrameTimeout):
+		run(main())
+
+	stop.join()
+	assert instrument._async_frames is None
+
+def test_not_running(instrument):
+	instrument._running = False
+	with pytest.raises(FrameTimeout):
+		run(instrument.get_realtime_data_async(timeout=5))
+
+class Socket(object):
+	def __init__(self):
+		self.closed_by = None
+
+	def close(self):
+		self.closed_by = threading.current_thread()
+
+class Downloader(object):
+	# The buffer download steps of an instrument, with the stream stopped as _stream_stop does
+	def __init__(self):
+		self._dlskt = None
+		self.sockets = []
+
+	def _buffer_check_ready(self):
+		pass
+
+	def _buffer_selection(self, frame, ch1, ch2, window):
+		return (ch1, ch2, 0, None)
+
+	def _buffer_cache_lookup(self, frame, selection):
+		return None
+
+	def _buffer_download_start(self, selection, asynchronous):
+		self._dlskt = Socket()
+		self.sockets.append(self._dlskt)
+		return False
+
+	def _buffer_download_done(self, selection):
+		return True
+
+	def _stream_stop(self):
+		if self._dlskt is not None:
+			self._dlskt.close()
+			self._dlskt = None
+
+	def _buffer_download_finish(self, was_paused):
+		self._stream_stop()
+		return [[], []]
+
+	def _make_buffer(self, frame, channel_data, selection):
+		return channel_data
+
+def test_download_socket(monkeypatch):
+	from pymoku import _async_data
+
+	class Frame(object):
+		synchronised = True
+
+	async def frame(instrument, timeout, wait):
+		return Frame()
+	monkeypatch.setattr(_async_data, 'get_realtime_data', frame)
+
+	i = Downloader()
+	assert run(_async_data.get_data(i, 1.0, True, True, True, None)) == [[], []]
+
+	# Closed on the event loop's thread, not by the executor finishing the download
+	assert i.sockets[0].closed_by is threading.current_thread()
+	assert i._dlskt is None
@@ -0,0 +1,78 @@
+import pytest
+import numpy as np
+
+from pymoku._bodeanalyzer import _find_features
+from pymoku._bodeanalyzer_data import BodeData, AdaptiveBodeData, _BodeChannelData
+
+# Response amplitude in raw IQ counts, scaled back to volts by the front end scale
+COUNTS = 2**20
+
+def make_frame(scales, stateid, freqs, response, waveformid=0):
+	# Synthetic complete sweep with the same complex response on both channels
+	freqs = np.asarray(freqs, dtype=float)
+	iq = np.asarray(response, dtype=complex) * COUNTS / 2
+	bits = np.round(np.column_stack([iq.real, iq.imag])).astype('<i4').ravel()
+
+	scales[stateid] = {
+		'frequency_axis': freqs.tolist(),
+		'gain_correction': np.ones(len(freqs)),
+		'g1': 1.0 / COUNTS, 'g2': 1.0 / COUNTS,
+		'sweep_amplitude_ch1': 1.0, 'sweep_amplitude_ch2': 1.0,
+	}
+
+	frame = BodeData(None, scales)
+	frame._stateid = stateid
+	frame.waveformid = waveformid
+	frame.frequency = scales[stateid]['frequency_axis']
+	frame.ch1_bits = frame.ch2_bits = bits
+	frame.ch1 = frame.ch2 = _BodeChannelData(bits, scales[stateid]['gain_correction'], 1.0 / COUNTS, 1.0)
+	return frame
+
+def test_features_flat():
+	frame = make_frame({}, 1, np.arange(32), np.full(32, 0.5))
+	assert _find_features(frame, 1, 1.0, 5.0, 4) == []
+
+def test_features_peak():
+	resp = np.full(64, 0.1)
+	resp[20] = 1.0
+	resp[45] = 0.5
+
+	frame = make_frame({}, 1, np.arange(64), resp)
+	regions = _find_features(frame, 1, 1.0, 5.0, 4)
+
+	# The larger peak first, each region covering the neighbours of the feature
+	assert regions == [(18, 22), (43, 47)]
+	assert _find_features(frame, 2, 1.0, 5.0, 1) == [(18, 22)]
+
+def test_features_phase():
+	resp = np.full(32, 0.5 + 0j)
+	resp[10:] *= np.exp(1j * np.pi / 2)
+
+	frame = make_frame({}, 1, np.arange(32), resp)
+	assert _find_features(frame, 1, 1.0, 5.0, 4) == [(8, 11)]
+	assert _find_features(frame, 1, 1.0, 1000.0, 4) == []
+
+def test_merge():
+	scales = {}
+	coarse = make_frame(scales, 1, [100, 300, 500, 700], [0.1, 0.2, 0.3, 0.4], waveformid=5)
+	fine = make_frame(scales, 2, [200, 300, 400], [0.15, 0.25, 0.35], waveformid=6)
+
+	data = AdaptiveBodeData(None, scales)
+	data._merge([coarse, fine])
+
+	# In order of frequency without duplicates, the later sweep taking precedence at 300 Hz
+	assert data.frequency == [100, 200, 300, 400, 500, 700]
+	assert data.ch1.magnitude == pytest.approx([0.1, 0.15, 0.25, 0.35, 0.3, 0.4], abs=1e-5)
+	assert data.ch2.magnitude == pytest.approx(data.ch1.magnitude)
+	assert data.measured_points == 6
+	assert data.waveformid == 6
+
+def test_merge_precedence():
+	scales = {}
+	frames = [make_frame(scales, k, [1, 2, 3], np.full(3, 0.1 * (k + 1))) for k in range(3)]
+
+	data = AdaptiveBodeData(None, scales)
+	data._merge(frames)
+
+	assert data.frequency == [1, 2, 3]
+	assert data.ch1.magnitude == pytest.approx([0.3, 0.3, 0.3], abs=1e-5)
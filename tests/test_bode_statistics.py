@@ -0,0 +1,128 @@
+import pytest
+import numpy as np
+
+from pymoku._bodeanalyzer_data import BodeSweepStatistics
+
+class Channel(object):
+	def __init__(self, response):
+		self._response = response
+
+class Frame(object):
+	# A complete sweep, as much of a BodeData as the statistics use
+	def __init__(self, stateid, waveformid, ch1, ch2, amplitude=0.5, trigstate=None):
+		self._stateid = stateid
+		self._trigstate = stateid if trigstate is None else trigstate
+		self.waveformid = waveformid
+		self.frequency = list(range(len(ch1)))
+		self.scales = {stateid: {'sweep_amplitude_ch1': amplitude, 'sweep_amplitude_ch2': amplitude}}
+		self.ch1, self.ch2 = Channel(ch1), Channel(ch2)
+
+def sweeps(n, points=16, seed=0):
+	rng = np.random.RandomState(seed)
+	shape = (n, points)
+	base = np.exp(2j * np.pi * np.linspace(0, 1, points))
+	return [base + 0.1 * (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)) for _ in range(2)]
+
+def check(stats, ch, z):
+	res = stats.get(ch)
+	assert res['response'] == pytest.approx(np.mean(z, axis=0))
+	assert res['variance'] == pytest.approx(np.var(z, axis=0, ddof=1))
+	assert res['magnitude'] == pytest.approx(np.abs(np.mean(z, axis=0)))
+	assert res['phase'] == pytest.approx(np.angle(np.mean(z, axis=0)) / (2 * np.pi))
+	assert res['min'] == pytest.approx(np.abs(z).min(axis=0))
+	assert res['max'] == pytest.approx(np.abs(z).max(axis=0))
+
+def test_statistics():
+	z1, z2 = sweeps(50)
+
+	stats = BodeSweepStatistics()
+	for k in range(50):
+		stats._add(Frame(1, k, z1[k], z2[k]))
+
+	assert stats.count == 50
+	check(stats, 1, z1)
+	check(stats, 2, z2)
+	assert stats.get(1)['magnitude_dB'] == pytest.approx(20 * np.log10(np.abs(np.mean(z1, axis=0)) / 0.5))
+
+def test_first_sweep():
+	z1, z2 = sweeps(1)
+
+	stats = BodeSweepStatistics()
+	stats._add(Frame(1, 0, z1[0], z2[0]))
+	res = stats.get(1)
+
+	# The sweep itself, with no variance estimate from a single sweep
+	assert stats.count == 1
+	assert res['response'] == pytest.approx(z1[0])
+	assert np.all(np.isnan(res['variance']))
+	assert res['min'] == pytest.approx(np.abs(z1[0]))
+	assert res['max'] == pytest.approx(np.abs(z1[0]))
+
+def test_repeated_frames():
+	z1, z2 = sweeps(3)
+
+	# The same sweep in several frames is only added once
+	stats = BodeSweepStatistics()
+	for k in [0, 0, 1, 1, 1, 2]:
+		stats._add(Frame(1, k, z1[k], z2[k]))
+
+	assert stats.count == 3
+	check(stats, 1, z1)
+
+def test_invalid_points():
+	z1, z2 = sweeps(10)
+	z1[3:, 5] = np.nan
+
+	stats = BodeSweepStatistics()
+	for k in range(10):
+		stats._add(Frame(1, k, z1[k], z2[k]))
+
+	res = stats.get(1)
+	assert res['response'][5] == pytest.approx(np.mean(z1[:3, 5]))
+	assert res['variance'][5] == pytest.approx(np.var(z1[:3, 5], ddof=1))
+	assert res['response'][6] == pytest.approx(np.mean(z1[:, 6]))
+
+def test_reset():
+	z1, z2 = sweeps(20)
+
+	stats = BodeSweepStatistics()
+	for k in range(10):
+		stats._add(Frame(1, k, z1[k], z2[k]))
+
+	stats.reset()
+	assert stats.count == 0
+	assert len(stats.get(1)['response']) == 0
+
+	for k in range(10, 20):
+		stats._add(Frame(1, k, z1[k], z2[k]))
+
+	assert stats.count == 10
+	check(stats, 1, z1[10:])
+
+def test_settings_change():
+	z1, z2 = sweeps(20)
+
+	# New instrument settings restart the statistics, even for a reused frame ID
+	stats = BodeSweepStatistics()
+	for k in range(10):
+		stats._add(Frame(1, k, z1[k], z2[k]))
+	for k in range(9, 20):
+		stats._add(Frame(2, k, z1[k], z2[k]))
+
+	assert stats.count == 11
+	check(stats, 2, z2[9:])
+
+def test_previous_state():
+	z1, z2 = sweeps(20)
+
+	# Sweeps captured under the previous settings aren't included after the settings change
+	stats = BodeSweepStatistics()
+	for k in range(10):
+		stats._add(Frame(1, k, z1[k], z2[k]))
+	for k in range(10, 13):
+		stats._add(Frame(2, k, z1[k], z2[k], trigstate=1))
+	for k in range(13, 20):
+		stats._add(Frame(2, k, z1[k], z2[k]))
+
+	assert stats.count == 7
+	check(stats, 1, z1[13:])
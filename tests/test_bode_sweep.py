@@ -0,0 +1,133 @@
+import pytest
+import numpy as np
+
+from pymoku import FrameTimeout
+from pymoku.instruments import BodeAnalyzer
+from pymoku._bodeanalyzer_data import BodeData
+
+INVALID = -0x80000000
+
+@pytest.fixture
+def bode():
+	i = BodeAnalyzer()
+	i.framerate = 10
+	return i
+
+def sweep(i, f_start, f_end, points, log, averaging_time, settling_time, averaging_cycles, settling_cycles):
+	# The sweep registers as set_sweep would, without the sweep point count restrictions
+	i.sweep_freq_min = f_start
+	i.sweep_length = points
+	i.log_en = log
+	i.sweep_freq_delta = i._calculate_sweep_delta(f_start, f_end, points, log)
+	i.averaging_time, i.settling_time = averaging_time, settling_time
+	i.averaging_cycles, i.settling_cycles = averaging_cycles, settling_cycles
+
+def test_estimate_linear(bode):
+	# 1, 2, 3 and 4kHz. Averaging for 2, 3, 5 and 6 whole cycles to cover 1.5ms, settling for the 10 cycle
+	# minimum, which is longer than 1ms at every frequency
+	sweep(bode, 1e3, 4e3, 4, False, 1.5e-3, 1e-3, 1, 10)
+
+	average = 2 / 1e3 + 3 / 2e3 + 5 / 3e3 + 6 / 4e3
+	settle = 10 / 1e3 + 10 / 2e3 + 10 / 3e3 + 10 / 4e3
+
+	assert bode.estimate_sweep_time() == pytest.approx(average + settle + 1.0 / bode.framerate)
+
+def test_estimate_log(bode):
+	# 100, 200, 400 and 800Hz. Settling for 2, 3, 5 and 10 whole cycles to cover 12ms, averaging for
+	# one cycle, which is longer than 1ms at every frequency
+	sweep(bode, 100, 800, 4, True, 1e-3, 12e-3, 1, 1)
+
+	settle = 2 / 100. + 3 / 200. + 5 / 400. + 10 / 800.
+	average = 1 / 100. + 1 / 200. + 1 / 400. + 1 / 800.
+
+	assert bode.estimate_sweep_time() == pytest.approx(settle + average + 1.0 / bode.framerate)
+
+def test_estimate_framerate(bode):
+	sweep(bode, 1e3, 4e3, 4, False, 1e-3, 1e-3, 1, 1)
+	fast, delay = bode.estimate_sweep_time(), 1.0 / bode.framerate
+
+	# Including the wait for the next frame, at the framerate the register can represent
+	bode.framerate = 2
+	assert bode.estimate_sweep_time() == pytest.approx(fast - delay + 1.0 / bode.framerate)
+	assert 1.0 / bode.framerate > delay
+
+class Frame(object):
+	def __init__(self, measured, length=128):
+		self.measured_points = measured
+		self.frequency = list(range(length))
+
+def follow(bode, progress):
+	frames = iter([Frame(n) for n in progress])
+	bode.get_realtime_data = lambda timeout=None, wait=True: next(frames)
+	return [(first, end) for _, first, end in bode.iter_sweep_data()]
+
+def test_iter_progress(bode):
+	# Repeated frames without new points aren't yielded, and the frames after completion aren't read
+	assert follow(bode, [10, 50, 50, 128, 128]) == [(0, 10), (10, 50), (50, 128)]
+
+def test_iter_fullframe(bode):
+	assert follow(bode, [128]) == [(0, 128)]
+
+def test_iter_restart(bode):
+	# A new sweep started before the previous one was seen to complete is followed from its start
+	assert follow(bode, [0, 40, 12, 128]) == [(0, 40), (0, 12), (12, 128)]
+
+def test_iter_timeout(bode):
+	def timeout(timeout=None, wait=True):
+		raise FrameTimeout()
+	bode.get_realtime_data = timeout
+
+	with pytest.raises(FrameTimeout):
+		next(bode.iter_sweep_data(timeout=1.0))
+
+def raw_frame(bode, valid, waveformid=1):
+	# A frame of the current sweep, from the instrument, with the points where *valid* is false invalid
+	bode._adc_gains = lambda: (1.0, 1.0)
+	bode.scales[bode._stateid] = bode._calculate_scales()
+
+	bits = np.full((len(valid), 2), 1000, dtype='<i4')
+	bits[~np.asarray(valid)] = INVALID
+
+	frame = BodeData(bode, bode.scales)
+	frame._stateid = frame._trigstate = bode._stateid
+	frame.waveformid = waveformid
+	frame._raw1 = frame._raw2 = bits.tobytes()
+	frame.process_complete()
+	return frame
+
+@pytest.mark.parametrize('valid, measured', [
+	([1] * 8, 8),
+	([1] * 3 + [0] + [1] * 4, 8),
+	([1] * 5 + [0] * 3, 5),
+	([1, 0, 1, 1, 1, 0, 0, 0], 5),
+	([0] * 8, 0)])
+def test_measured_points(bode, valid, measured):
+	# Progress is up to the last measured point, including any invalid points in the sweep so far
+	sweep(bode, 100, 800, 8, False, 1e-3, 1e-3, 1, 1)
+	frame = raw_frame(bode, np.array(valid, dtype=bool))
+
+	assert len(frame.frequency) == 8
+	assert frame.measured_points == measured
+
+def test_invalid_point_completes(bode):
+	sweep(bode, 100, 800, 8, False, 1e-3, 1e-3, 1, 1)
+	bode.commit = lambda: None
+
+	valid = np.ones(8, dtype=bool)
+	valid[2] = False
+	partial = valid.copy()
+	partial[5:] = False
+
+	def frames():
+		return iter([raw_frame(bode, partial, 1), raw_frame(bode, valid, 1), raw_frame(bode, valid, 1)])
+
+	# A finished sweep with an invalid point is complete
+	it = frames()
+	bode.get_realtime_data = lambda timeout=None, wait=True: next(it)
+	assert [(first, end) for _, first, end in bode.iter_sweep_data()] == [(0, 5), (5, 8)]
+
+	it = frames()
+	bode.get_realtime_data = lambda timeout=None, wait=True: next(it)
+	frame = bode._single_sweep(100, 800, 8, False, None)
+	assert frame.measured_points == 8
+	assert frame.ch1.magnitude[2] is None
@@ -135,7 +135,9 @@ roundtrip_binfile_data = [
 ]
 
 @pytest.mark.parametrize("instr,instrv,chs,binstr,procstr,fmtstr,hdrstr,calcoeffs,timestep,starttime,din,dout,csv,supposedtobeborked", roundtrip_binfile_data)
-def test_binfile_v1_roundtrip(instr, instrv, chs, binstr, procstr, fmtstr, hdrstr, calcoeffs, timestep, starttime, din, dout, csv, supposedtobeborked):
+def test_binfile_v1_roundtrip(instr, instrv, chs, binstr, procstr, fmtstr, hdrstr, calcoeffs, timestep, starttime, din, dout, csv, supposedtobeborked, tmpdir, monkeypatch):
+	# Data files are written to the working directory
+	monkeypatch.chdir(tmpdir)
 
 	nch = 1 if chs in [1,2] else 2
 
@@ -180,7 +182,9 @@ def test_binfile_v1_roundtrip(instr, instrv, chs, binstr, procstr, fmtstr, hdrst
 # TODO: Two-channel tests
 
 @pytest.mark.parametrize("instr,instrv,chs,binstr,procstr,fmtstr,hdrstr,calcoeffs,timestep,starttime,din,dout,csv,supposedtobeborked", roundtrip_binfile_data)
-def test_binfile_v2_roundtrip(instr, instrv, chs, binstr, procstr, fmtstr, hdrstr, calcoeffs, timestep, starttime, din, dout, csv, supposedtobeborked):
+def test_binfile_v2_roundtrip(instr, instrv, chs, binstr, procstr, fmtstr, hdrstr, calcoeffs, timestep, starttime, din, dout, csv, supposedtobeborked, tmpdir, monkeypatch):
+	# Data files are written to the working directory
+	monkeypatch.chdir(tmpdir)
 
 	nch = 1 if chs in [1,2] else 2
 	procstr = [procstr] * nch
@@ -252,5 +256,37 @@ def test_stream_csv(nch, binstr, procstr, fmtstr, hdrstr, calcoeffs, timestep, s
 
 	os.remove("test.csv")
 
+array_data = [
+	("<s32", "", [b"\x00\x00\x00\x00\xFF\xFF\xFF\xFF"], [0, -1]), # Simple signed unpack
+	("<u16", "*2", [b"\x01\x00\xFF\xFF"], [2, 0x1FFFE]), # Unsigned, scaled
+	("<s32", "*C+1", [b"\x02\x00", b"\x00\x00\x04\x00\x00\x00"], [2, 3]), # Split record, calibration coefficient
+]
+
+@pytest.mark.parametrize("binstr,procstr,din,expected", array_data)
+def test_array_parser(binstr, procstr, din, expected):
+	parser = ArrayDataParser(True, False, binstr, [procstr, ""], [0.5], capacity=1)
+
+	idx = 0
+	for d in din:
+		parser.parse(d, 0, start_idx=idx)
+		idx += len(d)
+
+	assert parser.processed[0].tolist() == expected
+
+	parser.clear_processed(1)
+	assert parser.processed[0].tolist() == expected[1:]
+
+def test_array_parser_data_loss():
+	parser = ArrayDataParser(True, True, "<s32", ["", ""], [1, 1])
+	parser.parse(b"\x00\x00\x00\x00", 1, start_idx=0)
+
+	with pytest.raises(DataIntegrityException):
+		parser.parse(b"\x00\x00\x00\x00", 1, start_idx=8)
+
+@pytest.mark.parametrize("binstr,procstr", [("<u32:s32", ""), ("<p8,0xFF:s32", ""), ("<u24", ""), ("<s32", "s")])
+def test_array_parser_unsupported(binstr, procstr):
+	with pytest.raises(InvalidFormatException):
+		ArrayDataParser(True, False, binstr, [procstr], [1])
+
 if __name__ == '__main__':
 	pytest.main()
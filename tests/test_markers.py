@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+
+from pymoku.markers import *
+
+f = np.arange(2001) * 1e3
+
+def tone(freq, amp, width=5e3):
+	# Gaussian line in dBm, which is a parabola on a log scale
+	return amp - 10 * ((f - freq) / width) ** 2
+
+def spectrum(*tones):
+	return np.maximum.reduce([tone(*t) for t in tones] + [np.full(len(f), -100.0)])
+
+def test_peaks():
+	s = spectrum((100.3e3, -10), (500.6e3, -20), (1.2e6, -30))
+	p = peaks(s, n=2, frequency=f)
+
+	assert [x[0] for x in p] == pytest.approx([100.3e3, 500.6e3])
+	assert [x[1] for x in p] == pytest.approx([-10, -20])
+
+def test_peaks_linear():
+	s = 10 ** (spectrum((100.3e3, -10)) / 20)
+	(pf, pa), = peaks(s, frequency=f, dbm=False)
+
+	assert pf == pytest.approx(100.3e3)
+	assert pa == pytest.approx(10 ** (-10 / 20.0))
+
+def test_separation():
+	s = spectrum((100e3, -10), (104e3, -12), (300e3, -30))
+	p = peaks(s, n=2, separation=10e3, frequency=f)
+
+	assert [x[0] for x in p] == pytest.approx([100e3, 300e3])
+
+def test_bandwidth():
+	w, lo, hi = bandwidth(spectrum((1e6, -10)), n_db=10, frequency=f)
+
+	assert lo == pytest.approx(995e3, abs=100)
+	assert hi == pytest.approx(1005e3, abs=100)
+	assert w == pytest.approx(10e3, abs=200)
+
+def test_noise_floor():
+	assert noise_floor(spectrum((1e6, -10)), frequency=f) == -100
+
+def test_harmonics():
+	s = spectrum((100e3, 0), (200e3, -20), (300e3, -40), (2.5e6, -20))
+	r = harmonics(s, n=5, frequency=f)
+
+	assert r['fundamental'][0] == pytest.approx(100e3)
+	assert [h[1] for h in r['harmonics']] == pytest.approx([-20, -40, -100, -100], abs=1e-6)
+	assert r['thd_db'] == pytest.approx(10 * np.log10(1e-2 + 1e-4 + 2e-10), abs=1e-6)
@@ -0,0 +1,106 @@
+import pytest
+import numpy as np
+
+from pymoku.masks import MaskTest
+
+class Volts(object):
+	def __init__(self, time, ch1, ch2=None):
+		self.time = list(time)
+		self.ch1 = list(ch1)
+		self.ch2 = list(ch2) if ch2 is not None else [None] * len(self.time)
+
+class Spectrum(object):
+	def __init__(self, frequency, ch1):
+		self.frequency = list(frequency)
+		self.ch1 = list(ch1)
+		self.ch2 = [None] * len(self.frequency)
+
+def test_pass_fail():
+	mask = MaskTest(upper=[(0, 1.0), (10, 1.0)], lower=[(0, -1.0), (10, -1.0)], capture=2)
+	t = np.arange(11)
+
+	assert mask.test(Volts(t, np.zeros(11)))
+	assert not mask.test(Volts(t, [0] * 5 + [1.5] + [0] * 5))
+	assert not mask.test(Volts(t, [-2.0] * 3 + [0] * 8))
+
+	# On the limit is within the mask
+	assert mask.test(Volts(t, [1.0, -1.0] * 5 + [1.0]))
+
+	assert (mask.tested, mask.passed, mask.failed, mask.violations) == (4, 2, 2, 4)
+	assert len(mask.failures) == 2
+
+	mask.reset()
+	assert (mask.tested, mask.passed, mask.failed, mask.violations) == (0, 0, 0, 0)
+	assert len(mask.failures) == 0
+
+def test_capture():
+	mask = MaskTest(upper=[(0, 0), (10, 0)], capture=2)
+	frames = [Volts(range(11), np.full(11, k + 1.0)) for k in range(3)]
+	for f in frames:
+		mask.test(f)
+
+	# Only the most recent failures are kept
+	assert list(mask.failures) == frames[1:]
+
+def test_interpolation():
+	# Upper limit rising from 0 to 10 over 0 to 100Hz
+	mask = MaskTest(upper=[(0, 0.0), (100, 10.0)])
+	f = np.array([0, 25, 50, 75, 100])
+
+	assert mask.violations_of(Spectrum(f, [0.0, 2.5, 5.0, 7.5, 10.0])).tolist() == [False] * 5
+	assert mask.violations_of(Spectrum(f, [0.0, 2.6, 4.9, 7.6, 10.0])).tolist() == [False, True, False, True, False]
+
+def test_step():
+	# At the step, the limit is the value after it
+	mask = MaskTest(upper=[(0, -20.0), (50, -20.0), (50, -50.0), (100, -50.0)])
+	f = [0, 49, 50, 51, 100]
+
+	assert mask.violations_of(Spectrum(f, [-30, -30, -60, -60, -60])).tolist() == [False] * 5
+	assert mask.violations_of(Spectrum(f, [-30, -30, -30, -60, -60])).tolist() == [False, False, True, False, False]
+
+def test_ends():
+	# Points outside the limit line's range aren't tested, its end points are
+	mask = MaskTest(upper=[(10, 0.0), (20, 0.0)], lower=[(0, -1.0), (30, -1.0)])
+	t = [0, 5, 10, 15, 20, 25, 30, 35]
+
+	assert mask.violations_of(Volts(t, [0.5, 0.5, 0.5, 0.0, 0.5, 0.5, -0.5, -5.0])).tolist() == \
+		[False, False, True, False, True, False, False, False]
+	assert mask.violations_of(Volts(t, [-2.0] * 8)).tolist() == [True] * 7 + [False]
+
+def test_invalid_samples():
+	mask = MaskTest(upper=[(0, 0.0), (10, 0.0)])
+	assert mask.test(Volts(range(4), [None, -1.0, None, -1.0]))
+	assert not mask.test(Volts(range(4), [None, 1.0, None, -1.0]))
+
+def test_channel():
+	mask = MaskTest(upper=[(0, 0.0), (10, 0.0)], ch=2)
+	assert mask.test(Volts(range(4), [1.0] * 4, [-1.0] * 4))
+	assert not mask.test(Volts(range(4), [-1.0] * 4, [1.0] * 4))
+
+def test_axis_change():
+	# The limits follow the frame axis as it changes
+	mask = MaskTest(upper=[(0, 0.0), (100, 10.0)])
+	y = [5.0] * 3
+
+	assert mask.violations_of(Spectrum([0, 50, 100], y)).tolist() == [True, False, False]
+	assert mask.violations_of(Spectrum([0, 20, 60], y)).tolist() == [True, True, False]
+	assert mask.violations_of(Spectrum([60, 80, 100], y)).tolist() == [False, False, False]
+
+	# Including to an axis with the same length and end points
+	assert mask.violations_of(Spectrum([0, 40, 100], y)).tolist() == [True, True, False]
+
+@pytest.mark.parametrize('kwargs', [
+	{},
+	{'upper': [(0, 1)]},
+	{'upper': [(10, 1), (0, 1)]},
+	{'upper': [(0, 1, 2), (10, 1, 2)]},
+	{'upper': [(0, 1), (10, 1)], 'ch': 3},
+])
+def test_invalid_mask(kwargs):
+	with pytest.raises(ValueError):
+		MaskTest(**kwargs)
+
+def test_length_mismatch():
+	mask = MaskTest(upper=[(0, 0.0), (10, 0.0)])
+	with pytest.raises(ValueError):
+		mask.test(Volts(range(4), [0.0] * 3))
@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+
+from pymoku.measurements import *
+
+def square(t, freq, duty, edge):
+	# Trapezoidal wave between 0 and 1 with linear edges of the given length
+	ph = (t * freq) % 1 / freq
+	return np.clip(ph / edge, 0, 1) - np.clip((ph - duty / freq) / edge, 0, 1)
+
+t = np.arange(10000) * 1e-6
+
+@pytest.mark.parametrize("freq,duty,edge", [(1e3, 0.3, 10e-6), (2.5e3, 0.5, 20e-6), (500, 0.75, 50e-6)])
+def test_square(freq, duty, edge):
+	r = measure(square(t, freq, duty, edge), time=t)
+
+	assert r['frequency'] == pytest.approx(freq, rel=1e-3)
+	assert r['duty'] == pytest.approx(duty * 100, rel=1e-3)
+	assert r['rise_time'] == pytest.approx(0.8 * edge, rel=1e-3)
+	assert r['fall_time'] == pytest.approx(0.8 * edge, rel=1e-3)
+	assert r['vpp'] == pytest.approx(1)
+	assert r['overshoot'] == pytest.approx(0)
+
+def test_batch():
+	y = np.vstack([np.sin(2 * np.pi * 1e3 * t), 2 * np.sin(2 * np.pi * 2e3 * t)])
+	r = measure(y, time=t, which=['frequency', 'vpp'])
+
+	assert sorted(r.keys()) == ['frequency', 'vpp']
+	assert r['frequency'] == pytest.approx([1e3, 2e3], rel=1e-6)
+	assert r['vpp'] == pytest.approx([2, 4], rel=1e-3)
+
+def test_no_edges():
+	r = measure(np.ones(100), time=t[:100])
+
+	assert r['mean'] == 1
+	assert np.isnan(r['frequency'])
+	assert np.isnan(r['rise_time'])
+
+class Frame(object):
+	def __init__(self, ch1, waveformid, stateid=1):
+		self.ch1, self.ch2, self.time = ch1, [], t
+		self._stateid, self.waveformid = stateid, waveformid
+
+def test_cached_levels():
+	meas = Measurements()
+	y = square(t, 1e3, 0.5, 10e-6)
+	frame = Frame(y, 1)
+	meas.measure(frame)
+
+	# Levels are kept for the frame, even if its data is modified afterwards
+	frame.ch1 = y / 2
+	assert np.isnan(meas.measure(frame)['frequency'])
+
+	meas.reset()
+	assert meas.measure(frame)['frequency'] == pytest.approx(1e3, rel=1e-3)
+
+def test_amplitude_change():
+	meas = Measurements()
+	y = square(t, 1e3, 0.5, 10e-6)
+	assert meas.measure(Frame(y, 1))['vpp'] == pytest.approx(1)
+
+	# A later frame with the same instrument state but a smaller signal gets its own levels
+	r = meas.measure(Frame(y / 2, 2))
+	assert r['frequency'] == pytest.approx(1e3, rel=1e-3)
+	assert r['top'] == pytest.approx(0.5)
+	assert r['rise_time'] == pytest.approx(8e-6, rel=1e-3)
+
+	r = meas.measure([Frame(y, 3), Frame(y / 4, 4)])
+	assert r['top'] == pytest.approx([1, 0.25])
+	assert r['frequency'] == pytest.approx([1e3, 1e3], rel=1e-3)
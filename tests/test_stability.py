@@ -0,0 +1,72 @@
+import pytest
+import numpy as np
+
+from pymoku.stability import AllanDeviation
+
+def reference(x, m, tau0):
+	# Direct overlapping ADEV and MDEV over the same N - 3m + 1 estimates as the streaming estimator
+	tau = m * tau0
+	n = len(x) - 3 * m + 1
+
+	d = (x[2 * m:] - 2 * x[m:-m] + x[:-2 * m])[:n]
+	c = np.concatenate([[0], np.cumsum(x)])
+	w = c[3 * m:3 * m + n] - 3 * c[2 * m:2 * m + n] + 3 * c[m:m + n] - c[:n]
+
+	return np.sqrt(np.sum(d**2) / (2 * tau**2 * n)), np.sqrt(np.sum(w**2) / (2 * m**2 * tau**2 * n))
+
+def test_overlapping():
+	x = np.cumsum(np.random.RandomState(0).standard_normal(3000)) * 1e-9
+
+	dev = AllanDeviation(1e-3, resolution=1024)
+	for chunk in np.array_split(x, 17):
+		dev.add_phase(chunk)
+
+	res = dev.result()
+	assert dev.samples == len(x)
+	assert res['tau'][:3].tolist() == pytest.approx([1e-3, 2e-3, 4e-3])
+
+	for tau, adev, mdev, tdev, n in zip(res['tau'], res['adev'], res['mdev'], res['tdev'], res['n']):
+		m = int(round(tau / 1e-3))
+		if 3 * m > len(x):
+			assert n == 0 and np.isnan(adev)
+			continue
+
+		assert n == len(x) - 3 * m + 1
+		assert (adev, mdev) == pytest.approx(reference(x, m, 1e-3))
+		assert tdev == pytest.approx(tau * mdev / np.sqrt(3))
+
+def test_strided():
+	# White phase noise, ADEV falling as 1/tau, measured beyond the resolution
+	x = np.random.RandomState(1).standard_normal(2**16)
+
+	dev = AllanDeviation(1.0, resolution=8)
+	dev.add_phase(x)
+	res = dev.result()
+
+	ok = res['n'] > 1000
+	assert res['tau'][ok].max() > 8
+	assert res['adev'][ok] * res['tau'][ok] == pytest.approx(np.sqrt(3), rel=0.1)
+
+def test_frequency():
+	y = np.random.RandomState(2).standard_normal(1000)
+
+	freq = AllanDeviation(0.1, 64)
+	for chunk in np.array_split(y, 7):
+		freq.add_frequency(chunk)
+
+	phase = AllanDeviation(0.1, 64)
+	phase.add_phase(np.concatenate([[0], np.cumsum(y) * 0.1]))
+
+	assert np.allclose(freq.result()['adev'], phase.result()['adev'], equal_nan=True)
+
+def test_phasemeter():
+	x = np.random.RandomState(3).standard_normal(500)
+	records = [(10e6, 10e6 + 1, 0, p, 0.1, 0.0) for p in x]
+
+	dev = AllanDeviation(1e-3)
+	dev.add_phasemeter(records, nominal=10e6)
+
+	ref = AllanDeviation(1e-3)
+	ref.add_phase(x / 10e6)
+
+	assert np.allclose(dev.result()['mdev'], ref.result()['mdev'], equal_nan=True)
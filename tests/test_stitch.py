@@ -0,0 +1,105 @@
+import pytest
+import numpy as np
+
+from pymoku import InvalidConfigurationException
+from pymoku.instruments import SpectrumAnalyzer
+from pymoku import _specan
+
+# Widest span at which the automatic RBW resolves 1kHz: 1kHz * 1023 screen steps / 5
+MAX_SPAN = 204600.0
+
+@pytest.fixture
+def specan():
+	i = SpectrumAnalyzer()
+	i.window = 0
+	i.framerate = 10
+	return i
+
+@pytest.mark.parametrize('overlap, n, step', [(0.0, 5, 200e3), (0.1, 6, 1e6 / 5.5 * 0.9), (0.5, 9, 100e3)])
+def test_segments(specan, overlap, n, step):
+	plan = specan.plan_stitched_sweep(1e6, 2e6, 1e3, overlap)
+	seg = np.array(plan['segments'])
+
+	# The fewest segments no wider than the span that resolves the RBW, evenly spaced
+	assert len(seg) == n
+	assert np.all(seg[:, 1] - seg[:, 0] <= MAX_SPAN)
+	assert seg[:, 0] == pytest.approx(1e6 + step * np.arange(n))
+
+	# Each overlapping the next by the requested fraction, together covering exactly the range
+	span = seg[0, 1] - seg[0, 0]
+	assert seg[:-1, 1] - seg[1:, 0] == pytest.approx(np.full(n - 1, overlap * span))
+	assert (seg[0, 0], seg[-1, 1]) == pytest.approx((1e6, 2e6))
+
+def test_coverage(specan):
+	plan = specan.plan_stitched_sweep(0, 10e6, 1e3)
+	seg = np.array(plan['segments'])
+
+	assert plan['rbw'] == 1e3
+	assert np.all(seg[:, 1] - seg[:, 0] <= MAX_SPAN)
+	assert np.all(seg[1:, 0] < seg[:-1, 1])
+	assert (seg[0, 0], seg[-1, 1]) == (0, 10e6)
+
+	# One segment fewer couldn't cover the range at this overlap
+	assert (len(seg) - 1) * MAX_SPAN * 0.9 + MAX_SPAN * 0.1 < 10e6
+
+	assert plan['sweep_time'] > 0
+
+def test_single_segment(specan):
+	plan = specan.plan_stitched_sweep(0, 1e3, 1e3)
+	assert plan['segments'] == [(0, 1e3)]
+	assert plan['rbw'] == 1e3
+
+def test_rbw_clamped(specan):
+	# Finer than the FFT bins of the segment span can resolve
+	plan = specan.plan_stitched_sweep(1e6, 1.5e6, 1.0)
+	seg = np.array(plan['segments'])
+
+	assert plan['rbw'] > 1.0
+	assert np.all(seg[:, 1] - seg[:, 0] <= 1.0 * 1023 / 5)
+	assert (seg[0, 0], seg[-1, 1]) == pytest.approx((1e6, 1.5e6))
+
+def test_invalid(specan):
+	with pytest.raises(InvalidConfigurationException):
+		specan.plan_stitched_sweep(2e6, 1e6, 1e3)
+
+def test_stitch(specan, monkeypatch):
+	events = []
+	def commit():
+		events.append(('commit', specan.f1, specan.f2))
+
+	class Frame(object):
+		pass
+
+	def get(timeout=None, wait=True):
+		f = Frame()
+		f.frequency = np.linspace(specan.f1, specan.f2, 101)
+		f.ch1 = f.frequency / 1e6
+		f.ch2 = [None] * 101
+		f.dbm, f.waveformid = False, len(events)
+		events.append(('frame', specan.f1, specan.f2))
+		return f
+
+	stitch = _specan._stitch_segment
+	def stitch_segment(frame, lo, hi):
+		events.append(('stitch', frame.waveformid))
+		return stitch(frame, lo, hi)
+
+	specan.commit = commit
+	specan.get_realtime_data = get
+	monkeypatch.setattr(_specan, '_stitch_segment', stitch_segment)
+	specan.f1, specan.f2 = 0, 250e6
+
+	data = specan.get_stitched_data(1e6, 1.5e6, 1e3, 0.2)
+	seg = data.segments
+
+	# Each segment is committed as soon as the previous one's frame arrives, before it's stitched, then
+	# the span restored
+	kinds = [e[0] for e in events]
+	assert kinds == ['commit'] + ['frame', 'commit', 'stitch'] * (len(seg) - 1) + ['frame', 'stitch', 'commit']
+	assert [e[1:] for e in events if e[0] == 'frame'] == seg
+	assert events[-1][1:] == (0, 250e6)
+
+	f = np.array(data.frequency)
+	assert np.all(np.diff(f) > 0)
+	assert (f[0], f[-1]) == (1e6, 1.5e6)
+	assert data.ch1 == pytest.approx(f / 1e6)
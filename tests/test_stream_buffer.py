@@ -0,0 +1,184 @@
+import os
+import pytest
+import numpy as np
+
+from pymoku import StreamException, ValueOutOfRangeException
+from pymoku import dataparser
+from pymoku._stream_buffer import _SampleRing
+from pymoku._stream_instrument import StreamBasedInstrument
+
+def two_channel_stream(capacity, overflow):
+	i = StreamBasedInstrument()
+	i.ch1, i.ch2, i.nch = True, True, 2
+	i._strparser = dataparser.LIDataParser(True, True, '<s32', ['', ''], '', '', 1.0, 0, [1.0, 1.0], 0)
+	i.set_stream_buffer(capacity, overflow)
+	i._stream_samples_reset()
+	return i
+
+def feed(i, ch, start, stop):
+	i._strparser.parse(np.arange(start, stop, dtype='<i4').tobytes(), ch)
+	i._stream_buffer_samples()
+
+def test_wrap():
+	r = _SampleRing(4)
+	r.push([1, 2, 3])
+	assert r.pop(2).tolist() == [1, 2]
+
+	r.push([4, 5, 6])
+	assert len(r) == 4
+	assert r.pop().tolist() == [3, 4, 5, 6]
+	assert len(r) == 0
+
+def test_records():
+	r = _SampleRing(2)
+	r.push([(1, 2), (3, 4), (5, 6)])
+
+	assert r.pop(2).tolist() == [[1, 2], [3, 4]]
+	assert r.pop().tolist() == [[5, 6]]
+
+@pytest.mark.parametrize("overflow,expected,dropped", [
+	('grow', [1, 2, 3, 4, 5, 6], 0),
+	('drop_oldest', [3, 4, 5, 6], 2),
+	('drop_newest', [1, 2, 3, 4], 2)])
+def test_overflow(overflow, expected, dropped):
+	r = _SampleRing(4, overflow)
+	r.push([1, 2, 3])
+	r.push([4, 5, 6])
+
+	assert r.pop().tolist() == expected
+	assert r.dropped == dropped
+
+def test_overflow_large():
+	r = _SampleRing(4, 'drop_oldest')
+	r.push([1, 2])
+	r.push(range(3, 10))
+
+	assert r.pop().tolist() == [6, 7, 8, 9]
+	assert r.dropped == 5
+
+def test_overflow_error():
+	r = _SampleRing(2, 'error')
+	r.push([1, 2])
+
+	with pytest.raises(StreamException):
+		r.push([3])
+
+def test_spill(tmpdir):
+	r = _SampleRing(4, 'spill', str(tmpdir))
+	r.push([1, 2, 3])
+	r.push([4, 5, 6])
+	r.push([7, 8])
+
+	assert len(r) == 8
+	assert r.spilled == 4
+	assert r.pop(2).tolist() == [1, 2]
+
+	# Reading frees space in memory, so later samples still queue behind those on disk
+	r.push([9])
+	assert r.pop(5).tolist() == [3, 4, 5, 6, 7]
+	assert r.pop().tolist() == [8, 9]
+	assert r.dropped == 0
+
+	r.close()
+
+def test_spill_records(tmpdir):
+	r = _SampleRing(2, 'spill', str(tmpdir))
+	r.push([(i, -i) for i in range(100)])
+
+	assert r.pop(3).tolist() == [[0, 0], [1, -1], [2, -2]]
+	assert r.pop()[:, 0].tolist() == list(range(3, 100))
+	assert len(r) == 0
+
+	r.close()
+
+@pytest.mark.parametrize("overflow", ['drop_oldest', 'drop_newest', 'spill'])
+def test_channels_aligned(overflow, tmpdir):
+	i = two_channel_stream(10, overflow)
+	i._samples_spill_dir = str(tmpdir)
+	i._stream_samples_reset()
+
+	# Channel 1 runs well ahead of channel 2, past the capacity of the buffer
+	feed(i, 0, 0, 16)
+	feed(i, 1, 0, 4)
+	ch1, ch2 = i._stream_pop_samples(as_array=True)
+	assert ch1.tolist() == ch2.tolist()
+
+	feed(i, 0, 16, 20)
+	feed(i, 1, 4, 20)
+	more1, more2 = i._stream_pop_samples(as_array=True)
+	assert more1.tolist() == more2.tolist()
+
+	stats = i.get_stream_buffer_stats()
+	assert stats['dropped'][0] == stats['dropped'][1]
+	assert len(ch1) + len(more1) + stats['dropped'][0] == 20
+
+def test_spill_bounded(tmpdir):
+	# A consumer that stays a few blocks behind must not grow the spill file with the total streamed
+	r = _SampleRing(8, 'spill', str(tmpdir))
+	expected = 0
+
+	for k in range(2000):
+		r.push(np.arange(10 * k, 10 * k + 10))
+		if k >= 5:
+			out = r.pop(10)
+			assert out.tolist() == list(range(expected, expected + 10))
+			expected += 10
+
+	assert r.spilled > 10000
+	assert os.fstat(r._spill._file.fileno()).st_size <= 4 * 60 * 8
+
+	r.close()
+
+@pytest.mark.parametrize("overflow", ['drop_oldest', 'drop_newest', 'error'])
+def test_get_more_than_capacity(overflow):
+	i = two_channel_stream(9, overflow)
+	i._stream_net_is_running = lambda: True
+	i._no_data = False
+
+	sent = [0]
+	def receive(timeout):
+		feed(i, 0, sent[0], sent[0] + 3)
+		feed(i, 1, sent[0], sent[0] + 3)
+		sent[0] += 3
+	i._stream_receive_samples = receive
+
+	# A bounded buffer can't hold enough samples to return this many
+	with pytest.raises(ValueOutOfRangeException):
+		i.get_stream_data(10)
+
+	# Filling the buffer exactly is enough
+	ch1, ch2 = i.get_stream_data(9)
+	assert ch1 == ch2 == list(range(9))
+	assert sent[0] == 9
+	assert i.get_stream_buffer_stats()['dropped'] == [0, 0]
+
+def test_get_more_than_capacity_grow():
+	i = two_channel_stream(10, 'grow')
+	i._stream_net_is_running = lambda: True
+	i._no_data = False
+	i._stream_receive_samples = lambda timeout: (feed(i, 0, 0, 30), feed(i, 1, 0, 30))
+
+	ch1, ch2 = i.get_stream_data(25)
+	assert ch1 == ch2 == list(range(25))
+
+def test_pop_list():
+	# Records come back as tuples, with integer fields still integers
+	r = _SampleRing(2, 'spill')
+	r.push([(1e6, 0.5, 7), (2e6, 0.25, 8), (3e6, 0.125, 9)])
+
+	out = r.pop_list()
+	assert out == [(1e6, 0.5, 7), (2e6, 0.25, 8), (3e6, 0.125, 9)]
+	assert [type(f) for f in out[0]] == [float, float, int]
+
+	r.push([(4e6, 0.0, 10)])
+	assert r.pop_list() == [(4e6, 0.0, 10)]
+	assert r.pop_list() == []
+	r.close()
+
+	r = _SampleRing(4)
+	r.push([1, 2, 3])
+	assert [type(v) for v in r.pop_list()] == [int, int, int]
+
+	r = _SampleRing(4)
+	r.push([0.5, 1.5])
+	assert r.pop_list() == [0.5, 1.5]
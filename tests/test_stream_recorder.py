@@ -0,0 +1,143 @@
+import pytest
+import numpy as np
+
+from pymoku import NoDataException, DataIntegrityException
+from pymoku._stream_recorder import StreamRecorder
+
+class FakeStream(object):
+	# 32-bit records of the sample number times the channel number, sent in chunks that split records
+	id = 7
+	timestep = 1e-3
+	binstr = '<s32'
+	fmtstr = '{t:.6f},{ch1:.6f},{ch2:.6f}\r\n'
+	hdrstr = 'Time,Ch1,Ch2\r\n'
+
+	def __init__(self, n, chunk=398, ch1=True, ch2=True):
+		self.ch1, self.ch2 = ch1, ch2
+
+		# One processing string per physical channel, different so they can't be mixed up
+		self.procstr = ['*C', '*C*4']
+
+		# Messages are for the session channel, indexed from zero over the enabled channels
+		chans = []
+		for idx, ch in enumerate(c for c, en in [(1, ch1), (2, ch2)] if en):
+			raw = (np.arange(n, dtype='<i4') * ch).tobytes()
+			chans.append([(idx, s, 0.5, raw[s:s + chunk]) for s in range(0, len(raw), chunk)])
+
+		self.msgs = [m for group in zip(*chans) for m in group]
+		self.running = True
+
+	def _stream_get_samples_raw(self, timeout):
+		if not self.msgs:
+			raise NoDataException("Data log terminated")
+		return self.msgs.pop(0)
+
+	def _stream_net_is_running(self):
+		return self.running
+
+	def _stream_stop(self):
+		self.running = False
+
+def test_npy(tmpdir):
+	stream = FakeStream(1000)
+	rec = StreamRecorder(stream, str(tmpdir.join('rec')), 'npy', queue_size=4)
+	rec.start()
+	assert rec.wait(5)
+	rec.stop()
+
+	assert not stream.running
+	assert rec.files == [str(tmpdir.join('rec.npy'))]
+	assert rec.samples == 1000
+
+	data = np.load(rec.files[0])
+	assert data.shape == (1000, 3)
+	assert np.allclose(data[:, 0], np.arange(1000) * 1e-3)
+	assert np.allclose(data[:, 1], np.arange(1000) * 0.5)
+	assert np.allclose(data[:, 2], np.arange(1000) * 4)
+
+def test_rollover(tmpdir):
+	rec = StreamRecorder(FakeStream(1000), str(tmpdir.join('rec.npy')), 'npy', rollover_time=0.3)
+	rec.start()
+	rec.wait(5)
+	rec.stop()
+
+	assert len(rec.files) == 4
+	parts = [np.load(f) for f in rec.files]
+	assert [len(p) for p in parts] == [300, 300, 300, 100]
+	assert np.allclose(np.concatenate(parts)[:, 1], np.arange(1000) * 0.5)
+
+def test_data_loss(tmpdir):
+	stream = FakeStream(100, chunk=40)
+	del stream.msgs[3]
+
+	rec = StreamRecorder(stream, str(tmpdir.join('rec.npy')), 'npy')
+	rec.start()
+	rec.wait(5)
+
+	with pytest.raises(DataIntegrityException):
+		rec.stop()
+
+def test_ch2_only(tmpdir):
+	rec = StreamRecorder(FakeStream(500, ch1=False), str(tmpdir.join('rec.npy')), 'npy')
+	rec.start()
+	rec.wait(5)
+	rec.stop()
+
+	# Channel 2's processing, though it's the only channel in the session
+	data = np.load(rec.files[0])
+	assert data.shape == (500, 2)
+	assert np.allclose(data[:, 1], np.arange(500) * 4)
+
+@pytest.mark.parametrize('ch1, ch2', [(True, True), (False, True), (True, False)])
+def test_li(tmpdir, ch1, ch2):
+	pytest.importorskip('capnp')
+	from pymoku.dataparser import LIDataFileReader
+
+	stream = FakeStream(1000, ch1=ch1, ch2=ch2)
+	rec = StreamRecorder(stream, str(tmpdir.join('rec')), 'li', rollover_time=0.6)
+	rec.start()
+	rec.wait(5)
+	rec.stop()
+
+	assert rec.files == [str(tmpdir.join('rec_0000.li')), str(tmpdir.join('rec_0001.li'))]
+
+	channels = [c for c, en in [(1, ch1), (2, ch2)] if en]
+	parts = []
+	for k, fname in enumerate(rec.files):
+		reader = LIDataFileReader(fname)
+
+		# The header describes the physical channels recorded, each with its own processing
+		assert (reader.ch1, reader.ch2) == (ch1, ch2)
+		assert reader.nch == len(channels)
+		assert reader.proc == [stream.procstr[c - 1] for c in channels]
+		assert reader.cal == [0.5] * len(channels)
+		assert reader.instr == stream.id
+		assert reader.deltat == stream.timestep
+		assert reader.startoffset == pytest.approx(k * 0.6)
+
+		parts.append(np.array(reader.readall(), dtype=float).reshape(-1, len(channels)))
+		reader.close()
+
+	assert [len(p) for p in parts] == [600, 400]
+
+	scale = {1: 0.5, 2: 4.0}
+	data = np.concatenate(parts)
+	for i, c in enumerate(channels):
+		assert np.allclose(data[:, i], np.arange(1000) * scale[c])
+
+def test_parquet(tmpdir):
+	pytest.importorskip('pyarrow')
+	import pyarrow.parquet
+
+	rec = StreamRecorder(FakeStream(1000), str(tmpdir.join('rec')), 'parquet')
+	rec.start()
+	rec.wait(5)
+	rec.stop()
+
+	assert rec.files == [str(tmpdir.join('rec.parquet'))]
+
+	table = pyarrow.parquet.read_table(rec.files[0])
+	assert table.column_names == ['time', 'ch1', 'ch2']
+	assert np.allclose(table.column('time').to_numpy(), np.arange(1000) * 1e-3)
+	assert np.allclose(table.column('ch1').to_numpy(), np.arange(1000) * 0.5)
+	assert np.allclose(table.column('ch2').to_numpy(), np.arange(1000) * 4)
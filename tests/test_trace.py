@@ -0,0 +1,99 @@
+import pytest
+import numpy as np
+
+from pymoku._specan_data import _SpectrumTrace
+
+class Frame(object):
+	def __init__(self, waveformid, stateid=1, dbm=False, trigstate=None):
+		self.waveformid = waveformid
+		self._stateid = stateid
+		self._trigstate = stateid if trigstate is None else trigstate
+		self.dbm = dbm
+
+def run(trace, sweeps, dbm=False):
+	for k, s in enumerate(sweeps):
+		s = np.asarray(s, dtype=float)
+		out = trace.apply(Frame(k, dbm=dbm), s, -s)
+	return out
+
+def test_average():
+	trace = _SpectrumTrace()
+	trace.set_mode('average')
+
+	ch1, ch2 = run(trace, [[1, 2], [3, 4], [5, 6]])
+
+	# RMS voltage is averaged as power
+	assert ch1 == pytest.approx(np.sqrt([35 / 3.0, 56 / 3.0]))
+	assert ch2 == pytest.approx(ch1)
+
+def test_average_dbm():
+	trace = _SpectrumTrace()
+	trace.set_mode('average')
+
+	ch1, _ = run(trace, [[-10, -20], [-20, -10]], dbm=True)
+	assert ch1 == pytest.approx(10 * np.log10([0.055, 0.055]))
+
+def test_average_invalid_bins():
+	trace = _SpectrumTrace()
+	trace.set_mode('average')
+
+	# The second bin is only valid in two of the sweeps, so is the mean of those
+	ch1, _ = run(trace, [[1, np.nan], [1, 2], [1, np.nan], [1, 4]])
+	assert ch1 == pytest.approx([1, np.sqrt(10)])
+
+def test_exp_average():
+	trace = _SpectrumTrace()
+	trace.set_mode('exp_average', 2)
+
+	ch1, _ = run(trace, [[1], [3], [5]])
+	# Equal weights for the first two sweeps, then 1/2
+	assert ch1 == pytest.approx(np.sqrt([(5 + 25) / 2.0]))
+
+@pytest.mark.parametrize("mode,expected", [
+	('max_hold', [5, 7, 3]),
+	('min_hold', [1, 2, 3])])
+def test_hold(mode, expected):
+	trace = _SpectrumTrace()
+	trace.set_mode(mode)
+
+	ch1, ch2 = run(trace, [[1, 7, np.nan], [5, 2, 3], [2, 3, np.nan]])
+	assert ch1.tolist() == expected
+
+def test_repeated_frame():
+	trace = _SpectrumTrace()
+	trace.set_mode('average')
+
+	trace.apply(Frame(1), np.array([1.0]), np.array([1.0]))
+	ch1, _ = trace.apply(Frame(1), np.array([3.0]), np.array([3.0]))
+
+	# The same sweep repeated in a later frame isn't added again
+	assert ch1.tolist() == [1.0]
+
+def test_reset():
+	trace = _SpectrumTrace()
+	trace.set_mode('max_hold')
+	run(trace, [[10, 10]])
+
+	trace.reset()
+	ch1, _ = trace.apply(Frame(5), np.array([1.0, 2.0]), np.array([1.0, 2.0]))
+	assert ch1.tolist() == [1, 2]
+
+	# A change of instrument state restarts the trace too
+	ch1, _ = trace.apply(Frame(6, stateid=2), np.array([0.5, 0.5]), np.array([0.5, 0.5]))
+	assert ch1.tolist() == [0.5, 0.5]
+
+def test_previous_state():
+	trace = _SpectrumTrace()
+	trace.set_mode('max_hold')
+	trace.apply(Frame(1), np.array([5.0, 1.0]), np.zeros(2))
+
+	# Sweeps captured under the previous settings are passed through without being held
+	ch1, _ = trace.apply(Frame(2, stateid=2, trigstate=1), np.array([9.0, 9.0]), np.zeros(2))
+	assert ch1.tolist() == [9, 9]
+
+	ch1, _ = trace.apply(Frame(3, stateid=2), np.array([1.0, 2.0]), np.zeros(2))
+	assert ch1.tolist() == [1, 2]
+
+	ch1, _ = trace.apply(Frame(4, stateid=2, trigstate=1), np.array([9.0, 9.0]), np.zeros(2))
+	ch1, _ = trace.apply(Frame(5, stateid=2), np.array([0.0, 3.0]), np.zeros(2))
+	assert ch1.tolist() == [1, 3]
@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+
+from pymoku._specan_data import SpectrumWaterfall
+
+class Frame(object):
+	def __init__(self, waveformid, stateid=1, dbm=False, trigstate=None):
+		self.waveformid = waveformid
+		self._stateid = stateid
+		self._trigstate = stateid if trigstate is None else trigstate
+		self.dbm = dbm
+		self.frequency = [0.0, 1.0, 2.0]
+
+def add(w, wid, value, **kwargs):
+	w._add(Frame(wid, **kwargs), np.full(3, float(value)), np.full(3, 10.0 * value))
+
+def test_wrap():
+	w = SpectrumWaterfall(3)
+	for i in range(5):
+		add(w, i, i)
+
+	assert len(w) == 3
+	assert w.view(1)[:, 0].tolist() == [2, 3, 4]
+	assert w.view(2)[:, 0].tolist() == [20, 30, 40]
+	assert len(w.time) == 3
+
+	with pytest.raises(ValueError):
+		w.view(1)[0, 0] = 0
+
+def test_repeated_frames():
+	w = SpectrumWaterfall(4)
+	add(w, 1, 1)
+	add(w, 1, 1)
+	add(w, 2, 2)
+
+	assert w.view(1)[:, 0].tolist() == [1, 2]
+
+def test_state_change():
+	w = SpectrumWaterfall(4)
+	add(w, 1, 1)
+	add(w, 2, 2, stateid=2)
+
+	assert w.view(1)[:, 0].tolist() == [2]
+
+def test_previous_state():
+	w = SpectrumWaterfall(4)
+	add(w, 1, 1)
+
+	# Sweeps captured under the previous settings aren't added after the settings change
+	add(w, 2, 2, stateid=2, trigstate=1)
+	add(w, 3, 3, stateid=2)
+	add(w, 4, 4, stateid=2, trigstate=1)
+	add(w, 5, 5, stateid=2)
+
+	assert w.view(1)[:, 0].tolist() == [3, 5]
+
+@pytest.mark.parametrize("reduce,dbm,expected", [('max', False, [7, 3]), ('mean', False, [5, 3]), ('mean', True, [10 * np.log10(4), 10 * np.log10(3)])])
+def test_decimation(reduce, dbm, expected):
+	w = SpectrumWaterfall(4, decimation=2, reduce=reduce)
+	for i, v in enumerate([1, 7, 3, 3, 9]):
+		add(w, i, v if not dbm else 10 * np.log10(v), dbm=dbm)
+
+	assert w.view(1)[:, 0] == pytest.approx(expected, rel=1e-6)